@@ -0,0 +1,371 @@
+import os
+import sys
+
+DEBUG = True
+ALLOWED_HOSTS = ['YOUR.PUBLIC.SERVER.NAME']
+
+ADMINS = (
+    # ('Your Name', 'your_email@example.com'),
+)
+
+MANAGERS = ADMINS
+
+EMAIL_SUBJECT_PREFIX = 'Add Email Prefix here, e.g. [launchpad-server-name] '
+SERVER_EMAIL = 'root@mylaunchpadserver.com'
+
+if 'test' in sys.argv:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': 'test',
+        },
+        'voyager': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': 'test',
+        }
+    }
+else:
+    DATABASES = {
+	'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': 'lp/lp/lp.db',
+        },
+        'voyager': {
+            # ui.pooled_oracle checks sessions out of a per-process pool,
+            # validating them and replacing any that have gone bad
+            'ENGINE': 'ui.pooled_oracle',
+            'NAME': '',
+            'USER': '',
+            'PASSWORD': '',
+            'HOST': '',
+            'PORT': '',
+            # hand the session back to the pool at the end of each request;
+            # pooled sessions keep their cached statements
+            # (see VOYAGER_STATEMENT_CACHE_SIZE)
+            'CONN_MAX_AGE': 0,
+            'OPTIONS': {
+                # sessions per mod_wsgi process; POOL_MAX should be at least
+                # the number of threads in apache/lp.conf plus
+                # STALE_REFRESH_THREADS; a request gives up after waiting
+                # POOL_WAIT_TIMEOUT seconds for a session
+                'POOL_MIN': 1,
+                'POOL_MAX': 18,
+                'POOL_INCREMENT': 1,
+                'POOL_WAIT_TIMEOUT': 10,
+            },
+        }
+    }
+    # To work without the live Voyager database, use a SQLite stand-in
+    # filled by "manage.py make_standin" instead:
+    #
+    #    'voyager': {
+    #        'ENGINE': 'ui.standin',
+    #        'NAME': 'lp/lp/voyager.db',
+    #    }
+
+
+TEMPLATE_DIRS = (
+    os.path.join(os.path.dirname(__file__), 'templates'),
+)
+
+
+LIB_LOOKUP = {
+    'AL': 'Washington Law (American)',
+    'AU': 'American',
+    'CU': 'Catholic',
+    'DA': 'Dahlgren Medical (Georgetown)',
+    'DC': 'UDC',
+    'E-GovDoc': 'WRLC',
+    'E-Resources': 'WRLC',
+    'GA': 'Gallaudet',
+    'GM': 'George Mason',
+    'GT': 'Georgetown',
+    'GTL': 'Georgetown Law',
+    'GW': 'George Washington',
+    # HD is Himmelfarb-Dahlgren items jointly held in storage
+    'HD': 'Himmelfarb-Dahlgren',
+    'HI': 'Himmelfarb Health Sciences (George Washington)',
+    'HL': 'Howard Law',
+    'HS': 'Howard Health Sciences',
+    'HU': 'Howard',
+    'JB': 'Jacob Burns Law (George Washington)',
+    'LI': 'Catholic',
+    'LL': 'George Mason Law Library',
+    'MU': 'Marymount',
+    'TR': 'Trinity',
+    'WR': 'WRLC',
+}
+
+
+Z3950_SERVERS = {
+    'LIBRARY_ID': {
+        'IP': '',
+        'PORT': '',
+        'DB': '',
+        'SYNTAX': '',
+    }
+}
+
+INDEX_CODES = {
+    'isbn': ['020N', '020A', 'ISB3', '020Z'],
+    'issn': ['022A', '022Z', '022L'],
+    'oclc': ['035A'],
+    'lccn': ['010A']
+    }
+
+# Number of parsed statements cx_Oracle keeps per Voyager connection
+VOYAGER_STATEMENT_CACHE_SIZE = 50
+
+# Rows fetched from Voyager per round trip
+VOYAGER_FETCH_ARRAYSIZE = 500
+
+# Voyager statements slower than this are logged with their call site
+VOYAGER_SLOW_QUERY_SECONDS = 0.5
+
+
+# Preferred library for bib record and top of the holdings list
+# ex.: 'GW'
+PREF_LIB = ''
+
+# Institution name, link, etc. to display in HTML header
+INSTITUTION_NAME = 'GW Libraries'
+INSTITUTION_LINK = 'http://library.gwu.edu/'
+HOST_INSTITUTION_NAME = 'The George Washington University'
+HOST_INSTITUTION_LINK = 'http://www.gwu.edu/'
+
+# Libraries that should be put at the bottom of the holdings list
+# Optional, can be empty or used for libraries with restricted access, etc.
+BOTTOM_LIBS = [] 
+
+# Eligibility Options
+
+INELIGIBLE_LIBRARIES = ['JB', 'HL', 'HS', 'AL', 'HI', 'GTL']
+
+SHARED_LIBRARY_NAMES = ['WR', 'E-Resources', 'E-GovDoc', 'Internet Archive', 'IA']
+
+INELIGIBLE_PERM_LOCS = ['RESERVE', 'NON-CIRC', 
+    'RESTRICTED', 'ONLY', 'IN LIBRARY', 'ARCHIVES', 'KIEV', 'SPEC',
+    'IBT', 'AUDIOTAPES', 'CD-ROM', 'DISCS', 'RECORDS', 'RUSH', 'VIDEOTAPES',
+    'VIDEODISCS', 'MEDIA VIDEOS', 'DEAF DVD', 'DEAF VHS', 'IN PROCESS', 'SCS',
+    'AU: LAW', 'LAW LIBRARY', 'QATAR', 'TURKEY', 'CAMPUS USE', 'MEDIA LAB',
+    'UCLQ','DESIGN PERIODICALS','ILL','CONSTRUCTION','JSTOR', 'GW MUSEUM',
+    '2 HOUR TEXTSELECT']
+
+# Add electronic locations
+ELECTRONIC_LOCS = ['AVAILABLE TO ALL', 'ONLINE', 'ELECTRONIC', 'INTERNET',
+    'STREAMING', 'EREADER', 'E-BOOKS']
+
+INELIGIBLE_PERM_LOCS += ELECTRONIC_LOCS
+
+INELIGIBLE_TEMP_LOCS = ['RESERVE', 'BINDERY']
+
+INELIGIBLE_STATUS = ['RENEWED', 'MISSING', 'LOST', 'OVERDUE', 'TRANSIT',
+    'HOLD', 'DUE', 'CHARGED', 'UNAVAILABLE', 'WITHDRAWN', 'DAMAGED',
+    'LIB USE ONLY', 'CHECKED OUT', 'IN PROCESS', 'AT BINDERY']
+
+INELIGIBLE_ILL_LOCS = ['GELMAN MEDIA LAB','GELMAN SPECIAL COLLECTIONS', 'ONLINE', 'INTERNET']
+                     
+SCREAMING_LOCATIONS = [
+    # NOTE: 'LAU' must preceed 'AU'
+    ('LAU', 'Lauinger'),
+    ('AU', 'American'),
+    ('FLOOR', 'floor'),
+    ('GELMAN', 'Gelman'),
+    ('GROUND', 'ground'),    
+    ('LOWER LEVEL', 'lower level'),
+    ('MARYMOUNT', 'Marymount'),    
+    ('MT VERNON CAMPUS', 'Mt. Vernon campus'),
+    ('SCIENCE', 'Science'),    
+    ('Stacks', 'stacks'),
+    ('UNBOUND', 'unbound'),
+    ('VAN NESS', 'Van Ness'),
+    ('INTERNET', 'Online'),
+    ('GW Medical: Restricted Circ - Borrowing through ILL only','Restricted Borrowing')
+    ]
+
+MAX_ITEMS = 6
+
+MAX_SUBJECTS = 3
+
+MAX_PERIODICALS = 3
+
+INELIGIBLE_866_STATUS = ['Charged', 'Not Charged', 'Missing', 'LIB USE ONLY', 'SPC USE ONLY']
+
+# Similarity ratio for open library and voyager titles
+TITLE_SIMILARITY_RATIO = 0.6
+
+# the 360Link, Open Library and HathiTrust lookups for an item's holdings
+# run at once on a pool of ENRICHMENT_THREADS threads per process; any
+# that take longer than ENRICHMENT_TIMEOUT seconds are left out
+ENRICHMENT_THREADS = 10
+ENRICHMENT_TIMEOUT = 5
+
+ILLIAD_URL = 'https://www.aladin.wrlc.org/Z-WEB/ILLAuthClient?'
+
+ILLIAD_SID = 'GWLP'
+
+REFWORKS_URL = 'http://proxygw.wrlc.org/login?url=http://www.refworks.com/express/expressimport.asp?'
+
+TITLE_CHARS = 255
+
+FEEDBACK_FORM_URL = 'https://docs.google.com/spreadsheet/viewform?formkey=dDVfMTNIT0tneVFvNFZoQkNXc01SN2c6MQ'
+
+TITLE_LEFTOVER_CHARS = 5
+
+MARC_245_SUBFIELDS = ['$a', '$b', '$c', '$f', '$g', '$h', '$k', '$n',
+    '$p', '$s', '$6', '$8']
+
+STREAMING_AUDIO_TAGS = ['GW: Streaming Audio', 'GW Streaming Audio']
+
+STREAMING_VIDEO_TAGS = ['GW: Streaming Video', 'GW Streaming Video']
+
+GOVT_DOC_LINK = 'purl.access.gpo.gov'
+
+BOUND_WITH_ITEM_LINK = 'findit.library.gwu.edu/item/'
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.memcached.MemcachedCache',
+        'LOCATION': '127.0.0.1:11211',
+        'TIMEOUT': 60 * 60,  # default to one hour
+        },
+    # to keep Open Library and HathiTrust answers through memcached
+    # restarts, uncomment this, set LOOKUP_CACHE_ALIAS to 'lookups' and
+    # run manage.py createcachetable
+    # 'lookups': {
+    #     'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+    #     'LOCATION': 'ui_lookup_cache',
+    #     },
+    }
+
+ITEM_PAGE_CACHE_SECONDS = 60 * 60 # one hour
+
+# item pages are put together per request from the bib, cached for a long
+# time, and its holdings and circulation status, cached briefly; with
+# poll_changes running, holdings are dropped as soon as an item changes,
+# and HOLDINGS_CACHE_SECONDS can safely be raised to an hour or more
+BIB_CACHE_SECONDS = 60 * 60 * 24 # one day
+HOLDINGS_CACHE_SECONDS = 60 * 5 # five minutes
+
+# once the above run out, cached bibs and holdings are still served while
+# they are refreshed in the background, and through Voyager outages for up
+# to STALE_GRACE_SECONDS; pages are marked as possibly out of date if a
+# refresh fails or takes longer than STALE_REFRESH_TIMEOUT
+STALE_GRACE_SECONDS = 60 * 60 * 24 # one day
+# availability (the JSON used by the search results) gets a much shorter
+# grace period, since it is nothing but circulation status
+AVAILABILITY_GRACE_SECONDS = 60 * 10 # ten minutes
+STALE_REFRESH_TIMEOUT = 30
+# background refreshes run on this many threads per process, each of which
+# may hold a Voyager session (see POOL_MAX above)
+STALE_REFRESH_THREADS = 3
+
+# concurrent requests for a bib that is not cached wait for the first one
+# to build it; across processes they wait up to this many seconds for
+# another process to finish (0 to only wait within a process)
+SINGLE_FLIGHT_LOCK_TIMEOUT = 30
+
+# WRLC <-> Georgetown/George Mason bib id mappings; misses are kept for
+# less time so that newly loaded records are found quickly
+RESOLVER_CACHE_SECONDS = 60 * 60 * 24 * 7 # one week
+RESOLVER_NEGATIVE_CACHE_SECONDS = 60 * 60 # one hour
+RESOLVER_LRU_SIZE = 10000 # mappings kept in each process
+
+# lookups that found nothing: bibids that do not exist, standard numbers
+# with no local bib or no external metadata
+NEGATIVE_CACHE_SECONDS = 60 * 60 # one hour
+NEGATIVE_CACHE_SIZE = 10000 # misses kept in each process
+
+# what Open Library and HathiTrust say about a standard number, by number;
+# their answers change slowly, and those that found nothing are kept for
+# LOOKUP_NEGATIVE_CACHE_SECONDS (see also manage.py preload_lookups)
+LOOKUP_CACHE_ALIAS = 'default'
+LOOKUP_CACHE_SECONDS = 60 * 60 * 24 * 30 # thirty days
+LOOKUP_NEGATIVE_CACHE_SECONDS = 60 * 60 * 24 * 7 # one week
+LOOKUP_LRU_SIZE = 5000 # answers kept in each process
+
+# the bibs found for each standard number by an edition cluster lookup; a
+# purge_cluster reaches other processes within CLUSTER_LOCAL_SECONDS
+CLUSTER_CACHE_SECONDS = 60 * 60 * 24 # one day
+CLUSTER_LOCAL_SECONDS = 60 * 5 # five minutes
+CLUSTER_LRU_SIZE = 5000 # numbers kept in each process
+
+# raw MARC records, compressed; bibs without a record are remembered for
+# MARC_NEGATIVE_CACHE_SECONDS
+MARC_CACHE_SECONDS = 60 * 60 * 24 # one day
+MARC_NEGATIVE_CACHE_SECONDS = 60 * 10 # ten minutes
+MARC_LRU_SIZE = 2000 # records kept in each process
+
+# If this value is present (not empty), GA bug will be added to html
+GOOGLE_ANALYTICS_UA = ''
+GOOGLE_ANALYTICS_AGGREGATE_UA = ''
+
+# Link resolver information, only used in debug mode now
+LINK_RESOLVER = {
+    'base_url': 'http://findit.library.gwu.edu/go',
+    'name': 'findit',
+    }
+
+API_LIST = [
+    {'name': 'googlebooks',
+     'url': 'https://www.googleapis.com/books/v1/volumes?q=%s:%s',
+     'key': ''},
+    {'name': 'worldcat',
+     'url': 'http://www.worldcat.org/webservices/catalog/content/%s?wskey=%s',
+     'key': ''}
+    ]
+
+# Show covers from openlibrary.org?
+ENABLE_OPENLIBRARY_COVERS = True
+
+# Show humans.txt?
+ENABLE_HUMANS = False
+
+# Show sitemaps in robots.txt?
+ENABLE_SITEMAPS = False
+
+# Relative path of sitemap files on local disk
+SITEMAPS_DIR = os.path.join(os.path.dirname(__file__), '../ui/static/sitemaps')
+
+# Base public URL of links; used by sitemap generator, no trailing slash
+SITEMAPS_BASE_URL = 'http://findit.library.gwu.edu'
+
+SER_SOL_API_URL = 'http://uz4ug4lz9g.openurl.xml.serialssolutions.com/openurlxml?version=1.0'
+
+SER_SOL_API_MAX_ATTEMPTS = 3
+
+SER_SOL_DBID_TEXT = 'TN5'
+
+# (connect, read) timeouts in seconds for calls to the services above, by
+# the name of the function in ui/apis.py that makes them
+UPSTREAM_TIMEOUTS = {
+    'default': (3.05, 10),
+    'openlibrary': (3.05, 5),
+    'hathitrust': (3.05, 5),
+    'sersol360link': (3.05, 5),
+    }
+
+# after this many failures in a row a service is left alone for
+# UPSTREAM_BREAKER_COOL_DOWN seconds, and pages go without what it adds
+UPSTREAM_BREAKER_FAILURES = 5
+UPSTREAM_BREAKER_COOL_DOWN = 60
+
+# how often each process logs its counts of calls, failures and calls
+# refused by the breakers, and of the connections in its pools (see
+# ui.upstream.stats and pool_stats)
+UPSTREAM_STATS_LOG_SECONDS = 60 * 5 # five minutes
+
+# connections to those services (and DDA_URL) are kept open for reuse;
+# each process keeps up to UPSTREAM_POOL_SIZE per host, which should be at
+# least the threads in apache/lp.conf plus ENRICHMENT_THREADS
+UPSTREAM_POOL_HOSTS = 10
+UPSTREAM_POOL_SIZE = 25
+
+# summon api
+SUMMON_ID = "gw"
+SUMMON_SECRET_KEY = "you-will-need-this-to-do-searches"
+
+#DDA Rush Print Request form URL
+DDA_URL = 'https://docs.google.com/a/email.gwu.edu/forms/d/1pbd5Ge2zCDMtbGW5SgL-TwsE7wzNuCDNpQUlpa2NvcE/formResponse'
+
+FLOORMAP_URL = 'http://library.gwu.edu/about/maps/floorplans'
@@ -1,32 +1,59 @@
-import json
-from lxml import etree
+import copy
+from StringIO import StringIO
+from xml.sax import SAXException
 
-from urllib2 import urlopen
+from lxml import etree
 
 from pymarc import marcxml
 
 from django.conf import settings
 
-from ui.templatetags.launchpad_extras import clean_isbn
+from ui import upstream
+from ui.cache import TieredCache, missing
+from ui.templatetags.launchpad_extras import clean_isbn, clean_lccn, \
+    clean_oclc
+
+# what Open Library and HathiTrust say about standard numbers, see lookup()
+_lookups = TieredCache('lookup', settings.LOOKUP_LRU_SIZE,
+                       settings.LOOKUP_CACHE_SECONDS,
+                       settings.LOOKUP_NEGATIVE_CACHE_SECONDS,
+                       alias=settings.LOOKUP_CACHE_ALIAS)
+
+
+class LookupFailed(Exception):
+    """An API could not be reached, or sent back something unreadable."""
 
 
 def get_bib_data(num, num_type):
+    """
+    Ask each API in API_LIST about a standard number in turn. A number
+    none of them know is remembered in the negative cache, unless one of
+    them could not be asked.
+    """
+    if missing.has('api', num_type, num):
+        return None
+    failed = False
     for api in settings.API_LIST:
-        bib = globals()[api['name']](num=num, num_type=num_type,
-                                     url=api.get('url', ''),
-                                     key=api.get('key', ''))
+        try:
+            bib = globals()[api['name']](num=num, num_type=num_type,
+                                         url=api.get('url', ''),
+                                         key=api.get('key', ''))
+        except LookupFailed:
+            failed = True
+            continue
         if bib:
             return bib
+    if not failed:
+        missing.add('api', num_type, num)
     return None
 
 
 def googlebooks(num, num_type, url, key):
     url = url % (num_type, num)
     try:
-        response = urlopen(url)
-        json_data = json.loads(response.read())
-    except:
-        return None
+        json_data = upstream.get('googlebooks', url).json()
+    except (upstream.Unavailable, ValueError):
+        raise LookupFailed(url)
     if json_data['totalItems'] == 0 or len(json_data.get('items', [])) == 0:
         return None
     item = json_data['items'][0]
@@ -64,12 +91,13 @@ def worldcat(num, num_type, url, key):
 # e.g., /oclc/34473395  /oclc/34474496
     url = url % (num, key)
     try:
-        records = marcxml.parse_xml_to_array(urlopen(url))
-        if not records:
-            return None
-        record = records[0]
-    except:
+        response = upstream.get('worldcat', url)
+        records = marcxml.parse_xml_to_array(StringIO(response.content))
+    except (upstream.Unavailable, SAXException):
+        raise LookupFailed(url)
+    if not records:
         return None
+    record = records[0]
     bib = {}
     bib[num_type.upper()] = num
     bib['TITLE'] = record.uniformtitle()
@@ -112,31 +140,111 @@ def worldcat(num, num_type, url, key):
 
 
 def openlibrary(num, num_type, force=False, as_holding=True):
-    # ensure we're dealing with a proper identifier type and value
+    return openlibrary_many([(num, num_type)], force=force,
+                            as_holding=as_holding)[0]
+
+
+def openlibrary_many(nums, force=False, as_holding=True):
+    """
+    openlibrary for a list of (num, num_type) pairs, such as all of a
+    bib's standard numbers, returning the results in the same order. The
+    numbers that are not in the lookup cache are sent to Open Library
+    together, as the bibkeys of one request.
+    """
+    results = [{} for pair in nums]
+    wanted = []
+    for i, (num, num_type) in enumerate(nums):
+        num = _clean_num(num, num_type)
+        if num:
+            wanted.append((i, num, num_type))
+    if not wanted:
+        return results
     try:
-        if num_type.upper() not in ('ISBN', 'OCLC', 'LCCN', 'OLID'):
-            raise
-        if num_type.upper() == 'ISBN':
-            num = clean_isbn(num)
-            if len(num) not in (10, 13):
-                raise
-    except:
+        books = lookup_many('openlibrary', [(num, num_type)
+                                            for i, num, num_type in wanted])
+    except (upstream.Unavailable, ValueError):
+        return results
+    for (i, num, num_type), book in zip(wanted, books):
+        results[i] = _openlib_result(book, force, as_holding)
+    return results
+
+
+def _openlib_result(book, force, as_holding):
+    for ebook in book.get('ebooks', []):
+        if ebook.get('availability', '') == 'full':
+            return make_openlib_holding(book) if as_holding else \
+                copy.deepcopy(book)
+    if not force:
         return {}
-    params = '%s:%s' % (num_type, num)
+    return make_openlib_holding(book) if as_holding else copy.deepcopy(book)
+
+
+def _fetch_openlibrary(nums):
+    bibkeys = ['%s:%s' % (num_type, num) for num, num_type in nums]
     url = 'http://openlibrary.org/api/books?format=json&jscmd=data' + \
-        '&bibkeys=%s' % params
-    try:
-        response = urlopen(url)
-        json_data = json.loads(response.read())
-        book = json_data.get(params, {})
-        for ebook in book.get('ebooks', []):
-            if ebook.get('availability', '') == 'full':
-                return make_openlib_holding(book) if as_holding else book
-        if not force:
-            return {}
-        return make_openlib_holding(book) if as_holding else book
-    except:
-        return {}
+        '&bibkeys=%s' % ','.join(bibkeys)
+    json_data = upstream.get('openlibrary', url).json()
+    return [json_data.get(bibkey, {}) for bibkey in bibkeys]
+
+
+def lookup(service, num, num_type):
+    """
+    What service ('openlibrary' or 'hathitrust') says about a standard
+    number: the Open Library book, or the HathiTrust items with full
+    view. Answers are cached by service, number type and normalized
+    number in LOOKUP_CACHE_ALIAS, for LOOKUP_CACHE_SECONDS, or for
+    LOOKUP_NEGATIVE_CACHE_SECONDS if there was nothing there. Failures
+    raise upstream.Unavailable (or ValueError, for an unreadable answer)
+    and are not cached. The answer may be shared, so treat it as read
+    only.
+    """
+    return lookup_many(service, [(num, num_type)])[0]
+
+
+def lookup_many(service, nums):
+    """
+    lookup for a list of (num, num_type) pairs, returning the answers in
+    the same order. Open Library is asked about all the numbers that are
+    not cached at once.
+    """
+    keys = [_lookups.make_key(service, num_type.upper(),
+                              _normalize_num(num, num_type))
+            for num, num_type in nums]
+    found = _lookups.get_many(list(set(keys)))
+    missing_nums = []
+    for key, num in zip(keys, nums):
+        if key not in found:
+            found[key] = None
+            missing_nums.append((key, num))
+    if missing_nums:
+        answers = _FETCHERS[service]([num for key, num in missing_nums])
+        fetched = dict((key, answer) for (key, num), answer
+                       in zip(missing_nums, answers))
+        _lookups.set_many(fetched)
+        found.update(fetched)
+    return [found[key] for key in keys]
+
+
+def _clean_num(num, num_type):
+    """The number to ask about, or None if it is not worth asking."""
+    if num_type.upper() not in ('ISBN', 'OCLC', 'LCCN', 'OLID'):
+        return None
+    if num_type.upper() == 'ISBN':
+        num = clean_isbn(num)
+        if len(num) not in (10, 13):
+            return None
+    return num
+
+
+def _normalize_num(num, num_type):
+    num_type = num_type.upper()
+    if num_type == 'ISBN':
+        return clean_isbn(num)
+    if num_type == 'OCLC':
+        return clean_oclc(num)
+    if num_type == 'LCCN':
+        return clean_lccn(num)
+    return num.strip()
 
 
 def make_openlib_holding(book):
@@ -185,27 +293,33 @@ def make_openlib_holding(book):
 
 
 def hathitrust(num, num_type):
-    # ensure we're dealing with a proper identifier type and value
+    num = _clean_num(num, num_type)
+    if not num:
+        return {}
     try:
-        if num_type.upper() not in ('ISBN', 'OCLC', 'LCCN', 'OLID'):
-            raise
-        if num_type.upper() == 'ISBN':
-            num = clean_isbn(num)
-            if len(num) not in (10, 13):
-                raise
-    except:
+        items = lookup('hathitrust', num, num_type)
+    except (upstream.Unavailable, ValueError):
         return {}
+    if items:
+        return make_hathi_holding(items[0]['itemURL'], items[0]['fromRecord'])
+
+
+def _fetch_hathitrust(num, num_type):
     params = '%s/%s' % (num_type, num)
     url = 'http://catalog.hathitrust.org/api/volumes/brief/%s.json' % params
-    try:
-        response = urlopen(url)
-        json_data = json.loads(response.read())
-        for item in json_data.get('items', []):
-            if item.get('usRightsString', '') == 'Full view':
-                return make_hathi_holding(item.get('itemURL', ''),
-                                          item.get('fromRecord', ''))
-    except:
-        return {}
+    json_data = upstream.get('hathitrust', url).json()
+    # only the full view items are of any use, so only they are kept
+    return [dict((k, item.get(k, '')) for k in ('itemURL', 'fromRecord'))
+            for item in json_data.get('items', [])
+            if item.get('usRightsString', '') == 'Full view']
+
+
+# each takes a list of (num, num_type) and returns a list of answers
+_FETCHERS = {
+    'openlibrary': _fetch_openlibrary,
+    'hathitrust': lambda nums: [_fetch_hathitrust(num, num_type)
+                                for num, num_type in nums],
+}
 
 
 def make_hathi_holding(url, fromRecord):
@@ -254,9 +368,9 @@ def sersol360link(num, num_type, count=0):
     try:
         count += 1
         url = '%s&%s=%s' % (settings.SER_SOL_API_URL, num_type, num)
-        response = urlopen(url)
-        tree = etree.fromstring(response.read())
-    except:
+        response = upstream.get('sersol360link', url)
+        tree = etree.fromstring(response.content)
+    except (upstream.Unavailable, etree.XMLSyntaxError):
         return []
     output = []
     ns = 'http://xml.serialssolutions.com/ns/openurl/v1.0'
@@ -0,0 +1,407 @@
+"""
+Caching helpers shared by the lookups that sit in front of Voyager: a
+small thread-safe in-process LRU, and a two tier cache that checks the
+LRU before falling back to the shared django cache (memcached).
+
+Both tiers remember misses as well as hits, so a lookup that found
+nothing is not repeated on every request. Misses are kept for a shorter
+time than hits so that newly loaded records still show up quickly.
+
+TieredCache counts where each key it is asked for was found: 'local'
+(the LRU), 'shared' (the django cache) or 'misses' (neither).
+
+StaleCache keeps entries around past their timeout, so that they can be
+served while they are refreshed in the background, or while Voyager is
+unavailable.
+
+SingleFlight coalesces concurrent identical loads, so that a burst of
+requests for one bib runs its Voyager queries once. StaleCache uses it
+for the loads it cannot serve from the cache.
+
+NegativeCache (and its shared instance, missing) remembers lookups that
+found nothing at all: bibids that do not exist, standard numbers with no
+local bib, numbers the external APIs know nothing about.
+"""
+
+import copy
+import hashlib
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from multiprocessing.dummy import Pool
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+from django.utils.encoding import smart_str
+
+logger = logging.getLogger(__name__)
+
+# stored in place of None, which the django cache uses to signal a miss
+NOT_FOUND = '__not_found__'
+
+_SAFE_KEY = re.compile(r'^[\w.:-]{1,200}$')
+
+
+def make_key(prefix, *parts):
+    """
+    Join parts into a cache key, hashing them if the result would not be
+    a valid memcached key.
+    """
+    key = ':'.join([smart_str(part) for part in parts])
+    if not _SAFE_KEY.match(key):
+        key = hashlib.md5(key).hexdigest()
+    return '%s:%s' % (prefix, key)
+
+
+class LRUCache(object):
+    """
+    A bounded, thread-safe mapping with a timeout per entry. The least
+    recently used entry is evicted once maxsize is reached.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value, expires = self._data.pop(key)
+            except KeyError:
+                return default
+            if expires is not None and expires < time.time():
+                return default
+            # re-insert to mark it as most recently used
+            self._data[key] = (value, expires)
+            return value
+
+    def set(self, key, value, timeout=None):
+        expires = time.time() + timeout if timeout is not None else None
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = (value, expires)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class TieredCache(object):
+    """
+    An in-process LRU in front of a django cache. Values of None (and
+    other empty values) are cached as misses, for negative_timeout seconds
+    rather than timeout.
+
+    Entries that may be deleted from another process can be given a
+    shorter local_timeout, which bounds how long this process keeps using
+    its own copy.
+    """
+
+    def __init__(self, prefix, maxsize, timeout, negative_timeout,
+                 alias='default', local_timeout=None):
+        self.prefix = prefix
+        self.timeout = timeout
+        self.negative_timeout = negative_timeout
+        self.alias = alias
+        self.local_timeout = local_timeout
+        self.local = LRUCache(maxsize)
+        self.stats = {'local': 0, 'shared': 0, 'misses': 0}
+        self._lock = threading.Lock()
+
+    def make_key(self, *parts):
+        return make_key(self.prefix, *parts)
+
+    def get_many(self, keys):
+        """
+        Return a dict of the keys found in either tier. Cached misses are
+        included, with a value of None.
+        """
+        found, remote = {}, []
+        for key in keys:
+            value = self.local.get(key, NOT_FOUND)
+            if value is NOT_FOUND:
+                remote.append(key)
+            else:
+                found[key] = value
+        shared = {}
+        if remote:
+            shared = caches[self.alias].get_many(remote)
+            for key, value in shared.items():
+                value = None if value == NOT_FOUND else value
+                self.local.set(key, value, self._timeout(value))
+                found[key] = value
+        with self._lock:
+            self.stats['local'] += len(keys) - len(remote)
+            self.stats['shared'] += len(shared)
+            self.stats['misses'] += len(remote) - len(shared)
+        return found
+
+    def set_many(self, data):
+        hits, misses = {}, {}
+        for key, value in data.items():
+            self.local.set(key, value, self._timeout(value))
+            if value:
+                hits[key] = value
+            else:
+                misses[key] = NOT_FOUND if value is None else value
+        if hits:
+            caches[self.alias].set_many(hits, self.timeout)
+        if misses:
+            caches[self.alias].set_many(misses, self.negative_timeout)
+
+    def delete_many(self, keys):
+        for key in keys:
+            self.local.delete(key)
+        caches[self.alias].delete_many(keys)
+
+    def _timeout(self, value):
+        timeout = self.timeout if value else self.negative_timeout
+        if self.local_timeout is not None:
+            timeout = min(timeout, self.local_timeout)
+        return timeout
+
+
+class SingleFlight(object):
+    """
+    Runs one call per key at a time within this process. The first caller
+    for a key runs func; callers arriving while it works wait for it and
+    get a copy of its result, or the exception it raised.
+    """
+
+    def __init__(self):
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, func):
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = {
+                    'done': threading.Event(), 'result': None, 'error': None}
+        if not leader:
+            flight['done'].wait()
+            if flight['error'] is not None:
+                raise flight['error']
+            return copy.deepcopy(flight['result'])
+        try:
+            result = func()
+            # taken before anyone is woken, as the leader's caller is free
+            # to change its result as soon as it has it
+            flight['result'] = copy.deepcopy(result)
+            return result
+        except Exception as e:
+            flight['error'] = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight['done'].set()
+
+
+class StaleCache(object):
+    """
+    A django cache whose entries are kept for grace seconds past their
+    timeout. A lookup that finds an expired entry returns it at once and
+    starts a refresh in the background; a cache.add lock makes sure only
+    one refresh per key runs at a time, across processes. Refreshes run
+    on a pool of STALE_REFRESH_THREADS threads per process, shared by all
+    StaleCaches, since each may hold a Voyager session; while they are
+    all busy, expired entries are served without starting another.
+
+    While the refresh keeps failing (or has not finished refresh_timeout
+    seconds after the entry expired) the old value is still served, but
+    flagged as stale, until the grace period runs out.
+
+    Loads for a key that is not cached at all are coalesced: only one
+    thread per process runs the loader, and the others wait for it. With
+    a lock_timeout, the first process to start holds a cache.add lock for
+    up to that many seconds, and the others wait for it to store the value
+    rather than loading it themselves.
+
+    A value that valid(value) rejects is loaded again straight away,
+    falling back on the old value, flagged as stale, if that fails.
+
+    None is never cached: looking it up again calls the loader again.
+    """
+
+    def __init__(self, timeout, grace, refresh_timeout, version=None,
+                 alias='default', lock_timeout=0):
+        self.timeout = timeout
+        self.grace = grace
+        self.refresh_timeout = refresh_timeout
+        self.version = version
+        self.alias = alias
+        self.lock_timeout = lock_timeout
+        self.flights = SingleFlight()
+
+    def get(self, key, loader, valid=None):
+        """
+        Return (value, stale) for key, calling loader() to load the value
+        if there is nothing cached, or if valid(value) says the cached
+        value is out of date. Errors from loader are raised only when
+        there is no old value to fall back on.
+        """
+        cache = caches[self.alias]
+        entry = cache.get(key, version=self.version)
+        if entry is None:
+            return self.flights.do(key, lambda: self._load(key, loader)), \
+                False
+        if valid is not None and not valid(entry['value']):
+            return self._reload(key, loader, entry)
+        overdue = time.time() - entry['expires']
+        if overdue < 0:
+            return entry['value'], False
+        self._start_refresh(key, loader)
+        stale = entry.get('failed', False) or overdue > self.refresh_timeout
+        return entry['value'], stale
+
+    def set(self, key, value):
+        if value is None:
+            self.delete(key)
+            return
+        entry = {'value': value, 'expires': time.time() + self.timeout}
+        caches[self.alias].set(key, entry, self.timeout + self.grace,
+                               version=self.version)
+
+    def delete(self, key):
+        caches[self.alias].delete(key, version=self.version)
+
+    def _lock_key(self, key):
+        return '%s:refresh' % key
+
+    def _build_lock_key(self, key):
+        return '%s:build' % key
+
+    def _load(self, key, loader):
+        cache = caches[self.alias]
+        lock = self._build_lock_key(key)
+        locked = False
+        if self.lock_timeout:
+            locked = cache.add(lock, 1, self.lock_timeout,
+                               version=self.version)
+            if not locked:
+                entry = self._wait_for(key, lock)
+                if entry is not None:
+                    return entry['value']
+        try:
+            value = loader()
+            self.set(key, value)
+            return value
+        finally:
+            if locked:
+                cache.delete(lock, version=self.version)
+
+    def _reload(self, key, loader, entry):
+        cache = caches[self.alias]
+        # drop the old entry first, so that other processes wait for the
+        # new one rather than picking the old one up again
+        self.delete(key)
+        try:
+            return self.flights.do(key, lambda: self._load(key, loader)), \
+                False
+        except Exception:
+            logger.exception('unable to reload %s, serving it stale', key)
+            remaining = entry['expires'] + self.grace - time.time()
+            if remaining > 0:
+                cache.add(key, entry, int(remaining) + 1,
+                          version=self.version)
+            return entry['value'], True
+
+    def _wait_for(self, key, lock):
+        """
+        Wait for another process to finish loading key, until it lets go
+        of the lock or lock_timeout runs out, and return its entry.
+        """
+        cache = caches[self.alias]
+        deadline = time.time() + self.lock_timeout
+        while time.time() < deadline:
+            time.sleep(0.05)
+            entry = cache.get(key, version=self.version)
+            if entry is not None:
+                return entry
+            if cache.get(lock, version=self.version) is None:
+                break
+        return None
+
+    def _start_refresh(self, key, loader):
+        if not _refreshing.acquire(False):
+            return
+        if not caches[self.alias].add(self._lock_key(key), 1,
+                                      self.refresh_timeout,
+                                      version=self.version):
+            _refreshing.release()
+            return
+        _refresh_pool().apply_async(self._refresh, (key, loader))
+
+    def _refresh(self, key, loader):
+        cache = caches[self.alias]
+        try:
+            self.set(key, loader())
+        except Exception:
+            logger.exception('unable to refresh %s, serving it stale', key)
+            entry = cache.get(key, version=self.version)
+            if entry is not None:
+                entry['failed'] = True
+                remaining = entry['expires'] + self.grace - time.time()
+                if remaining > 0:
+                    cache.set(key, entry, int(remaining) + 1,
+                              version=self.version)
+        finally:
+            cache.delete(self._lock_key(key), version=self.version)
+            # this thread's database connections would otherwise stay
+            # open, and checked out of the pool, until it is reused
+            for connection in connections.all():
+                connection.close()
+            _refreshing.release()
+
+
+# refreshes running or queued on the pool, at most one per thread
+_refreshing = threading.BoundedSemaphore(settings.STALE_REFRESH_THREADS)
+_refresher = None
+_refresher_lock = threading.Lock()
+
+
+def _refresh_pool():
+    global _refresher
+    with _refresher_lock:
+        if _refresher is None:
+            _refresher = Pool(settings.STALE_REFRESH_THREADS)
+        return _refresher
+
+
+class NegativeCache(object):
+    """
+    A set of lookups known to have found nothing, kept for timeout seconds
+    in a TieredCache with an LRU of maxsize entries.
+    """
+
+    def __init__(self, prefix, maxsize, timeout, alias='default'):
+        self.cache = TieredCache(prefix, maxsize, timeout, timeout, alias)
+
+    def has(self, *parts):
+        key = self.cache.make_key(*parts)
+        return bool(self.cache.get_many([key]).get(key))
+
+    def add(self, *parts):
+        self.cache.set_many({self.cache.make_key(*parts): True})
+
+    def discard(self, *parts):
+        self.cache.delete_many([self.cache.make_key(*parts)])
+
+
+missing = NegativeCache('missing', settings.NEGATIVE_CACHE_SIZE,
+                        settings.NEGATIVE_CACHE_SECONDS)
@@ -0,0 +1,117 @@
+"""
+Change stamps for the circulation side of bibs. The poll_changes command
+looks for items whose status changed, or that were charged, since it
+last looked, and touch()es the bibs they belong to.
+
+Cached holdings and availability carry a stamp() of the bibs they were
+built from (an item page's holdings cover every bib in its BIB_ID_LIST)
+and are thrown away and rebuilt once one of those bibs is touched, see
+the valid argument of ui.cache.StaleCache.get. Checking costs one extra
+cache lookup per hit; bibs that have not changed keep their entries for
+the whole HOLDINGS_CACHE_SECONDS.
+"""
+
+import datetime
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+from django.utils import timezone
+
+from ui.cache import make_key
+
+# the cache key of the last change poll_changes has seen
+WATERMARK_KEY = 'changes:watermark'
+# and of the (bibid, changed) pairs it has touched that are still within
+# the overlap it looks back over
+SEEN_KEY = 'changes:seen'
+
+_CHANGED_ITEMS = """
+SELECT DISTINCT bib_mfhd.bib_id, changed.changed
+FROM (
+  SELECT item_id, item_status_date AS changed
+  FROM item_status
+  WHERE item_status_date > %s
+  UNION ALL
+  SELECT item_id, charge_date AS changed
+  FROM circ_transactions
+  WHERE charge_date > %s
+) changed
+JOIN mfhd_item ON mfhd_item.item_id = changed.item_id
+JOIN bib_mfhd ON bib_mfhd.mfhd_id = mfhd_item.mfhd_id"""
+
+
+def stamp(bibids):
+    """The current change stamps of some bibs, to store with a value."""
+    keys = dict((str(bibid), _stamp_key(bibid)) for bibid in bibids)
+    found = caches['default'].get_many(keys.values())
+    return dict((bibid, found.get(key, 0)) for bibid, key in keys.items())
+
+
+def current(stamps):
+    """Whether none of the bibs in a stamp() have changed since."""
+    return stamp(stamps.keys()) == stamps
+
+
+def touch(bibids):
+    """Mark bibs as changed, invalidating anything stamped with them."""
+    now = time.time()
+    # entries live for their timeout plus the grace period, and so must
+    # the stamps they are checked against
+    caches['default'].set_many(
+        dict((_stamp_key(bibid), now) for bibid in bibids),
+        settings.HOLDINGS_CACHE_SECONDS + settings.STALE_GRACE_SECONDS)
+
+
+def find_changes(since):
+    """
+    Return the (bibid, changed) pairs of items whose status changed, or
+    that were charged, after the datetime since, along with the time of
+    the latest of those changes (or since, if there were none).
+    """
+    cursor = connections['voyager'].cursor()
+    cursor.execute(_CHANGED_ITEMS, [since, since])
+    found = set()
+    latest = since
+    for bibid, changed in cursor.fetchall():
+        changed = _as_datetime(changed)
+        found.add((str(bibid), changed))
+        if changed > latest:
+            latest = changed
+    return found, latest
+
+
+def get_watermark():
+    watermark = caches['default'].get(WATERMARK_KEY)
+    return None if watermark is None else _as_datetime(watermark)
+
+
+def set_watermark(watermark):
+    caches['default'].set(WATERMARK_KEY, watermark, None)
+
+
+def get_seen():
+    return caches['default'].get(SEEN_KEY, set())
+
+
+def set_seen(seen):
+    caches['default'].set(SEEN_KEY, seen, None)
+
+
+def _stamp_key(bibid):
+    return make_key('changed', bibid)
+
+
+def _as_datetime(value):
+    """
+    A change time as the database gave it, made aware if USE_TZ is on so
+    that it compares with the watermark. Like django, take naive times
+    from the database to be in UTC.
+    """
+    # the sqlite stand in hands dates back as strings
+    if isinstance(value, basestring):
+        value = datetime.datetime.strptime(value[:19], '%Y-%m-%d %H:%M:%S')
+    if settings.USE_TZ and timezone.is_naive(value):
+        value = timezone.make_aware(value, timezone.utc)
+    return value
@@ -0,0 +1,85 @@
+"""
+A cache of edition clusters: the bibs found by voyager.get_related_bibids
+for the standard numbers of one type. The copies of an edition held
+across the consortium share some of their numbers, though rarely all of
+them (a print copy may add an e-ISBN, or the ISBNs of its 776 $z), so
+the bib_index lookup is cached for each number on its own, and the
+cluster for a set of numbers is the union of the rows of its members.
+The first copy looked up does the work for every number it has, and a
+later copy only looks up the numbers none of the others had; the numbers
+missing from the cache are looked up together, in one query.
+
+Each number brings in the bibs of up to MAX_HEADINGS of the headings
+around it, and so does the union: a bib with many numbers gets no more
+related bibs than one with a single number.
+
+Numbers are kept for CLUSTER_CACHE_SECONDS in a TieredCache
+(CLUSTER_LRU_SIZE numbers per process). purge() drops a number; other
+processes notice within CLUSTER_LOCAL_SECONDS.
+"""
+
+from django.conf import settings
+
+from ui.cache import TieredCache
+
+# the headings a cluster is made of, as many as the ROWNUM < 12 of the
+# bib_index lookup lets through for one number
+MAX_HEADINGS = 11
+
+_cache = TieredCache('cluster', settings.CLUSTER_LRU_SIZE,
+                     settings.CLUSTER_CACHE_SECONDS,
+                     settings.CLUSTER_CACHE_SECONDS,
+                     local_timeout=settings.CLUSTER_LOCAL_SECONDS)
+
+
+def get(num_type, nums, loader):
+    """
+    Return the cluster rows for a set of numbers, calling loader(nums)
+    once for those that are not cached, which returns {num: rows}. The
+    rows are dicts with a BIB_ID and the NORMAL_HEADING they were found
+    by; they come out in BIB_ID order, without duplicates, and are copied
+    on the way out.
+    """
+    nums = sorted(set(nums))
+    keys = dict((num, _cache.make_key(num_type, num)) for num in nums)
+    found = _cache.get_many(keys.values())
+    wanted = [num for num in nums if keys[num] not in found]
+    if wanted:
+        loaded = loader(wanted)
+        fetched = dict((keys[num], loaded.get(num, [])) for num in wanted)
+        _cache.set_many(fetched)
+        found.update(fetched)
+    rows, seen = [], set()
+    for num in nums:
+        for row in found[keys[num]] or []:
+            identity = tuple(sorted(row.items()))
+            if identity not in seen:
+                seen.add(identity)
+                rows.append(dict(row))
+    rows.sort(key=lambda row: row['BIB_ID'])
+    return _limit(rows, nums)
+
+
+def _limit(rows, nums):
+    """
+    Keep the rows of the first MAX_HEADINGS headings: the numbers asked
+    about, then the others in BIB_ID order.
+    """
+    headings = [num for num in nums
+                if any(row['NORMAL_HEADING'] == num for row in rows)]
+    for row in rows:
+        if row['NORMAL_HEADING'] not in headings:
+            headings.append(row['NORMAL_HEADING'])
+    kept = set(headings[:MAX_HEADINGS])
+    return [row for row in rows if row['NORMAL_HEADING'] in kept]
+
+
+def purge(num_type, num):
+    """
+    Drop a number's cached rows, returning how many entries there were
+    (0 or 1).
+    """
+    key = _cache.make_key(num_type, num)
+    cached = key in _cache.get_many([key])
+    _cache.delete_many([key])
+    return int(cached)
@@ -5,16 +5,31 @@ more fully developed.
 """
 
 import re
-import pymarc
 import logging
 
 from PyZ3950 import zoom
 from django.db import connections
 from django.conf import settings
 
+from ui import changes
+from ui import marccache
+from ui import resolver
+from ui import sql
+from ui.cache import StaleCache, make_key
+
+AVAILABILITY_CACHE_VERSION = 2
+
+# availability is all about circulation status, so it is only served
+# past its timeout briefly
+_availability_cache = StaleCache(
+    settings.HOLDINGS_CACHE_SECONDS, settings.AVAILABILITY_GRACE_SECONDS,
+    settings.STALE_REFRESH_TIMEOUT, version=AVAILABILITY_CACHE_VERSION,
+    lock_timeout=settings.SINGLE_FLIGHT_LOCK_TIMEOUT)
+
 # oracle specific configuration since Voyager's Oracle requires ASCII
 
-if settings.DATABASES['voyager']['ENGINE'] == 'django.db.backends.oracle':
+if settings.DATABASES['voyager']['ENGINE'] in ('django.db.backends.oracle',
+                                               'ui.pooled_oracle'):
     import django.utils.encoding
     import django.db.backends.oracle.base
     # connections are in ascii
@@ -78,13 +93,29 @@ def get_marc(bibid):
     """
     Get pymarc.Record for a given bibid.
     """
-    query = "SELECT wrlcdb.getBibBlob(%s) AS marcblob from bib_master"
-    cursor = connections['voyager'].cursor()
-    cursor.execute(query, [bibid])
-    row = cursor.fetchone()
-    raw_marc = str(row[0])
-    record = pymarc.record.Record(data=raw_marc)
-    return record
+    return marccache.get_record(bibid)
+
+
+def get_cached_availability(bibid):
+    """
+    get_availability, cached like holdings for HOLDINGS_CACHE_SECONDS,
+    or until poll_changes sees one of the bib's items change. Results
+    from an expired entry that could not be refreshed are marked with
+    'stale': True.
+    """
+    cached, stale = _availability_cache.get(
+        make_key('availability', bibid),
+        lambda: _load_cacheable_availability(bibid),
+        valid=lambda cached: changes.current(cached['changes']))
+    results = cached['results']
+    if stale:
+        results = dict(results, stale=True)
+    return results
+
+
+def _load_cacheable_availability(bibid):
+    stamps = changes.stamp([bibid])
+    return {'results': get_availability(bibid), 'changes': stamps}
 
 
 def get_availability(bibid):
@@ -143,37 +174,12 @@ def get_bibid_from_summonid(id):
 
 
 def get_bibid_from_gtid(id):
-    query = \
-        """
-        SELECT bib_index.bib_id
-        FROM bib_index, bib_master
-        WHERE bib_index.normal_heading = %s
-        AND bib_index.index_code = '907A'
-        AND bib_index.bib_id = bib_master.bib_id
-        AND bib_master.library_id IN ('14', '15')
-        """
-    cursor = connections['voyager'].cursor()
-    cursor.execute(query, [id.upper()])
-    results = cursor.fetchone()
-    return str(results[0]) if results else None
+    return resolver.resolve('gt', id.upper())
 
 
 def get_bibid_from_gmid(id):
     id = id.lstrip("m")
-    query = \
-        """
-        SELECT bib_index.bib_id
-        FROM bib_index, bib_master
-        WHERE bib_index.index_code = '035A'
-        AND bib_index.bib_id=bib_master.bib_id
-        AND bib_index.normal_heading=bib_index.display_heading
-        AND bib_master.library_id = '6'
-        AND bib_index.normal_heading = %s
-        """
-    cursor = connections['voyager'].cursor()
-    cursor.execute(query, [id.upper()])
-    results = cursor.fetchone()
-    return str(results[0]) if results else None
+    return resolver.resolve('gm', id.upper())
 
 
 def get_related_bibids(item):
@@ -229,7 +235,7 @@ def get_related_bibids_by_oclc(item):
     if 'oclc' not in item or len(item['oclc']) == 0:
         return []
 
-    binds = ','.join(['%s'] * len(item['oclc']))
+    binds, params = sql.in_binds(item['oclc'])
 
     q = u'''
     SELECT DISTINCT bib_index.bib_id, bib_text.title
@@ -262,7 +268,7 @@ def get_related_bibids_by_oclc(item):
     ORDER BY bib_index.bib_id
     ''' % binds
 
-    rows = _fetch_all(q, item['oclc'])
+    rows = _fetch_all(q, params)
     rows = _filter_by_title(rows, item['name'])
 
     return rows
@@ -272,7 +278,7 @@ def get_related_bibids_by_isbn(item):
     if 'isbn' not in item or len(item['isbn']) == 0:
         return []
 
-    binds = ','.join(['%s'] * len(item['isbn']))
+    binds, params = sql.in_binds(item['isbn'])
 
     q = '''
     SELECT DISTINCT bib_index.bib_id, bib_text.title
@@ -303,7 +309,7 @@ def get_related_bibids_by_isbn(item):
     ORDER BY bib_index.bib_id
     ''' % binds
 
-    rows = _fetch_all(q, item['isbn'])
+    rows = _fetch_all(q, params)
     rows = _filter_by_title(rows, item['name'])
 
     return rows
@@ -313,7 +319,8 @@ def get_related_bibids_by_issn(item):
     if 'issn' not in item or len(item['issn']) == 0:
         return []
 
-    binds = ','.join(['%s'] * len(item['issn']))
+    # voyager wants "1059-1028" to look like "1059 1028"
+    binds, params = sql.in_binds([i.replace('-', ' ') for i in item['issn']])
 
     q = '''
     SELECT DISTINCT bib_index.bib_id, bib_text.title
@@ -344,10 +351,7 @@ def get_related_bibids_by_issn(item):
     ORDER BY bib_index.bib_id
     ''' % binds
 
-    # voyager wants "1059-1028" to look like "1059 1028"
-    issns = [i.replace('-', ' ') for i in item['issn']]
-
-    rows = _fetch_all(q, issns)
+    rows = _fetch_all(q, params)
     rows = _filter_by_title(rows, item['name'])
 
     return rows
@@ -374,7 +378,6 @@ def _get_offers(bibid):
         JOIN library ON library.library_id = bib_master.library_id
         JOIN bib_mfhd ON bib_master.bib_id = bib_mfhd.bib_id
         JOIN mfhd_master ON mfhd_master.mfhd_id = bib_mfhd.mfhd_id
-        JOIN library ON bib_master.library_id = library.library_id
         JOIN location holding_location
           ON mfhd_master.location_id = holding_location.location_id
         LEFT OUTER JOIN mfhd_item
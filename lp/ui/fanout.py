@@ -0,0 +1,55 @@
+"""
+Runs independent lookups, such as the external APIs get_holdings asks
+about links and free copies, at the same time on a shared pool of
+ENRICHMENT_THREADS threads per process, and waits for them only up to a
+deadline.
+
+A lookup still running when the deadline passes keeps its thread until
+it finishes, but its result is dropped.
+"""
+
+import logging
+import threading
+import time
+from multiprocessing import TimeoutError
+from multiprocessing.dummy import Pool
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def run(calls, timeout):
+    """
+    Call each (func, args) in calls on the pool and return their results,
+    in the same order, with None in place of any that raised or had not
+    finished within timeout seconds.
+    """
+    if not calls:
+        return []
+    pool = _get_pool()
+    pending = [pool.apply_async(func, args) for func, args in calls]
+    deadline = time.time() + timeout
+    results = []
+    for (func, args), result in zip(calls, pending):
+        try:
+            results.append(result.get(max(0, deadline - time.time())))
+        except TimeoutError:
+            logger.warning('%s%r took over %ss, dropped', func.__name__,
+                           args, timeout)
+            results.append(None)
+        except Exception:
+            logger.exception('%s%r failed', func.__name__, args)
+            results.append(None)
+    return results
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = Pool(settings.ENRICHMENT_THREADS)
+        return _pool
@@ -0,0 +1,109 @@
+import random
+import time
+from optparse import make_option
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from ui import apis, clusters, marccache, resolver, upstream, voyager
+from ui.cache import missing
+
+# the per-process tiers of the caches get_bib_data and get_holdings use
+LOCAL_CACHES = (marccache._cache, apis._lookups, clusters._cache,
+                resolver._cache, missing.cache)
+
+
+class Command(BaseCommand):
+    args = '<bibid bibid ...>'
+    help = 'count voyager queries and time get_bib_data/get_holdings, ' \
+        'for each bib first with every cache empty (cold) and then again ' \
+        '(warm); the caches used are private to the command'
+
+    option_list = BaseCommand.option_list + (
+        make_option('--sample', action='store', dest='sample', type='int',
+                    default=100, help='number of random bibs to try '
+                    'when no bibids are given'),
+        make_option('--seed', action='store', dest='seed', type='int',
+                    default=0, help='random seed for the sample'),
+        make_option('--no-external', action='store_true',
+                    dest='no_external', default=False,
+                    help='make no calls to external services (open '
+                    'library, hathitrust, 360 Link and the like), so that '
+                    'only voyager is timed'),
+    )
+
+    def handle(self, *args, **options):
+        bibids = list(args) or self.sample(options['sample'],
+                                           options['seed'])
+        if options['no_external']:
+            # every external call goes through ui.upstream, and the
+            # lookups carry on without an answer when it is unavailable
+            upstream.request = self.refuse
+        stats = dict((name, {'cold': [], 'warm': []})
+                     for name in ('get_bib_data', 'get_holdings'))
+        # never empty the caches the site shares
+        private = dict((alias, {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'bench_voyager-%s' % alias,
+        }) for alias in settings.CACHES)
+        with override_settings(CACHES=private):
+            for bibid in bibids:
+                self.clear_caches()
+                for run in ('cold', 'warm'):
+                    if not self.run(bibid, stats, run):
+                        break
+        for name in ('get_bib_data', 'get_holdings'):
+            for run in ('cold', 'warm'):
+                self.report('%s (%s)' % (name, run), stats[name][run])
+
+    def run(self, bibid, stats, run):
+        bib, timing = self.measure(voyager.get_bib_data, bibid)
+        if not bib or bib['LIBRARY_NAME'] in voyager.Z3950_LIBS:
+            return False
+        stats['get_bib_data'][run].append(timing)
+        # as views.item has it for a request with no OpenURL
+        bib['openurl'] = {'params': {}, 'query_string': '',
+                          'query_string_encoded': ''}
+        holdings, timing = self.measure(voyager.get_holdings, bib)
+        stats['get_holdings'][run].append(timing)
+        return True
+
+    def clear_caches(self):
+        for cache in caches.all():
+            cache.clear()
+        for cache in LOCAL_CACHES:
+            cache.local.clear()
+
+    def refuse(self, service, method, url, **kwargs):
+        raise upstream.Unavailable('not calling %s with --no-external' % url)
+
+    def sample(self, size, seed):
+        cursor = connections['voyager'].cursor()
+        cursor.execute('SELECT MAX(bib_id) FROM bib_master', [])
+        top = cursor.fetchone()[0] or 0
+        rand = random.Random(seed)
+        return [str(rand.randint(1, top)) for i in range(size)]
+
+    def measure(self, func, *args):
+        with CaptureQueriesContext(connections['voyager']) as queries:
+            start = time.time()
+            result = func(*args)
+            elapsed = time.time() - start
+        return result, (len(queries), elapsed)
+
+    def report(self, name, timings):
+        if not timings:
+            self.stdout.write('%s: no calls' % name)
+            return
+        counts = [count for count, elapsed in timings]
+        times = sorted([elapsed * 1000 for count, elapsed in timings])
+        self.stdout.write(
+            '%s: %s calls, %.1f queries/call (max %s), '
+            'mean %.1fms, p50 %.1fms, p95 %.1fms, max %.1fms' % (
+                name, len(timings), float(sum(counts)) / len(counts),
+                max(counts), sum(times) / len(times),
+                times[len(times) / 2], times[int(len(times) * 0.95)],
+                times[-1]))
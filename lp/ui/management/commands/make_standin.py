@@ -0,0 +1,35 @@
+from optparse import make_option
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from ui.standin import generate
+
+
+class Command(BaseCommand):
+    help = 'fill the stand-in voyager database with synthetic records'
+
+    option_list = BaseCommand.option_list + (
+        make_option('--bibs', action='store', dest='bibs', type='int',
+                    default=10000, help='number of bibs to generate'),
+        make_option('--seed', action='store', dest='seed', type='int',
+                    default=0, help='random seed'),
+    )
+
+    def handle(self, *args, **options):
+        if settings.DATABASES['voyager']['ENGINE'] != 'ui.standin':
+            raise CommandError('the voyager database is not ui.standin')
+        connection = connections['voyager']
+        connection.ensure_connection()
+        conn = connection.connection
+        if conn.execute("SELECT name FROM sqlite_master "
+                        "WHERE name = 'bib_master'").fetchone():
+            raise CommandError('%s already has voyager tables' %
+                               settings.DATABASES['voyager']['NAME'])
+
+        def progress(count):
+            self.stdout.write('%s bibs' % count)
+
+        generate.generate(conn, options['bibs'], seed=options['seed'],
+                          progress=progress)
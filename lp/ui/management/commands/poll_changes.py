@@ -0,0 +1,78 @@
+import datetime
+import logging
+import time
+from optparse import make_option
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.utils import timezone
+
+from ui import changes
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'find items whose status changed, or that were charged, since ' \
+        'the last poll, and drop the cached holdings and availability of ' \
+        'their bibs'
+
+    option_list = BaseCommand.option_list + (
+        make_option('--interval', action='store', dest='interval',
+                    type='int', default=0, help='keep polling, every this '
+                    'many seconds; by default poll once and exit'),
+        make_option('--since', action='store', dest='since',
+                    help='look for changes after this local time '
+                    '(YYYY-MM-DD HH:MM:SS) rather than after the last one '
+                    'seen'),
+        make_option('--overlap', action='store', dest='overlap',
+                    type='int', default=60, help='look this many seconds '
+                    'back past the last change seen, for transactions '
+                    'that had not been committed yet'),
+    )
+
+    def handle(self, *args, **options):
+        since = None
+        if options['since']:
+            try:
+                since = datetime.datetime.strptime(options['since'],
+                                                   '%Y-%m-%d %H:%M:%S')
+            except ValueError:
+                raise CommandError('--since should look like '
+                                   '2016-02-03 04:05:06')
+            if settings.USE_TZ:
+                since = timezone.make_aware(since)
+        overlap = datetime.timedelta(seconds=options['overlap'])
+        while True:
+            try:
+                self.poll(since, overlap)
+            except Exception:
+                if not options['interval']:
+                    raise
+                logger.exception('unable to poll for changes')
+            finally:
+                for connection in connections.all():
+                    connection.close()
+            if not options['interval']:
+                break
+            since = None
+            time.sleep(options['interval'])
+
+    def poll(self, watermark, overlap):
+        if watermark is None:
+            watermark = changes.get_watermark()
+        if watermark is None:
+            # anything cached before then has expired, and will be
+            # refreshed the next time it is asked for anyway
+            watermark = timezone.now() - datetime.timedelta(
+                seconds=settings.HOLDINGS_CACHE_SECONDS)
+        found, latest = changes.find_changes(watermark - overlap)
+        # the changes in the overlap were touched by the last poll already
+        bibids = set(bibid for bibid, changed in found - changes.get_seen())
+        changes.touch(bibids)
+        since, watermark = watermark, max(latest, watermark)
+        changes.set_watermark(watermark)
+        changes.set_seen(set((bibid, changed) for bibid, changed in found
+                             if changed > watermark - overlap))
+        self.stdout.write('%s bibs changed since %s' % (len(bibids), since))
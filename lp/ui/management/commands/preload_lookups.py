@@ -0,0 +1,67 @@
+import re
+import time
+from collections import Counter
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ui import apis, upstream
+
+LINE = re.compile(r'^\s*(\w+)[:\s]\s*(\S+)')
+
+
+class Command(BaseCommand):
+    args = '<file file ...>'
+    help = 'fill the Open Library and HathiTrust lookup cache for a list ' \
+        'of standard numbers, read one per line as TYPE:number (ISBN, ' \
+        'OCLC, LCCN or OLID) from files'
+
+    option_list = BaseCommand.option_list + (
+        make_option('--services', action='store', dest='services',
+                    default='openlibrary,hathitrust',
+                    help='the services to ask, separated by commas'),
+        make_option('--batch', action='store', dest='batch', type='int',
+                    default=20, help='numbers to look up at a time (Open '
+                    'Library is asked about them in one request)'),
+        make_option('--pause', action='store', dest='pause', type='float',
+                    default=0.2, help='seconds to wait between batches'),
+    )
+
+    def handle(self, *args, **options):
+        services = options['services'].split(',')
+        for service in services:
+            if service not in apis._FETCHERS:
+                raise CommandError('unknown service %s' % service)
+        nums = []
+        for path in args:
+            nums.extend(self.from_file(path))
+        if not nums:
+            raise CommandError('no standard numbers: give files of '
+                               'TYPE:number lines')
+        counts = Counter()
+        batch = options['batch']
+        for start in range(0, len(nums), batch):
+            chunk = nums[start:start + batch]
+            for service in services:
+                try:
+                    for found in apis.lookup_many(service, chunk):
+                        counts['found' if found else 'nothing'] += 1
+                except (upstream.Unavailable, ValueError):
+                    counts['failed'] += len(chunk)
+            time.sleep(options['pause'])
+        self.stdout.write('%s numbers: %s found, %s with nothing, %s '
+                          'failed' % (len(nums), counts['found'],
+                                      counts['nothing'], counts['failed']))
+
+    def from_file(self, path):
+        nums = []
+        with open(path) as fp:
+            for line in fp:
+                match = LINE.match(line)
+                if not match:
+                    continue
+                num_type = match.group(1).upper()
+                num = apis._clean_num(match.group(2), num_type)
+                if num:
+                    nums.append((num, num_type))
+        return nums
@@ -0,0 +1,37 @@
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ui import clusters, voyager
+
+NUM_TYPES = ('isbn', 'issn', 'oclc', 'lccn')
+
+
+class Command(BaseCommand):
+    args = '<num_type> <num> [<num> ...]'
+    help = 'drop the cached edition cluster rows of standard numbers ' \
+        '(isbn, issn, oclc or lccn), or of all the numbers of a bib'
+
+    option_list = BaseCommand.option_list + (
+        make_option('--bibid', action='store', dest='bibid',
+                    help='purge the cluster rows of every standard number '
+                    'related to this bib'),
+    )
+
+    def handle(self, *args, **options):
+        if options['bibid']:
+            related = voyager.get_related_std_nums_many(options['bibid'],
+                                                        NUM_TYPES)
+            targets = [(num_type, norm) for num_type in NUM_TYPES
+                       for norm, display in related[num_type]]
+        elif len(args) >= 2 and args[0] in NUM_TYPES:
+            targets = [(args[0], voyager._normalize_num(num, args[0]))
+                       for num in args[1:]]
+        else:
+            raise CommandError('give a number type (%s) and numbers, or '
+                               '--bibid' % ', '.join(NUM_TYPES))
+        purged = 0
+        for num_type, num in targets:
+            purged += clusters.purge(num_type, num)
+        self.stdout.write('purged %s of %s numbers' % (
+            purged, len(targets)))
@@ -0,0 +1,160 @@
+import glob
+import gzip
+import logging
+import os
+import re
+import threading
+import time
+from collections import Counter
+from multiprocessing.dummy import Pool
+from optparse import make_option
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from ui import db, voyager
+
+logger = logging.getLogger(__name__)
+
+SITEMAP_ITEM = re.compile(r'/item/(\d{2,8})</loc>')
+LOG_ITEM = re.compile(r'"GET \S*?/item/(\d{2,8})(?:\.json|/marc\.json)?'
+                      r'[?\s]')
+
+
+class RateLimiter(object):
+    """Hands out at most rate starts per second, shared between threads."""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0
+        self.next = time.time()
+        self.lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.time()
+            delay = self.next - now
+            self.next = max(now, self.next) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+
+
+class Command(BaseCommand):
+    args = '<file file ...>'
+    help = 'fill the bib, holdings and availability caches for a list ' \
+        'of bibids, read one per line from files, from the sitemaps, or ' \
+        'from the most requested items in an apache access log'
+
+    option_list = BaseCommand.option_list + (
+        make_option('--sitemaps', action='store_true', dest='sitemaps',
+                    default=False, help='read bibids from the sitemaps '
+                    'in SITEMAPS_DIR (see make_sitemap)'),
+        make_option('--access-log', action='store', dest='access_log',
+                    help='read bibids from an apache access log'),
+        make_option('--top', action='store', dest='top', type='int',
+                    default=1000, help='most bibids to warm, from all the '
+                    'sources together: the most requested in the access '
+                    'log first, then those in files and the sitemaps, in '
+                    'order; 0 for no limit'),
+        make_option('--threads', action='store', dest='threads',
+                    type='int', default=4, help='bibs to warm at once'),
+        make_option('--rate', action='store', dest='rate', type='float',
+                    default=5, help='most bibs to start per second; '
+                    '0 for no limit'),
+        make_option('--progress', action='store', dest='progress',
+                    type='int', default=100,
+                    help='report progress every this many bibs; 0 to '
+                    'report only at the end'),
+    )
+
+    def handle(self, *args, **options):
+        bibids = self.bibids(args, options)
+        if not bibids:
+            raise CommandError('no bibids: give files, --sitemaps or '
+                               '--access-log')
+        self.limiter = RateLimiter(options['rate'])
+        self.lock = threading.Lock()
+        self.counts = Counter()
+        self.every = options['progress']
+        self.total = len(bibids)
+        self.start = time.time()
+        self.stdout.write('warming %s bibs with %s threads' % (
+            self.total, options['threads']))
+        pool = Pool(options['threads'])
+        try:
+            pool.map(self.warm, bibids, chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+        self.report()
+
+    def bibids(self, paths, options):
+        """The bibids to warm, busiest first, at most --top of them."""
+        top = options['top'] or None
+        bibids = []
+        if options['access_log']:
+            bibids.extend(self.from_access_log(options['access_log'], top))
+        for path in paths:
+            bibids.extend(self.from_file(path))
+        if options['sitemaps']:
+            bibids.extend(self.from_sitemaps(settings.SITEMAPS_DIR))
+        # keep the first mention of each
+        seen = set()
+        bibids = [b for b in bibids if not (b in seen or seen.add(b))]
+        return bibids[:top]
+
+    def warm(self, bibid):
+        self.limiter.wait()
+        try:
+            bib = voyager.get_bib_data(bibid)
+            if bib:
+                voyager.get_cached_holdings(bib)
+                db.get_cached_availability(bibid)
+                outcome = 'warmed'
+            else:
+                outcome = 'missing'
+        except Exception:
+            logger.exception('unable to warm bibid %s', bibid)
+            outcome = 'failed'
+        finally:
+            # hand this thread's connections back to the pool
+            for connection in connections.all():
+                connection.close()
+        with self.lock:
+            self.counts[outcome] += 1
+            done = sum(self.counts.values())
+            if self.every and done % self.every == 0:
+                self.report()
+
+    def report(self):
+        done = sum(self.counts.values())
+        elapsed = time.time() - self.start
+        self.stdout.write(
+            '%s/%s bibs (%s warmed, %s missing, %s failed) in %.0fs, '
+            '%.1f bibs/s' % (done, self.total, self.counts['warmed'],
+                             self.counts['missing'], self.counts['failed'],
+                             elapsed, done / elapsed if elapsed else 0))
+
+    def from_file(self, path):
+        with open(path) as fp:
+            return [line.strip() for line in fp
+                    if line.strip().isdigit()]
+
+    def from_sitemaps(self, directory):
+        bibids = []
+        for path in sorted(glob.glob(os.path.join(directory,
+                                                  'sitemap-*.xml.gz'))):
+            with gzip.open(path) as fp:
+                bibids.extend(SITEMAP_ITEM.findall(fp.read()))
+        return bibids
+
+    def from_access_log(self, path, top):
+        counts = Counter()
+        with open(path) as fp:
+            for line in fp:
+                match = LOG_ITEM.search(line)
+                if match:
+                    counts[match.group(1)] += 1
+        return [bibid for bibid, count in counts.most_common(top)]
@@ -0,0 +1,164 @@
+"""
+A cache of bib MARC records in front of wrlcdb.getBibBlob. Records are
+kept as raw ISO 2709 bytes, zlib compressed, in a per-process LRU and in
+the shared django cache (see ui.cache.TieredCache). Bibs with no record
+are remembered too, for MARC_NEGATIVE_CACHE_SECONDS.
+
+Within a request (between start() and stop(), which MarcCacheMiddleware
+calls) each record is parsed by pymarc once and the same Record handed
+to every caller, so treat it as read only.
+
+stats() reports how many lookups were answered by the local LRU, by the
+shared cache, or went to Voyager, and how many records were parsed.
+"""
+
+import threading
+import zlib
+
+import pymarc
+
+from django.conf import settings
+from django.db import connections
+from django.utils.encoding import smart_str
+
+from ui import sql
+from ui.cache import TieredCache
+
+_cache = TieredCache('marc', settings.MARC_LRU_SIZE,
+                     settings.MARC_CACHE_SECONDS,
+                     settings.MARC_NEGATIVE_CACHE_SECONDS)
+
+_local = threading.local()
+_parsed = [0]
+
+
+def get_record(bibid):
+    """The pymarc.Record for a bib, or None if it has none."""
+    return get_records([bibid])[bibid]
+
+
+def get_records(bibids):
+    """
+    Return a dict of pymarc.Records (or None) keyed by the bibids as
+    given.
+    """
+    memo = getattr(_local, 'records', None)
+    wanted = [bibid for bibid in bibids
+              if memo is None or _normalize(bibid) not in memo]
+    raw = get_raw_many(wanted) if wanted else {}
+    records = {}
+    for bibid in bibids:
+        key = _normalize(bibid)
+        if memo is not None and key in memo:
+            records[bibid] = memo[key]
+            continue
+        record = _parse(raw[bibid])
+        if memo is not None:
+            memo[key] = record
+        records[bibid] = record
+    return records
+
+
+def get_raw(bibid):
+    return get_raw_many([bibid])[bibid]
+
+
+def get_raw_many(bibids):
+    """
+    Return a dict of raw MARC records (or None) keyed by the bibids as
+    given. Only the bibids missing from both cache tiers are fetched from
+    Voyager, in one query per chunk.
+    """
+    keys = dict((bibid, _cache.make_key(_normalize(bibid)))
+                for bibid in bibids)
+    found = _cache.get_many(list(set(keys.values())))
+    missing = list(set([_normalize(bibid) for bibid in bibids
+                        if keys[bibid] not in found]))
+    fetched = {}
+    for start in range(0, len(missing), sql.IN_LIST_BUCKETS[-1]):
+        chunk = missing[start:start + sql.IN_LIST_BUCKETS[-1]]
+        results = _fetch_blobs(chunk)
+        for bibid in chunk:
+            raw = results.get(bibid)
+            fetched[_cache.make_key(bibid)] = \
+                zlib.compress(raw) if raw else None
+    if fetched:
+        _cache.set_many(fetched)
+        found.update(fetched)
+    raw = {}
+    for bibid in bibids:
+        value = found[keys[bibid]]
+        raw[bibid] = zlib.decompress(value) if value else None
+    return raw
+
+
+def put(bibid, raw, record=None):
+    """
+    Store a raw record that was fetched some other way (along with the
+    parsed record, if there is one, for the rest of the request).
+    """
+    _cache.set_many({_cache.make_key(_normalize(bibid)): zlib.compress(raw)})
+    memo = getattr(_local, 'records', None)
+    if memo is not None and record is not None:
+        memo[_normalize(bibid)] = record
+
+
+def invalidate(bibids):
+    _cache.delete_many([_cache.make_key(_normalize(bibid))
+                        for bibid in bibids])
+    memo = getattr(_local, 'records', None)
+    if memo is not None:
+        for bibid in bibids:
+            memo.pop(_normalize(bibid), None)
+
+
+def stats():
+    counts = dict(_cache.stats)
+    counts['parsed'] = _parsed[0]
+    return counts
+
+
+def start():
+    """Start keeping parsed records for the current thread."""
+    _local.records = {}
+
+
+def stop():
+    _local.records = None
+
+
+def _normalize(bibid):
+    # bib_master hands back bib_ids as numbers, so '0123' is found as 123
+    try:
+        return str(int(bibid))
+    except ValueError:
+        return smart_str(bibid)
+
+
+def _parse(raw):
+    if raw is None:
+        return None
+    _parsed[0] += 1
+    return pymarc.record.Record(data=raw)
+
+
+def _fetch_blobs(bibids):
+    binds, params = sql.in_binds(bibids)
+    query = """
+SELECT bib_master.bib_id, wrlcdb.getBibBlob(bib_master.bib_id) AS marcblob
+FROM bib_master
+WHERE bib_master.bib_id IN (%s)""" % binds
+    cursor = connections['voyager'].cursor()
+    cursor.execute(query, params)
+    return dict((str(bibid), str(blob)) for bibid, blob in cursor.fetchall()
+                if blob is not None)
+
+
+class MarcCacheMiddleware(object):
+
+    def process_request(self, request):
+        start()
+
+    def process_response(self, request, response):
+        stop()
+        return response
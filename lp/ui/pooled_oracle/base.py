@@ -0,0 +1,199 @@
+"""
+An Oracle backend that checks connections out of a per-process
+cx_Oracle SessionPool instead of opening a new session for each one.
+
+Sessions are pinged when they are checked out, and any session that
+fails the ping, or that errored during a request and no longer answers,
+is dropped from the pool rather than handed back. The pool then opens a
+fresh session in its place, so a connection that goes bad (e.g. the
+ORA-65535 errors of #1004) heals without restarting apache.
+
+Enable it in local_settings.py with:
+
+    'voyager': {
+        'ENGINE': 'ui.pooled_oracle',
+        ...
+        'CONN_MAX_AGE': 0,
+        'OPTIONS': {
+            'POOL_MIN': 1,
+            'POOL_MAX': 18,
+            'POOL_INCREMENT': 1,
+            'POOL_WAIT_TIMEOUT': 10,
+        },
+    }
+
+POOL_MAX should be at least the number of mod_wsgi threads per process
+plus STALE_REFRESH_THREADS (see ui.cache.StaleCache), since a thread
+waits for a session when the pool is exhausted; after POOL_WAIT_TIMEOUT
+seconds it gives up with a database error rather than hang. With
+CONN_MAX_AGE at 0 each request hands its session back to the pool when
+it finishes.
+
+The time each request spends waiting for a session is added to its
+query stats (see ui.querystats), and waits longer than
+VOYAGER_SLOW_QUERY_SECONDS are logged along with pool_stats().
+"""
+
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db.backends.oracle import base as oracle
+
+from ui import querystats
+
+Database = oracle.Database
+
+logger = logging.getLogger(__name__)
+
+POOL_OPTIONS = {
+    'POOL_MIN': 1,
+    'POOL_MAX': 15,
+    'POOL_INCREMENT': 1,
+    'POOL_WAIT_TIMEOUT': 10,
+}
+
+# how often to try again for a session while the pool is exhausted
+POOL_RETRY_SECONDS = 0.05
+
+_pools = {}
+_stats = {}
+_lock = threading.Lock()
+
+
+def pool_stats(alias='voyager'):
+    """
+    Return a snapshot of the pool counters for this process: checkouts,
+    total and longest wait for a session (in seconds), sessions dropped
+    as broken, and the pool's current open and busy session counts.
+    """
+    with _lock:
+        stats = dict(_stats.get(alias, {}))
+        pool = _pools.get(alias)
+    if pool is not None:
+        stats['opened'] = pool.opened
+        stats['busy'] = pool.busy
+    return stats
+
+
+def _record(alias, wait=None, dropped=0):
+    with _lock:
+        stats = _stats.setdefault(alias, {
+            'checkouts': 0,
+            'wait_total': 0.0,
+            'wait_max': 0.0,
+            'dropped': 0,
+        })
+        if wait is not None:
+            stats['checkouts'] += 1
+            stats['wait_total'] += wait
+            stats['wait_max'] = max(stats['wait_max'], wait)
+        stats['dropped'] += dropped
+
+
+class DatabaseWrapper(querystats.DatabaseWrapperMixin,
+                      oracle.DatabaseWrapper):
+
+    def get_connection_params(self):
+        conn_params = super(DatabaseWrapper, self).get_connection_params()
+        for key in POOL_OPTIONS:
+            conn_params.pop(key, None)
+        return conn_params
+
+    def _get_pool(self):
+        with _lock:
+            pool = _pools.get(self.alias)
+            if pool is None:
+                options = dict(POOL_OPTIONS)
+                options.update((k, v) for k, v in
+                               self.settings_dict['OPTIONS'].items()
+                               if k in POOL_OPTIONS)
+                pool = Database.SessionPool(
+                    self.settings_dict['USER'],
+                    self.settings_dict['PASSWORD'], self._dsn(),
+                    options['POOL_MIN'], options['POOL_MAX'],
+                    options['POOL_INCREMENT'], threaded=True,
+                    getmode=Database.SPOOL_ATTRVAL_NOWAIT)
+                _pools[self.alias] = pool
+        return pool
+
+    def _wait_timeout(self):
+        return self.settings_dict['OPTIONS'].get(
+            'POOL_WAIT_TIMEOUT', POOL_OPTIONS['POOL_WAIT_TIMEOUT'])
+
+    def _acquire(self, pool):
+        """
+        Check a session out of the pool, waiting up to POOL_WAIT_TIMEOUT
+        seconds for one to be handed back if they are all busy. (The pool
+        is in NOWAIT mode, since cx_Oracle 5 cannot wait with a timeout.)
+        """
+        start = time.time()
+        deadline = start + self._wait_timeout()
+        while True:
+            try:
+                conn = pool.acquire()
+                break
+            except Database.Error:
+                # only an exhausted pool is worth waiting for
+                if pool.busy < pool.max or time.time() >= deadline:
+                    raise
+            time.sleep(POOL_RETRY_SECONDS)
+        wait = time.time() - start
+        _record(self.alias, wait=wait)
+        querystats.record_pool_wait(wait)
+        if wait >= settings.VOYAGER_SLOW_QUERY_SECONDS:
+            logger.warning('waited %.1fms for a %s session: %s',
+                           wait * 1000, self.alias, pool_stats(self.alias))
+        return conn
+
+    def _dsn(self):
+        settings_dict = self.settings_dict
+        if settings_dict['PORT'].strip():
+            return Database.makedsn(settings_dict['HOST'].strip() or
+                                    'localhost',
+                                    int(settings_dict['PORT']),
+                                    settings_dict['NAME'])
+        return settings_dict['NAME']
+
+    def get_new_connection(self, conn_params):
+        pool = self._get_pool()
+        # every open session may have gone bad at once (e.g. after the
+        # database restarts), so allow for dropping all of them and
+        # trying a fresh one
+        for attempt in range(pool.opened + 1):
+            conn = self._acquire(pool)
+            try:
+                conn.ping()
+            except Database.Error as e:
+                logger.warning('dropping broken %s session: %s',
+                               self.alias, e)
+                self._drop(pool, conn)
+                error = e
+                continue
+            return conn
+        raise error
+
+    def _drop(self, pool, conn):
+        try:
+            pool.drop(conn)
+        except Database.Error:
+            pass
+        _record(self.alias, dropped=1)
+
+    def create_cursor(self):
+        cursor = super(DatabaseWrapper, self).create_cursor()
+        cursor.cursor.arraysize = settings.VOYAGER_FETCH_ARRAYSIZE
+        return cursor
+
+    def _close(self):
+        if self.connection is None:
+            return
+        pool = self._get_pool()
+        if self.errors_occurred and not self.is_usable():
+            self._drop(pool, self.connection)
+            return
+        try:
+            pool.release(self.connection)
+        except Database.Error:
+            self._drop(pool, self.connection)
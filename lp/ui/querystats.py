@@ -0,0 +1,203 @@
+"""
+Accounting for the queries sent to Voyager. The voyager backends
+(ui.pooled_oracle, ui.standin) hand out cursors that time every
+statement, including the fetches that follow it, and add it to the
+running totals for the current request:
+
+    count     number of statements executed
+    total     seconds spent in the database
+    max       seconds spent executing the slowest statement
+    queries   {fingerprint: [count, seconds]}
+    pool_wait seconds spent waiting for a session from the pool (see
+              ui.pooled_oracle)
+
+A fingerprint is the statement with its whitespace collapsed, literals
+and bind placeholders replaced by ? and IN lists shortened to (...), so
+that all calls from one query site add up together.
+
+QueryStatsMiddleware resets the totals for each request, logs them when
+the response goes out, and reports them in an X-Voyager-Queries header.
+Any statement slower than VOYAGER_SLOW_QUERY_SECONDS is logged as it
+happens, with the code that issued it and its bind values.
+"""
+
+import logging
+import re
+import threading
+import time
+import traceback
+
+from django.conf import settings
+from django.db.backends import utils
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+
+_WHITESPACE = re.compile(r'\s+')
+_LITERALS = re.compile(r"'[^']*'|\b\d+\b|%s|:arg\d+|\?")
+_IN_LISTS = re.compile(r'\(\s*\?(\s*,\s*\?)*\s*\)')
+
+# how many of a request's costliest statements to log
+TOP_QUERIES = 5
+
+
+def fingerprint(sql):
+    sql = _WHITESPACE.sub(' ', sql).strip()
+    sql = _LITERALS.sub('?', sql)
+    return _IN_LISTS.sub('(...)', sql)
+
+
+def start():
+    """Start counting from zero for the current thread."""
+    _local.stats = {'count': 0, 'total': 0.0, 'max': 0.0, 'queries': {},
+                    'pool_wait': 0.0}
+
+
+def stop():
+    """Stop counting for the current thread and return the totals."""
+    stats = current()
+    _local.stats = None
+    return stats
+
+
+def current():
+    return getattr(_local, 'stats', None)
+
+
+def record(sql, params, elapsed, executed=True):
+    """
+    Add a statement (or, with executed=False, more fetching from one) to
+    the current totals, and log it if it was slow.
+    """
+    stats = current()
+    key = fingerprint(sql)
+    if stats is not None:
+        entry = stats['queries'].setdefault(key, [0, 0.0])
+        if executed:
+            stats['count'] += 1
+            entry[0] += 1
+            stats['max'] = max(stats['max'], elapsed)
+        stats['total'] += elapsed
+        entry[1] += elapsed
+    if executed and elapsed >= settings.VOYAGER_SLOW_QUERY_SECONDS:
+        logger.warning('slow voyager query: %.1fms at %s: %s binds=%s',
+                       elapsed * 1000, call_site(), key[:200],
+                       _format_params(params))
+
+
+def record_pool_wait(elapsed):
+    """Add time spent waiting for a pooled session to the current totals."""
+    stats = current()
+    if stats is not None:
+        stats['pool_wait'] += elapsed
+
+
+def call_site():
+    """The innermost launchpad frame outside this module."""
+    for filename, lineno, function, text in \
+            reversed(traceback.extract_stack()):
+        if '/ui/' in filename and not filename.endswith(
+                ('querystats.py', 'querystats.pyc')) and \
+                '/ui/standin/' not in filename and \
+                '/ui/pooled_oracle/' not in filename:
+            return '%s:%s %s' % (filename.split('/ui/')[-1], lineno,
+                                 function)
+    return 'unknown'
+
+
+def summary(stats):
+    return 'count=%s, total_ms=%.1f, max_ms=%.1f, pool_wait_ms=%.1f' % (
+        stats['count'], stats['total'] * 1000, stats['max'] * 1000,
+        stats['pool_wait'] * 1000)
+
+
+def _format_params(params):
+    if params is None:
+        return None
+    params = list(params)
+    shown = [repr(p)[:40] for p in params[:20]]
+    if len(params) > 20:
+        shown.append('... %s more' % (len(params) - 20))
+    return '[%s]' % ', '.join(shown)
+
+
+class CursorMixin(object):
+    """Times execute and the fetches that follow it."""
+
+    _last_sql = None
+
+    def execute(self, sql, params=None):
+        start = time.time()
+        try:
+            return super(CursorMixin, self).execute(sql, params)
+        finally:
+            self._last_sql = sql
+            record(sql, params, time.time() - start)
+
+    def executemany(self, sql, param_list):
+        start = time.time()
+        try:
+            return super(CursorMixin, self).executemany(sql, param_list)
+        finally:
+            self._last_sql = sql
+            record(sql, None, time.time() - start)
+
+    def _fetch(self, method, *args):
+        start = time.time()
+        try:
+            return self.db.wrap_database_errors(
+                getattr(self.cursor, method))(*args)
+        finally:
+            if self._last_sql is not None:
+                record(self._last_sql, None, time.time() - start,
+                       executed=False)
+
+    def fetchone(self):
+        return self._fetch('fetchone')
+
+    def fetchmany(self, *args):
+        return self._fetch('fetchmany', *args)
+
+    def fetchall(self):
+        return self._fetch('fetchall')
+
+
+class CursorWrapper(CursorMixin, utils.CursorWrapper):
+    pass
+
+
+class CursorDebugWrapper(CursorMixin, utils.CursorDebugWrapper):
+    pass
+
+
+class DatabaseWrapperMixin(object):
+    """Mixed into a backend's DatabaseWrapper to hand out timed cursors."""
+
+    def make_cursor(self, cursor):
+        return CursorWrapper(cursor, self)
+
+    def make_debug_cursor(self, cursor):
+        return CursorDebugWrapper(cursor, self)
+
+
+class QueryStatsMiddleware(object):
+
+    def process_request(self, request):
+        start()
+
+    def process_response(self, request, response):
+        stats = stop()
+        if stats is None:
+            return response
+        response['X-Voyager-Queries'] = summary(stats)
+        if stats['count']:
+            top = sorted(stats['queries'].items(),
+                         key=lambda item: item[1][1], reverse=True)
+            logger.info('voyager queries for %s: %s; top: %s',
+                        request.get_full_path(), summary(stats),
+                        ' | '.join(['%sx %.1fms %s' % (count, elapsed * 1000,
+                                                      sql[:120])
+                                    for sql, (count, elapsed)
+                                    in top[:TOP_QUERIES]]))
+        return response
@@ -0,0 +1,135 @@
+"""
+Translates between WRLC bib ids and the ids Georgetown (907A) and George
+Mason (035A) use for the same records, in both directions. The mappings
+almost never change, so lookups are cached in process and in the shared
+cache, misses included.
+
+The kinds of lookup are:
+
+    gt       Georgetown id (e.g. 'B1234567X') -> WRLC bib id, or None
+    gm       George Mason id -> WRLC bib id, or None
+    wrlc_gt  WRLC bib id -> list of Georgetown ids
+    wrlc_gm  WRLC bib id -> list of George Mason ids
+
+WRLC bib ids are returned as strings.
+"""
+
+from django.conf import settings
+from django.db import connections
+from django.utils.encoding import smart_str
+
+from ui import sql
+from ui.cache import TieredCache
+
+_cache = TieredCache('resolver', settings.RESOLVER_LRU_SIZE,
+                     settings.RESOLVER_CACHE_SECONDS,
+                     settings.RESOLVER_NEGATIVE_CACHE_SECONDS)
+
+
+def resolve(kind, id):
+    return resolve_many(kind, [id])[id]
+
+
+def resolve_many(kind, ids):
+    """
+    Resolve a list of ids of one kind, returning a dict keyed by the ids
+    as given. Only the ids missing from both cache tiers are looked up,
+    in one query per chunk.
+    """
+    lookup = _LOOKUPS[kind]
+    keys = dict((id, _cache.make_key(kind, id)) for id in ids)
+    found = _cache.get_many(list(set(keys.values())))
+    missing = list(set([smart_str(id) for id in ids
+                        if keys[id] not in found]))
+    fetched = {}
+    for start in range(0, len(missing), sql.IN_LIST_BUCKETS[-1]):
+        chunk = missing[start:start + sql.IN_LIST_BUCKETS[-1]]
+        results = lookup(chunk)
+        for id in chunk:
+            value = results.get(id)
+            if kind.startswith('wrlc_') and value is None:
+                value = []
+            fetched[_cache.make_key(kind, id)] = value
+    if fetched:
+        _cache.set_many(fetched)
+        found.update(fetched)
+    resolved = {}
+    for id in ids:
+        value = found[keys[id]]
+        # hand out copies so callers cannot change what is cached
+        resolved[id] = list(value) if isinstance(value, list) else value
+    return resolved
+
+
+def _fetch(query, ids):
+    binds, params = sql.in_binds(ids)
+    cursor = connections['voyager'].cursor()
+    cursor.execute(query % binds, params)
+    return cursor.fetchall()
+
+
+def _bibids_from_gt(ids):
+    query = """
+SELECT bib_index.normal_heading, bib_index.bib_id
+FROM bib_index, bib_master
+WHERE bib_index.normal_heading IN (%s)
+AND bib_index.index_code = '907A'
+AND bib_index.bib_id = bib_master.bib_id
+AND bib_master.library_id IN ('14', '15')
+"""
+    results = {}
+    for heading, bibid in _fetch(query, ids):
+        results.setdefault(smart_str(heading), str(bibid))
+    return results
+
+
+def _bibids_from_gm(ids):
+    query = """
+SELECT bib_index.normal_heading, bib_index.bib_id
+FROM bib_index, bib_master
+WHERE bib_index.index_code = '035A'
+AND bib_index.bib_id=bib_master.bib_id
+AND bib_index.normal_heading=bib_index.display_heading
+AND bib_master.library_id = '6'
+AND bib_index.normal_heading IN (%s)
+"""
+    results = {}
+    for heading, bibid in _fetch(query, ids):
+        results.setdefault(smart_str(heading), str(bibid))
+    return results
+
+
+def _gt_from_bibids(bibids):
+    query = """
+SELECT bib_index.bib_id, LOWER(SUBSTR(bib_index.normal_heading, 0,
+    LENGTH(bib_index.normal_heading)-1))
+FROM bib_index
+WHERE bib_index.bib_id IN (%s)
+AND bib_index.index_code ='907A'
+"""
+    results = {}
+    for bibid, heading in _fetch(query, bibids):
+        results.setdefault(str(bibid), []).append(smart_str(heading.strip()))
+    return results
+
+
+def _gm_from_bibids(bibids):
+    query = """
+SELECT bib_index.bib_id, bib_index.normal_heading
+FROM bib_index
+WHERE bib_index.bib_id IN (%s)
+AND bib_index.index_code ='035A'
+AND bib_index.normal_heading=bib_index.display_heading
+"""
+    results = {}
+    for bibid, heading in _fetch(query, bibids):
+        results.setdefault(str(bibid), []).append(smart_str(heading.strip()))
+    return results
+
+
+_LOOKUPS = {
+    'gt': _bibids_from_gt,
+    'gm': _bibids_from_gm,
+    'wrlc_gt': _gt_from_bibids,
+    'wrlc_gm': _gm_from_bibids,
+}
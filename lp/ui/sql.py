@@ -0,0 +1,47 @@
+"""
+Helpers for building Voyager queries with bind variables instead of
+literal values, so that Oracle sees the same statement text from one
+request to the next and can reuse the parsed cursor.
+"""
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+# IN lists are padded out to one of these sizes so that a handful of
+# statement variants cover every list length; oracle refuses more than 1000
+IN_LIST_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1000)
+
+
+def in_binds(values):
+    """
+    Return a (placeholders, params) pair for an IN list, e.g.
+
+        placeholders, params = in_binds(['a', 'b', 'c'])
+        query = "SELECT ... WHERE x IN (%s)" % placeholders
+
+    The list is padded to the next bucket size by repeating its last value,
+    which leaves the result of the IN test unchanged. An empty list binds a
+    single NULL, which matches nothing.
+    """
+    values = list(values)
+    if not values:
+        values = [None]
+    if len(values) > IN_LIST_BUCKETS[-1]:
+        raise ValueError("too many values for an IN list: %s" % len(values))
+    size = [b for b in IN_LIST_BUCKETS if b >= len(values)][0]
+    values.extend([values[-1]] * (size - len(values)))
+    return ','.join(['%s'] * size), values
+
+
+@receiver(connection_created)
+def _enable_statement_cache(sender, connection, **kwargs):
+    """
+    Have cx_Oracle keep parsed statements around for the life of the
+    connection. Combined with a persistent or pooled connection this means
+    the hot queries are parsed once per session, not once per request.
+    """
+    if connection.alias != 'voyager' or connection.vendor != 'oracle':
+        return
+    connection.connection.stmtcachesize = \
+        settings.VOYAGER_STATEMENT_CACHE_SIZE
@@ -0,0 +1,183 @@
+"""
+A SQLite stand-in for the Voyager database, so that ui.voyager and ui.db
+can be run, tested and benchmarked without the live Oracle instance.
+
+Point the voyager alias at a database built by the make_standin command:
+
+    'voyager': {
+        'ENGINE': 'ui.standin',
+        'NAME': 'lp/lp/voyager.db',
+    }
+
+Queries are rewritten on the way in to cover the Oracle features the
+Voyager code relies on: the wrlcdb. package prefix is dropped (the
+functions themselves are registered from ui.wrlcdb), ROWNUM limits become
+LIMIT clauses, and to_char and Oracle's SUBSTR are provided as Python
+functions. Column names come back in upper case, as they do from Oracle.
+"""
+
+import datetime
+import re
+
+import pymarc
+from django.db.backends.sqlite3 import base as sqlite
+from django.utils.dateparse import parse_date, parse_datetime
+
+from ui import querystats
+from ui import wrlcdb
+from ui.cache import LRUCache
+
+_WRLCDB = re.compile(r'\bwrlcdb\.', re.I)
+_ROWNUM = re.compile(r'\s+AND\s+ROWNUM\s*(<=?)\s*(\d+)', re.I)
+
+# oracle date format elements, longest first
+_DATE_FORMATS = (('yyyy', '%Y'), ('hh24', '%H'), ('mm', '%m'), ('dd', '%d'),
+                 ('mi', '%M'), ('ss', '%S'))
+
+# parsed MARC records kept per connection
+RECORD_CACHE_SIZE = 1000
+
+
+def translate(query):
+    """
+    Rewrite an Oracle query from ui.voyager or ui.db for SQLite.
+    """
+    query = _WRLCDB.sub('', query)
+    match = _ROWNUM.search(query)
+    while match:
+        limit = int(match.group(2))
+        if match.group(1) == '<':
+            limit -= 1
+        query = query[:match.start()] + query[match.end():]
+        # the limit goes at the end of the (sub)query the ROWNUM test was in
+        end, depth = len(query), 0
+        for i in range(match.start(), len(query)):
+            if query[i] == '(':
+                depth += 1
+            elif query[i] == ')':
+                if depth == 0:
+                    end = i
+                    break
+                depth -= 1
+        query = '%s LIMIT %s%s' % (query[:end].rstrip(), limit, query[end:])
+        match = _ROWNUM.search(query)
+    return query
+
+
+def to_char(value, fmt):
+    if value is None:
+        return None
+    if not isinstance(value, (datetime.date, datetime.datetime)):
+        value = parse_datetime(value) or parse_date(value)
+    fmt = fmt.lower()
+    for oracle, python in _DATE_FORMATS:
+        fmt = fmt.replace(oracle, python)
+    return value.strftime(fmt)
+
+
+def substr(value, start, length=None):
+    """Oracle's SUBSTR, which treats a start of 0 as 1."""
+    if value is None:
+        return None
+    if start > 0:
+        start -= 1
+    elif start < 0:
+        start = max(len(value) + start, 0)
+    if length is None:
+        return value[start:]
+    if length < 1:
+        return None
+    return value[start:start + length]
+
+
+def register_functions(conn):
+    """
+    Register to_char, SUBSTR and the wrlcdb functions on a sqlite3
+    connection.
+    """
+    records = LRUCache(RECORD_CACHE_SIZE)
+
+    def blob(table, id):
+        query = ('SELECT record_segment FROM %s_data WHERE %s_id = ? '
+                 'ORDER BY seqnum' % (table, table))
+        segments = conn.execute(query, (id,)).fetchall()
+        if not segments:
+            return None
+        return ''.join([str(segment[0]) for segment in segments])
+
+    def record(table, id):
+        key = (table, id)
+        rec = records.get(key)
+        if rec is None:
+            data = blob(table, id)
+            if data is None:
+                return None
+            rec = pymarc.record.Record(data=data)
+            records.set(key, rec)
+        return rec
+
+    def with_record(table, func):
+        def wrapper(id, *args):
+            rec = record(table, id)
+            return func(rec, *args) if rec is not None else None
+        return wrapper
+
+    def get_bib_blob(bibid):
+        data = blob('bib', bibid)
+        return buffer(data) if data is not None else None
+
+    def get_marc_field(rec, x, y, tag, ind, code, occurrence):
+        return wrlcdb.get_marc_field(rec, tag, code, occurrence)
+
+    def get_all_bib_tag(rec, tag, mode):
+        return wrlcdb.get_all_bib_tag(rec, tag)
+
+    def get_all_tags(id, table, tag, mode):
+        rec = record('bib' if table == 'B' else 'mfhd', id)
+        if rec is None:
+            return None
+        return wrlcdb.get_all_tags(rec.get_fields(tag))
+
+    conn.create_function('to_char', 2, to_char)
+    conn.create_function('substr', 2, substr)
+    conn.create_function('substr', 3, substr)
+    conn.create_function('getbibblob', 1, get_bib_blob)
+    conn.create_function('getmarcfield', 7,
+                         with_record('bib', get_marc_field))
+    conn.create_function('getbibtag', 2,
+                         with_record('bib', wrlcdb.get_bib_tag))
+    conn.create_function('getallbibtag', 3,
+                         with_record('bib', get_all_bib_tag))
+    conn.create_function('getmfhdsubfield', 3,
+                         with_record('mfhd', wrlcdb.get_mfhd_subfield))
+    conn.create_function('getalltags', 4, get_all_tags)
+
+
+class CursorWrapper(sqlite.SQLiteCursorWrapper):
+
+    def execute(self, query, params=None):
+        if params is None:
+            return sqlite.Database.Cursor.execute(self, translate(query))
+        return super(CursorWrapper, self).execute(query, params)
+
+    def convert_query(self, query):
+        return super(CursorWrapper, self).convert_query(translate(query))
+
+    @property
+    def description(self):
+        desc = super(CursorWrapper, self).description
+        if desc is None:
+            return None
+        return tuple((col[0].upper(),) + tuple(col[1:]) for col in desc)
+
+
+class DatabaseWrapper(querystats.DatabaseWrapperMixin,
+                      sqlite.DatabaseWrapper):
+
+    def get_new_connection(self, conn_params):
+        conn = super(DatabaseWrapper, self).get_new_connection(conn_params)
+        register_functions(conn)
+        return conn
+
+    def create_cursor(self):
+        return self.connection.cursor(factory=CursorWrapper)
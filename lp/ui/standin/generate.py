@@ -0,0 +1,309 @@
+"""
+Fills a stand-in Voyager database (see ui.standin.base) with synthetic
+records. Bibs are generated in clusters that share standard numbers
+across libraries, the way copies of one work do in the consortium, each
+with MARC holdings and items in a spread of statuses. The output depends
+only on the seed, and rows are written in batches so that the database
+can be grown to millions of bibs.
+"""
+
+import datetime
+import random
+
+import pymarc
+
+from ui.standin import schema
+
+# library_id, library_name; the ids match the ones ui.voyager and ui.db
+# single out (GW_LIBRARY_IDS, GT in 14/15, GM in 6)
+LIBRARIES = [
+    (1, 'AU'), (2, 'CU'), (3, 'DC'), (4, 'GA'), (5, 'HU'), (6, 'GM'),
+    (7, 'GW'), (8, 'MU'), (9, 'TR'), (10, 'AL'), (11, 'JB'), (12, 'WR'),
+    (13, 'HL'), (14, 'GT'), (15, 'DA'), (18, 'HI'), (21, 'E-Resources'),
+]
+
+# held through their own catalogs; their bibs are kept out of clusters
+Z3950_LIBRARY_IDS = (6, 14, 15)
+
+# Himmelfarb, whose holdings get a link from their bib (see
+# ui.voyager.get_himmelfarb_linkonbib)
+HIMMELFARB_LIBRARY_ID = 18
+
+ITEM_STATUSES = [
+    (1, 'Not Charged'), (2, 'Charged'), (3, 'Renewed'), (4, 'Overdue'),
+    (12, 'Missing'), (13, 'Lost--Library Applied'), (17, 'Withdrawn'),
+    (19, 'Cataloging Review'), (22, 'In Process'),
+]
+
+# (item_status, weight)
+STATUS_WEIGHTS = [(1, 80), (2, 12), (3, 2), (4, 2), (12, 1), (13, 1),
+                  (17, 1), (19, 1)]
+
+LOCATIONS_PER_LIBRARY = ('Stacks', 'Reserve', 'Online')
+
+# bytes per bib_data/mfhd_data row
+SEGMENT_SIZE = 990
+
+WORDS = ('history', 'science', 'river', 'letters', 'modern', 'american',
+         'theory', 'garden', 'war', 'economics', 'city', 'law', 'poems',
+         'medicine', 'music', 'atlas', 'journal', 'studies', 'language',
+         'politics', 'early', 'national', 'art', 'survey', 'children')
+
+NAMES = ('Smith', 'Jones', 'Garcia', 'Chen', 'Okafor', 'Novak', 'Rossi',
+         'Kim', 'Dubois', 'Silva', 'Ivanova', 'Tanaka', 'Cohen', 'Murphy')
+
+
+def generate(conn, bibs, seed=0, batch_size=10000, progress=None):
+    """
+    Create the stand-in tables on an empty sqlite3 connection and load
+    them with about `bibs` bibs. progress, if given, is called with the
+    number of bibs written after each batch.
+    """
+    rand = random.Random(seed)
+    conn.execute('PRAGMA journal_mode = OFF')
+    conn.execute('PRAGMA synchronous = OFF')
+    schema.create_tables(conn)
+    _load_lookups(conn)
+    rows = _Batch(conn)
+    ids = {'bib': 0, 'mfhd': 0, 'item': 0, 'circ': 0, 'hold': 0}
+    work = 0
+    while ids['bib'] < bibs:
+        work += 1
+        for bib in _work(rand, work, bibs - ids['bib']):
+            ids['bib'] += 1
+            _add_bib(rand, rows, ids, bib)
+        if rows.count >= batch_size:
+            rows.flush()
+            if progress:
+                progress(ids['bib'])
+    rows.flush()
+    schema.create_indexes(conn)
+    conn.commit()
+    if progress:
+        progress(ids['bib'])
+    return ids['bib']
+
+
+class _Batch(object):
+    """Rows waiting to be inserted, by table."""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.rows = {}
+        self.count = 0
+
+    def add(self, table, row):
+        self.rows.setdefault(table, []).append(row)
+        self.count += 1
+
+    def flush(self):
+        for table, rows in self.rows.items():
+            self.conn.executemany(
+                'INSERT INTO %s VALUES (%s)' % (table,
+                                                ','.join('?' * len(rows[0]))),
+                rows)
+        self.conn.commit()
+        self.rows = {}
+        self.count = 0
+
+
+def _load_lookups(conn):
+    locations = []
+    for library_id, name in LIBRARIES:
+        for i, location in enumerate(LOCATIONS_PER_LIBRARY):
+            locations.append((library_id * 10 + i, '%s%s' % (name, i),
+                              location.upper(), '%s: %s' % (name, location),
+                              library_id))
+    conn.executemany('INSERT INTO library VALUES (?, ?, ?)',
+                     [(i, name, name) for i, name in LIBRARIES])
+    conn.executemany('INSERT INTO location VALUES (?, ?, ?, ?, ?)',
+                     locations)
+    conn.executemany('INSERT INTO item_status_type VALUES (?, ?)',
+                     ITEM_STATUSES)
+
+
+def _work(rand, work, remaining):
+    """
+    The bibs for one work: one bib in a z39.50 library, or one to four
+    bibs in the other libraries sharing the work's standard numbers.
+    """
+    title = ' '.join(rand.sample(WORDS, rand.randint(2, 5))).capitalize()
+    common = {
+        'title': title,
+        'author': '%s, %s.' % (rand.choice(NAMES), rand.choice('ABCDEFGHJK')),
+        'year': str(rand.randint(1850, 2016)),
+        'serial': rand.random() < 0.1,
+        'isbns': ['978%010d' % rand.randint(0, 10 ** 10 - 1)
+                  for i in range(rand.choice((0, 1, 1, 2)))],
+        'oclc': str(work + 10000000) if rand.random() < 0.9 else None,
+        'lccn': '%04d%06d' % (rand.randint(1950, 2016), work % 1000000)
+        if rand.random() < 0.6 else None,
+        'issn': '%04d %04d' % (work % 10000, rand.randint(0, 9999)),
+    }
+    if rand.random() < 0.1:
+        libraries = [rand.choice(Z3950_LIBRARY_IDS)]
+        common['isbns'], common['oclc'], common['lccn'] = [], None, None
+    else:
+        others = [l for l, name in LIBRARIES if l not in Z3950_LIBRARY_IDS]
+        count = min(rand.choice((1, 1, 1, 2, 2, 3, 4)), remaining)
+        libraries = rand.sample(others, count)
+    return [dict(common, library_id=l) for l in libraries]
+
+
+def _add_bib(rand, rows, ids, bib):
+    bibid = ids['bib']
+    library_id = bib['library_id']
+    created = datetime.datetime(2000, 1, 1) + \
+        datetime.timedelta(seconds=rand.randint(0, 16 * 365 * 86400))
+    updated = created + datetime.timedelta(days=rand.randint(0, 365))
+    suppress = 'Y' if rand.random() < 0.02 else 'N'
+    rows.add('bib_master', (bibid, library_id, suppress, str(created),
+                            str(updated)))
+    isbns = bib['isbns']
+    oclc = '(OCoLC)ocm%s' % bib['oclc'] if bib['oclc'] else None
+    lccn = '  %s' % bib['lccn'] if bib['lccn'] else None
+    issn = bib['issn'].replace(' ', '-') if bib['serial'] else None
+    publisher = '%s Press' % rand.choice(NAMES)
+    rows.add('bib_text', (
+        bibid, bib['author'], bib['title'] + ' /', bib['title'], None,
+        'Washington : %s, %s.' % (publisher, bib['year']), 'Washington',
+        publisher, bib['year'], 'eng', 'as' if bib['serial'] else 'am',
+        isbns[0] + ' (pbk.)' if isbns else None, issn, lccn, oclc))
+    for isbn in isbns:
+        rows.add('bib_index', (bibid, '020A', isbn, isbn + ' (pbk.)'))
+    if oclc:
+        rows.add('bib_index', (bibid, '035A', bib['oclc'], oclc))
+    if lccn:
+        rows.add('bib_index', (bibid, '010A', bib['lccn'], lccn))
+    if issn:
+        rows.add('bib_index', (bibid, '022A', bib['issn'], issn))
+    if rand.random() < 0.3:
+        rows.add('bib_index', (bibid, '700H', '', '%s, %s.' % (
+            rand.choice(NAMES), rand.choice('ABCDEFGHJK'))))
+    if library_id in (14, 15):
+        rows.add('bib_index', (bibid, '907A', 'B%07dX' % bibid,
+                               '.b%07dx' % bibid))
+    elif library_id == 6:
+        rows.add('bib_index', (bibid, '035A', str(bibid), str(bibid)))
+
+    record = _bib_record(rand, bibid, bib, isbns, oclc, lccn, issn, publisher)
+    _add_segments(rows, 'bib_data', bibid, record)
+    if library_id in Z3950_LIBRARY_IDS:
+        return
+    for i in range(rand.choice((1, 1, 1, 2, 3))):
+        ids['mfhd'] += 1
+        _add_mfhd(rand, rows, ids, bibid, library_id, bib, created)
+
+
+def _bib_record(rand, bibid, bib, isbns, oclc, lccn, issn, publisher):
+    record = pymarc.Record()
+    record.add_field(pymarc.Field(tag='001', data=str(bibid)))
+    record.add_field(pymarc.Field(
+        tag='008', data='000101s%s    dcu           000 0 eng d' %
+        bib['year']))
+    if lccn:
+        record.add_field(_field('010', [' ', ' '], ['a', lccn]))
+    for isbn in isbns:
+        record.add_field(_field('020', [' ', ' '], ['a', isbn + ' (pbk.)']))
+    if issn:
+        record.add_field(_field('022', ['0', ' '], ['a', issn]))
+    if oclc:
+        record.add_field(_field('035', [' ', ' '], ['a', oclc]))
+    record.add_field(_field('100', ['1', ' '], ['a', bib['author']]))
+    subfields = ['a', bib['title'] + ' /', 'c', bib['author']]
+    if rand.random() < 0.05:
+        subfields = ['6', '880-01'] + subfields
+        record.add_field(_field('880', ['1', '0'],
+                                ['6', '245-01', 'a', bib['title']]))
+    record.add_field(_field('245', ['1', '0'], subfields))
+    record.add_field(_field('260', [' ', ' '],
+                            ['a', 'Washington :', 'b', publisher + ',',
+                             'c', bib['year'] + '.']))
+    if rand.random() < 0.1 or bib['library_id'] == HIMMELFARB_LIBRARY_ID:
+        record.add_field(_field('856', ['4', '0'],
+                                ['u', 'http://example.org/%s' % bibid,
+                                 'z', 'Full text available']))
+    if bib['library_id'] == HIMMELFARB_LIBRARY_ID:
+        # ui.voyager reads Himmelfarb's e-resource link from the second 856
+        # of every bib it holds
+        record.add_field(_field('856', ['4', '1'],
+                                ['u', 'http://example.org/hi/%s' % bibid]))
+    if isbns and rand.random() < 0.05:
+        record.add_field(_field('776', ['0', '8'],
+                                ['z', '978%010d' % rand.randint(0, 10 ** 9)]))
+    return record
+
+
+def _add_mfhd(rand, rows, ids, bibid, library_id, bib, created):
+    mfhd_id = ids['mfhd']
+    online = rand.random() < 0.1
+    location_id = library_id * 10 + (2 if online else
+                                     rand.choice((0, 0, 0, 0, 1)))
+    call_no = '%s%s%s .%s%s %s' % (rand.choice('BDEHKLNPQRT'),
+                                   rand.choice('ABCDEFGHJK'),
+                                   rand.randint(1, 9999),
+                                   rand.choice('ABCDEFGHJK'),
+                                   rand.randint(1, 99), bib['year'])
+    rows.add('bib_mfhd', (bibid, mfhd_id))
+    rows.add('mfhd_master', (mfhd_id, location_id, call_no, 'N',
+                             str(created), str(created)))
+    record = pymarc.Record()
+    record.add_field(pymarc.Field(tag='001', data=str(mfhd_id)))
+    subfields = ['b', str(location_id), 'h', call_no]
+    if rand.random() < 0.1:
+        subfields += ['z', 'Ask at the circulation desk']
+    record.add_field(_field('852', ['0', '0'], subfields))
+    if online:
+        record.add_field(_field('856', ['4', '0'],
+                                ['u', 'http://example.org/m/%s' % mfhd_id,
+                                 'z', 'Connect to resource']))
+    if bib['serial']:
+        record.add_field(_field('866', ['4', '1'],
+                                ['8', '0', 'a', 'v.1 (%s)-' % bib['year']]))
+    _add_segments(rows, 'mfhd_data', mfhd_id, record)
+    if online:
+        return
+    for i in range(rand.choice((0, 1, 1, 1, 2, 3, 5))):
+        ids['item'] += 1
+        _add_item(rand, rows, ids, mfhd_id, location_id, bib, i, created)
+
+
+def _add_item(rand, rows, ids, mfhd_id, location_id, bib, i, created):
+    item_id = ids['item']
+    temp_location = location_id + 1 if rand.random() < 0.05 else None
+    status = _weighted(rand, STATUS_WEIGHTS)
+    status_date = created + datetime.timedelta(days=rand.randint(0, 3650))
+    rows.add('item', (item_id, location_id, temp_location, str(created),
+                      str(status_date)))
+    rows.add('mfhd_item', (mfhd_id, item_id,
+                           'v.%s' % (i + 1) if bib['serial'] else None, None))
+    rows.add('item_status', (item_id, status, str(status_date)))
+    if status in (2, 3, 4):
+        ids['circ'] += 1
+        due = status_date + datetime.timedelta(days=28)
+        rows.add('circ_transactions', (ids['circ'], item_id,
+                                       str(status_date), str(due), str(due)))
+        if rand.random() < 0.1:
+            ids['hold'] += 1
+            rows.add('hold_recall_items', (ids['hold'], item_id, 1))
+
+
+def _add_segments(rows, table, id, record):
+    data = record.as_marc()
+    for seqnum, start in enumerate(range(0, len(data), SEGMENT_SIZE)):
+        rows.add(table, (id, seqnum + 1,
+                         buffer(data[start:start + SEGMENT_SIZE])))
+
+
+def _field(tag, indicators, subfields):
+    return pymarc.Field(tag=tag, indicators=indicators, subfields=subfields)
+
+
+def _weighted(rand, choices):
+    total = sum(weight for choice, weight in choices)
+    n = rand.uniform(0, total)
+    for choice, weight in choices:
+        n -= weight
+        if n <= 0:
+            return choice
+    return choices[-1][0]
@@ -0,0 +1,129 @@
+"""
+The subset of the Voyager schema that ui.voyager and ui.db query, as
+SQLite DDL. MARC records live in bib_data and mfhd_data as they do in
+Voyager, split into numbered segments.
+"""
+
+TABLES = """
+CREATE TABLE library (
+    library_id INTEGER PRIMARY KEY,
+    library_name TEXT,
+    library_display_name TEXT
+);
+CREATE TABLE location (
+    location_id INTEGER PRIMARY KEY,
+    location_code TEXT,
+    location_name TEXT,
+    location_display_name TEXT,
+    library_id INTEGER
+);
+CREATE TABLE bib_master (
+    bib_id INTEGER PRIMARY KEY,
+    library_id INTEGER,
+    suppress_in_opac TEXT,
+    create_date datetime,
+    update_date datetime
+);
+CREATE TABLE bib_text (
+    bib_id INTEGER PRIMARY KEY,
+    author TEXT,
+    title TEXT,
+    title_brief TEXT,
+    edition TEXT,
+    imprint TEXT,
+    pub_place TEXT,
+    publisher TEXT,
+    publisher_date TEXT,
+    language TEXT,
+    bib_format TEXT,
+    isbn TEXT,
+    issn TEXT,
+    lccn TEXT,
+    network_number TEXT
+);
+CREATE TABLE bib_index (
+    bib_id INTEGER,
+    index_code TEXT,
+    normal_heading TEXT,
+    display_heading TEXT
+);
+CREATE TABLE bib_data (
+    bib_id INTEGER,
+    seqnum INTEGER,
+    record_segment BLOB,
+    PRIMARY KEY (bib_id, seqnum)
+);
+CREATE TABLE bib_mfhd (
+    bib_id INTEGER,
+    mfhd_id INTEGER,
+    PRIMARY KEY (bib_id, mfhd_id)
+);
+CREATE TABLE mfhd_master (
+    mfhd_id INTEGER PRIMARY KEY,
+    location_id INTEGER,
+    display_call_no TEXT,
+    suppress_in_opac TEXT,
+    create_date datetime,
+    update_date datetime
+);
+CREATE TABLE mfhd_data (
+    mfhd_id INTEGER,
+    seqnum INTEGER,
+    record_segment BLOB,
+    PRIMARY KEY (mfhd_id, seqnum)
+);
+CREATE TABLE mfhd_item (
+    mfhd_id INTEGER,
+    item_id INTEGER,
+    item_enum TEXT,
+    chron TEXT
+);
+CREATE TABLE item (
+    item_id INTEGER PRIMARY KEY,
+    perm_location INTEGER,
+    temp_location INTEGER,
+    create_date datetime,
+    modify_date datetime
+);
+CREATE TABLE item_status (
+    item_id INTEGER,
+    item_status INTEGER,
+    item_status_date datetime
+);
+CREATE TABLE item_status_type (
+    item_status_type INTEGER PRIMARY KEY,
+    item_status_desc TEXT
+);
+CREATE TABLE circ_transactions (
+    circ_transaction_id INTEGER PRIMARY KEY,
+    item_id INTEGER,
+    charge_date datetime,
+    charge_due_date datetime,
+    current_due_date datetime
+);
+CREATE TABLE hold_recall_items (
+    hold_recall_id INTEGER,
+    item_id INTEGER,
+    queue_position INTEGER
+);
+"""
+
+# created after the data is loaded, which is much faster
+INDEXES = """
+CREATE INDEX bib_index_heading ON bib_index (index_code, normal_heading);
+CREATE INDEX bib_index_bib ON bib_index (bib_id, index_code);
+CREATE INDEX bib_mfhd_mfhd ON bib_mfhd (mfhd_id);
+CREATE INDEX mfhd_item_mfhd ON mfhd_item (mfhd_id);
+CREATE INDEX mfhd_item_item ON mfhd_item (item_id);
+CREATE INDEX item_status_item ON item_status (item_id);
+CREATE INDEX circ_transactions_item ON circ_transactions (item_id);
+CREATE INDEX hold_recall_items_item ON hold_recall_items (item_id);
+"""
+
+
+def create_tables(conn):
+    conn.executescript(TABLES)
+
+
+def create_indexes(conn):
+    conn.executescript(INDEXES)
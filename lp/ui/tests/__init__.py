@@ -0,0 +1,6 @@
+# a cache for tests to run against in place of memcached
+LOCMEM = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
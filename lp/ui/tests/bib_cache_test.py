@@ -0,0 +1,97 @@
+from django.core.cache import caches
+from django.test import TestCase
+from django.test.utils import override_settings
+
+from ui import voyager
+from ui.cache import missing
+from ui.tests import LOCMEM
+
+
+@override_settings(CACHES=LOCMEM)
+class BibCacheTest(TestCase):
+
+    def setUp(self):
+        caches['default'].clear()
+        missing.cache.local.clear()
+        self.calls = []
+        self.originals = (voyager._load_bib_data, voyager.get_related_isbns)
+        voyager._load_bib_data = self.load
+        voyager.get_related_isbns = lambda bibs: ['0123456789']
+
+    def tearDown(self):
+        voyager._load_bib_data, voyager.get_related_isbns = self.originals
+
+    def load(self, bibid, expand_ids=True, exclude_names=False):
+        self.calls.append((bibid, expand_ids, exclude_names))
+        if bibid == '404':
+            return None
+        return {'BIB_ID': bibid, 'BIB_ID_LIST': [{'BIB_ID': bibid}]}
+
+    def test_shared_copy(self):
+        bib = voyager.get_bib_data('12')
+        bib['openurl'] = {'params': 'rft.btitle=x'}
+        self.assertEqual(voyager.get_bib_data('12'),
+                         {'BIB_ID': '12', 'BIB_ID_LIST': [{'BIB_ID': '12'}],
+                          'RELATED_ISBN_LIST': ['0123456789']})
+        self.assertEqual(len(self.calls), 1)
+
+    def test_partial_lookups_skip_cache(self):
+        voyager.get_bib_data('12', expand_ids=False)
+        voyager.get_bib_data('12')
+        self.assertEqual(self.calls,
+                         [('12', False, False), ('12', True, False)])
+
+    def test_missing_cached(self):
+        self.assertEqual(voyager.get_bib_data('404'), None)
+        self.assertEqual(voyager.get_bib_data('404'), None)
+        self.assertEqual(len(self.calls), 1)
+
+    def test_version(self):
+        voyager.get_bib_data('12')
+        key = voyager.bib_cache_key('12')
+        self.assertTrue(caches['default'].get(
+            key, version=voyager.BIB_CACHE_VERSION))
+        self.assertEqual(caches['default'].get(
+            key, version=voyager.BIB_CACHE_VERSION + 1), None)
+
+
+@override_settings(CACHES=LOCMEM)
+class HoldingsCacheTest(TestCase):
+
+    def setUp(self):
+        caches['default'].clear()
+        self.calls = 0
+        self.original = voyager._get_holdings
+        voyager._get_holdings = self.get_holdings
+
+    def tearDown(self):
+        voyager._get_holdings = self.original
+
+    def get_holdings(self, bib_data, lib=None, translate_bib=True):
+        self.calls += 1
+        bib_data['LINK'] = 'http://example.org/'
+        return [{'MFHD_ID': 1, 'ITEMS': []}], False
+
+    def bib(self, query_string):
+        return {'BIB_ID': '12', 'BIB_FORMAT': 'am', 'TITLE': 'A title',
+                'LINK': '$uhttp://example.org/',
+                'openurl': {'params': {},
+                            'query_string_encoded': query_string}}
+
+    def test_cached(self):
+        first = voyager.get_cached_holdings(self.bib('a=1'))
+        first[0]['ITEMS'].append({})
+        bib = self.bib('a=2')
+        self.assertEqual(voyager.get_cached_holdings(bib),
+                         [{'MFHD_ID': 1, 'ITEMS': []}])
+        self.assertEqual(self.calls, 1)
+        # changes the lookup made to the bib are replayed
+        self.assertEqual(bib['LINK'], 'http://example.org/')
+
+    def test_links_per_request(self):
+        bib = self.bib('a=1')
+        voyager.get_cached_holdings(bib)
+        other = self.bib('a=2')
+        voyager.get_cached_holdings(other)
+        self.assertTrue('a=1' in bib['ILLIAD_LINK'])
+        self.assertTrue('a=2' in other['ILLIAD_LINK'])
@@ -0,0 +1,357 @@
+import os
+import threading
+import time
+
+from django.core.cache import caches
+from django.db.utils import DatabaseError
+from django.test import TestCase
+from django.test.utils import override_settings
+
+from ui import cache
+from ui import marccache
+from ui import resolver
+from ui.cache import LRUCache, NegativeCache, SingleFlight, StaleCache, \
+    TieredCache
+from ui.tests import LOCMEM
+
+
+class LRUCacheTest(TestCase):
+
+    def test_eviction(self):
+        lru = LRUCache(2)
+        lru.set('a', 1)
+        lru.set('b', 2)
+        # touching 'a' leaves 'b' as the least recently used
+        self.assertEqual(lru.get('a'), 1)
+        lru.set('c', 3)
+        self.assertEqual(lru.get('b'), None)
+        self.assertEqual(lru.get('a'), 1)
+        self.assertEqual(lru.get('c'), 3)
+        self.assertEqual(len(lru), 2)
+
+    def test_timeout(self):
+        lru = LRUCache(2)
+        lru.set('a', 1, timeout=-1)
+        self.assertEqual(lru.get('a', 'gone'), 'gone')
+
+
+@override_settings(CACHES=LOCMEM)
+class TieredCacheTest(TestCase):
+
+    def setUp(self):
+        caches['default'].clear()
+
+    def test_negative(self):
+        tiered = TieredCache('test', 10, 60, 60)
+        tiered.set_many({'a': None, 'b': '1'})
+        self.assertEqual(tiered.get_many(['a', 'b', 'c']),
+                         {'a': None, 'b': '1'})
+
+    def test_shared_tier(self):
+        TieredCache('test', 10, 60, 60).set_many({'a': None, 'b': '1'})
+        # a fresh process would only have the shared cache to go on
+        tiered = TieredCache('test', 10, 60, 60)
+        self.assertEqual(tiered.get_many(['a', 'b']), {'a': None, 'b': '1'})
+
+    def test_stats(self):
+        TieredCache('test', 10, 60, 60).set_many({'a': '1'})
+        tiered = TieredCache('test', 10, 60, 60)
+        tiered.get_many(['a', 'b'])
+        tiered.get_many(['a'])
+        self.assertEqual(tiered.stats, {'local': 1, 'shared': 1, 'misses': 1})
+
+    def test_unsafe_key(self):
+        tiered = TieredCache('test', 10, 60, 60)
+        key = tiered.make_key('gt', 'has a space')
+        self.assertTrue(key.startswith('test:'))
+        self.assertFalse(' ' in key)
+
+
+@override_settings(CACHES=LOCMEM)
+class ResolverTest(TestCase):
+
+    def setUp(self):
+        self.lookups = []
+        self.original = resolver._LOOKUPS['gt']
+        resolver._cache.local.clear()
+        caches['default'].clear()
+
+        def lookup(ids):
+            self.lookups.append(sorted(ids))
+            return {'B1': '101', 'B2': '102'}
+        resolver._LOOKUPS['gt'] = lookup
+
+    def tearDown(self):
+        resolver._LOOKUPS['gt'] = self.original
+
+    def test_resolve_many(self):
+        self.assertEqual(resolver.resolve_many('gt', ['B1', 'B2', 'B3']),
+                         {'B1': '101', 'B2': '102', 'B3': None})
+        self.assertEqual(self.lookups, [['B1', 'B2', 'B3']])
+
+    def test_cached(self):
+        resolver.resolve_many('gt', ['B1', 'B3'])
+        self.assertEqual(resolver.resolve('gt', 'B3'), None)
+        self.assertEqual(resolver.resolve('gt', 'B1'), '101')
+        self.assertEqual(resolver.resolve('gt', 'B2'), '102')
+        self.assertEqual(self.lookups, [['B1', 'B3'], ['B2']])
+
+
+@override_settings(CACHES=LOCMEM)
+class MarcCacheTest(TestCase):
+
+    def setUp(self):
+        path = os.path.join(os.path.dirname(__file__), 'data', '024.mrc')
+        self.raw = open(path).read()
+        self.fetches = []
+        self.original = marccache._fetch_blobs
+        marccache._cache.local.clear()
+        caches['default'].clear()
+
+        def fetch(bibids):
+            self.fetches.append(sorted(bibids))
+            return {'1': self.raw}
+        marccache._fetch_blobs = fetch
+
+    def tearDown(self):
+        marccache._fetch_blobs = self.original
+        marccache.stop()
+
+    def test_get_raw_many(self):
+        self.assertEqual(marccache.get_raw_many(['1', '2']),
+                         {'1': self.raw, '2': None})
+        self.assertEqual(marccache.get_raw('1'), self.raw)
+        self.assertEqual(marccache.get_raw('2'), None)
+        self.assertEqual(self.fetches, [['1', '2']])
+
+    def test_zero_padded(self):
+        self.assertEqual(marccache.get_raw('0001'), self.raw)
+        self.assertEqual(marccache.get_raw(1), self.raw)
+        self.assertEqual(self.fetches, [['1']])
+
+    def test_compressed(self):
+        marccache.get_raw('1')
+        stored = caches['default'].get(marccache._cache.make_key('1'))
+        self.assertTrue(len(stored) < len(self.raw))
+
+    def test_parsed_once_per_request(self):
+        marccache.start()
+        record = marccache.get_record('1')
+        self.assertTrue(marccache.get_record('1') is record)
+        marccache.stop()
+        self.assertFalse(marccache.get_record('1') is record)
+        self.assertEqual(len(self.fetches), 1)
+
+
+@override_settings(CACHES=LOCMEM)
+class StaleCacheTest(TestCase):
+
+    def setUp(self):
+        caches['default'].clear()
+        self.stale = StaleCache(60, 600, 30)
+        self.stale.set('k', 'old')
+        # pretend the entry ran out a second ago
+        entry = caches['default'].get('k')
+        entry['expires'] = time.time() - 1
+        caches['default'].set('k', entry)
+
+    def wait_for_refresh(self):
+        # the refresh lets go of its lock once it is done
+        deadline = time.time() + 5
+        while caches['default'].get('k:refresh') is not None and \
+                time.time() < deadline:
+            time.sleep(0.01)
+
+    def test_fresh(self):
+        self.assertEqual(StaleCache(60, 600, 30).get('new', lambda: 'v'),
+                         ('v', False))
+        self.assertEqual(StaleCache(60, 600, 30).get('new', lambda: 'x'),
+                         ('v', False))
+
+    def test_refresh_in_background(self):
+        self.assertEqual(self.stale.get('k', lambda: 'new'), ('old', False))
+        self.wait_for_refresh()
+        self.assertEqual(self.stale.get('k', lambda: 'newer'),
+                         ('new', False))
+
+    def test_serve_stale_on_error(self):
+        def fail():
+            raise DatabaseError('down for maintenance')
+        self.assertEqual(self.stale.get('k', fail), ('old', False))
+        self.wait_for_refresh()
+        self.assertEqual(self.stale.get('k', fail), ('old', True))
+
+    def test_serve_stale_when_overdue(self):
+        entry = caches['default'].get('k')
+        entry['expires'] = time.time() - 31
+        caches['default'].set('k', entry)
+        self.assertEqual(self.stale.get('k', lambda: 'new'), ('old', True))
+        self.wait_for_refresh()
+
+    def test_refresh_dropped_when_busy(self):
+        taken = 0
+        while cache._refreshing.acquire(False):
+            taken += 1
+        try:
+            self.assertEqual(self.stale.get('k', lambda: 'new'),
+                             ('old', False))
+            # no refresh started, so the next request may try again
+            self.assertEqual(caches['default'].get('k:refresh'), None)
+        finally:
+            for i in range(taken):
+                cache._refreshing.release()
+
+    def test_none_not_cached(self):
+        self.assertEqual(self.stale.get('none', lambda: None), (None, False))
+        self.assertEqual(self.stale.get('none', lambda: 'v'), ('v', False))
+
+    def test_invalid_reloaded(self):
+        self.stale.set('k', 'old')
+        self.assertEqual(self.stale.get('k', lambda: 'new',
+                                        valid=lambda v: v != 'old'),
+                         ('new', False))
+        self.assertEqual(self.stale.get('k', lambda: 'newer'),
+                         ('new', False))
+
+    def test_invalid_served_stale_on_error(self):
+        def fail():
+            raise DatabaseError('down for maintenance')
+        self.stale.set('k', 'old')
+        self.assertEqual(self.stale.get('k', fail, valid=lambda v: False),
+                         ('old', True))
+        self.assertEqual(self.stale.get('k', fail), ('old', False))
+
+
+@override_settings(CACHES=LOCMEM)
+class NegativeCacheTest(TestCase):
+
+    def setUp(self):
+        caches['default'].clear()
+
+    def test_has(self):
+        negative = NegativeCache('test', 10, 60)
+        negative.add('isbn', '0123456789')
+        self.assertTrue(negative.has('isbn', '0123456789'))
+        self.assertFalse(negative.has('isbn', '9876543210'))
+        # shared with other processes
+        self.assertTrue(NegativeCache('test', 10, 60).has('isbn',
+                                                          '0123456789'))
+
+    def test_discard(self):
+        negative = NegativeCache('test', 10, 60)
+        negative.add('bib', 12)
+        negative.discard('bib', 12)
+        self.assertFalse(negative.has('bib', 12))
+
+
+class CountingEvent(threading._Event):
+
+    def __init__(self):
+        threading._Event.__init__(self)
+        self.waiting = 0
+
+    def wait(self, timeout=None):
+        self.waiting += 1
+        return threading._Event.wait(self, timeout)
+
+
+class SingleFlightTest(TestCase):
+
+    def test_coalesce(self):
+        flights = SingleFlight()
+        calls = []
+        started = threading.Event()
+        release = threading.Event()
+
+        def build():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return {'BIB_ID': '12'}
+
+        results = []
+        leader = threading.Thread(
+            target=lambda: results.append(flights.do('bib:12', build)))
+        leader.start()
+        started.wait(5)
+        # count the followers as they start waiting on the flight
+        done = flights._flights['bib:12']['done'] = CountingEvent()
+        followers = [threading.Thread(
+            target=lambda: results.append(flights.do('bib:12', build)))
+            for i in range(3)]
+        for thread in followers:
+            thread.start()
+        deadline = time.time() + 5
+        while done.waiting < 3 and time.time() < deadline:
+            time.sleep(0.01)
+        release.set()
+        for thread in [leader] + followers:
+            thread.join(5)
+        self.assertEqual(calls, [1])
+        self.assertEqual(results, [{'BIB_ID': '12'}] * 4)
+        # everyone gets their own copy
+        self.assertEqual(len(set(id(result) for result in results)), 4)
+
+    def test_leader_changes_result(self):
+        flights = SingleFlight()
+        started = threading.Event()
+        release = threading.Event()
+        changed = threading.Event()
+
+        def build():
+            started.set()
+            release.wait(5)
+            return {'BIB_ID': '12', 'holdings': []}
+
+        def lead():
+            result = flights.do('bib:12', build)
+            result['openurl'] = 'sid=leader'
+            result['holdings'].append('leader')
+            changed.set()
+
+        class AfterLeader(CountingEvent):
+            # wake the follower only once the leader has changed its result
+            def wait(self, timeout=None):
+                CountingEvent.wait(self, timeout)
+                return changed.wait(timeout)
+
+        results = []
+        leader = threading.Thread(target=lead)
+        leader.start()
+        started.wait(5)
+        done = flights._flights['bib:12']['done'] = AfterLeader()
+        follower = threading.Thread(
+            target=lambda: results.append(flights.do('bib:12', build)))
+        follower.start()
+        deadline = time.time() + 5
+        while done.waiting < 1 and time.time() < deadline:
+            time.sleep(0.01)
+        release.set()
+        for thread in (leader, follower):
+            thread.join(5)
+        self.assertEqual(results, [{'BIB_ID': '12', 'holdings': []}])
+
+    def test_error(self):
+        def fail():
+            raise DatabaseError('down')
+        self.assertRaises(DatabaseError, SingleFlight().do, 'k', fail)
+
+
+@override_settings(CACHES=LOCMEM)
+class CrossProcessBuildTest(TestCase):
+
+    def setUp(self):
+        caches['default'].clear()
+
+    def test_wait_for_other_process(self):
+        stale = StaleCache(60, 600, 30, lock_timeout=5)
+        # another process holds the build lock, and finishes shortly
+        caches['default'].add('k:build', 1, 5)
+        threading.Timer(0.2, lambda: StaleCache(60, 600, 30).set(
+            'k', 'theirs')).start()
+        self.assertEqual(stale.get('k', lambda: 'ours'), ('theirs', False))
+
+    def test_lock_released(self):
+        stale = StaleCache(60, 600, 30, lock_timeout=5)
+        self.assertEqual(stale.get('k', lambda: 'ours'), ('ours', False))
+        self.assertEqual(caches['default'].get('k:build'), None)
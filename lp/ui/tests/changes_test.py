@@ -0,0 +1,95 @@
+import datetime
+from StringIO import StringIO
+
+from django.core.cache import caches
+from django.test import TestCase
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from ui import changes
+from ui.management.commands import poll_changes
+from ui.tests import LOCMEM
+
+
+class Cursor(object):
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def execute(self, sql, params):
+        self.params = params
+
+    def fetchall(self):
+        return self.rows
+
+
+class Connection(object):
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def cursor(self):
+        return Cursor(self.rows)
+
+
+@override_settings(CACHES=LOCMEM)
+class ChangesTest(TestCase):
+
+    def setUp(self):
+        caches['default'].clear()
+
+    def test_touch(self):
+        stamps = changes.stamp(['1', 2])
+        self.assertEqual(stamps, {'1': 0, '2': 0})
+        self.assertTrue(changes.current(stamps))
+        changes.touch(['3'])
+        self.assertTrue(changes.current(stamps))
+        changes.touch([2])
+        self.assertFalse(changes.current(stamps))
+        self.assertTrue(changes.current(changes.stamp(['1', '2'])))
+
+    def test_poll_skips_overlap(self):
+        start = timezone.make_aware(datetime.datetime(2016, 2, 3, 4, 5, 0))
+        rows = [('1', start + datetime.timedelta(seconds=10))]
+
+        def find_changes(since):
+            found = set(row for row in rows if row[1] > since)
+            return found, max([since] + [changed for bibid, changed in found])
+        touched = []
+        old_find, old_touch = changes.find_changes, changes.touch
+        changes.find_changes = find_changes
+        changes.touch = lambda bibids: touched.append(sorted(bibids))
+        try:
+            command = poll_changes.Command(stdout=StringIO())
+            overlap = datetime.timedelta(seconds=60)
+            command.poll(start, overlap)
+            # bib 1 is still within the overlap, and bib 2 turns up late
+            rows.append(('2', start + datetime.timedelta(seconds=5)))
+            command.poll(None, overlap)
+            command.poll(None, overlap)
+        finally:
+            changes.find_changes, changes.touch = old_find, old_touch
+        self.assertEqual(touched, [['1'], ['2'], []])
+
+    def test_aware_rows(self):
+        # oracle hands back aware times with USE_TZ on, the stand in
+        # strings, and old watermarks may be naive
+        rows = [(1, timezone.make_aware(datetime.datetime(2016, 2, 3, 9, 6),
+                                        timezone.utc)),
+                (2, '2016-02-03 09:05:30'),
+                (3, datetime.datetime(2016, 2, 3, 9, 4))]
+        changes.set_watermark(datetime.datetime(2016, 2, 3, 9, 5))
+        touched = []
+        old_connections, old_touch = changes.connections, changes.touch
+        changes.connections = {'voyager': Connection(rows)}
+        changes.touch = lambda bibids: touched.append(sorted(bibids))
+        try:
+            poll_changes.Command(stdout=StringIO()).poll(
+                None, datetime.timedelta(seconds=60))
+            found, latest = changes.find_changes(timezone.now())
+        finally:
+            changes.connections, changes.touch = old_connections, old_touch
+        self.assertEqual(touched, [['1', '2', '3']])
+        self.assertEqual(changes.get_watermark(), timezone.make_aware(
+            datetime.datetime(2016, 2, 3, 9, 6), timezone.utc))
+        self.assertTrue(timezone.is_aware(latest))
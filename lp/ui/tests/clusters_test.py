@@ -0,0 +1,69 @@
+from django.core.cache import caches
+from django.test import TestCase
+from django.test.utils import override_settings
+
+from ui import clusters
+from ui.tests import LOCMEM
+
+
+@override_settings(CACHES=LOCMEM)
+class ClusterTest(TestCase):
+
+    def setUp(self):
+        caches['default'].clear()
+        clusters._cache.local.clear()
+        self.loads = []
+        self.rows = {
+            '0123456789': [self.row(2, '0123456789'),
+                           self.row(1, '0123456789')],
+            '9780123456786': [self.row(1, '9780123456786'),
+                              self.row(3, '9780123456786')],
+            '9781234567897': [],
+        }
+
+    def row(self, bibid, heading):
+        return {'BIB_ID': bibid, 'NORMAL_HEADING': heading,
+                'TITLE': 'A title'}
+
+    def load(self, nums):
+        self.loads.append(nums)
+        return dict((num, self.rows[num]) for num in nums)
+
+    def test_union(self):
+        rows = clusters.get('isbn', ['9780123456786', '0123456789'],
+                            self.load)
+        self.assertEqual([row['BIB_ID'] for row in rows], [1, 1, 2, 3])
+        self.assertEqual(self.loads, [['0123456789', '9780123456786']])
+
+    def test_shared_by_copies(self):
+        rows = clusters.get('isbn', ['0123456789', '9780123456786'],
+                            self.load)
+        rows[0]['TITLE'] = 'changed'
+        # another copy, with an e-ISBN of its own, only looks that up
+        rows = clusters.get('isbn', ['9781234567897', '0123456789'],
+                            self.load)
+        self.assertEqual(rows, [self.row(1, '0123456789'),
+                                self.row(2, '0123456789')])
+        self.assertEqual(self.loads, [['0123456789', '9780123456786'],
+                                      ['9781234567897']])
+
+    def test_headings_limited(self):
+        # each number brings in bibs under six headings of their own
+        nums = ['0123456789', '9780123456786', '9781234567897']
+        for i, num in enumerate(nums):
+            self.rows[num] = [self.row(i * 10 + j, '%s-%s' % (num, j))
+                              for j in range(5)] + [self.row(i * 10, num)]
+        rows = clusters.get('isbn', nums, self.load)
+        headings = set(row['NORMAL_HEADING'] for row in rows)
+        self.assertEqual(len(headings), clusters.MAX_HEADINGS)
+        # the numbers asked about are kept first
+        self.assertTrue(headings.issuperset(nums))
+        self.assertEqual(len(rows), clusters.MAX_HEADINGS)
+
+    def test_purge(self):
+        clusters.get('isbn', ['0123456789', '9780123456786'], self.load)
+        self.assertEqual(clusters.purge('isbn', '0123456789'), 1)
+        self.assertEqual(clusters.purge('isbn', '0123456789'), 0)
+        clusters.get('isbn', ['0123456789', '9780123456786'], self.load)
+        self.assertEqual(self.loads, [['0123456789', '9780123456786'],
+                                      ['0123456789']])
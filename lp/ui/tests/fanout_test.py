@@ -0,0 +1,38 @@
+import time
+
+from django.test import TestCase
+from django.test.utils import override_settings
+
+from ui import fanout
+
+
+def slow(value, delay):
+    time.sleep(delay)
+    return value
+
+
+def fail():
+    raise IOError('connection reset')
+
+
+@override_settings(ENRICHMENT_THREADS=4)
+class FanoutTest(TestCase):
+
+    def test_order(self):
+        self.assertEqual(fanout.run([(slow, ('a', 0.2)), (slow, ('b', 0))],
+                                    5), ['a', 'b'])
+
+    def test_concurrent(self):
+        start = time.time()
+        fanout.run([(slow, (i, 0.2)) for i in range(3)], 5)
+        self.assertTrue(time.time() - start < 0.5)
+
+    def test_deadline(self):
+        start = time.time()
+        self.assertEqual(fanout.run([(slow, ('a', 0)), (slow, ('b', 1))],
+                                    0.2), ['a', None])
+        self.assertTrue(time.time() - start < 0.5)
+
+    def test_errors_dropped(self):
+        self.assertEqual(fanout.run([(fail, ()), (slow, ('b', 0))], 5),
+                         [None, 'b'])
@@ -0,0 +1,78 @@
+from django.core.cache import caches
+from django.test import TestCase
+from django.test.utils import override_settings
+
+from ui import apis, upstream
+from ui.tests import LOCMEM
+
+BOOK = {'url': 'https://openlibrary.org/books/OL1M/A_title',
+        'identifiers': {'openlibrary': ['OL1M']},
+        'ebooks': [{'availability': 'full'}]}
+
+
+@override_settings(CACHES=LOCMEM)
+class LookupTest(TestCase):
+
+    def setUp(self):
+        caches['default'].clear()
+        apis._lookups.local.clear()
+        self.calls = []
+        self.answers = {}
+        self.original = apis._FETCHERS['openlibrary']
+        apis._FETCHERS['openlibrary'] = self.fetch
+
+    def tearDown(self):
+        apis._FETCHERS['openlibrary'] = self.original
+
+    def fetch(self, nums):
+        self.calls.append(nums)
+        answers = [self.answers.get(num, {}) for num, num_type in nums]
+        for answer in answers:
+            if isinstance(answer, Exception):
+                raise answer
+        return answers
+
+    def test_cached_by_normalized_number(self):
+        self.answers['ocm12345'] = BOOK
+        holding = apis.openlibrary('ocm12345', 'OCLC')
+        self.assertEqual(holding['ITEMS'][0]['DISPLAY_CALL_NO'], 'OL1M')
+        self.assertEqual(apis.openlibrary('12345', 'oclc'), holding)
+        self.assertEqual(len(self.calls), 1)
+
+    def test_nothing_cached(self):
+        self.assertEqual(apis.openlibrary('12345', 'OCLC'), {})
+        self.assertEqual(apis.openlibrary('12345', 'OCLC'), {})
+        self.assertEqual(len(self.calls), 1)
+
+    def test_forced(self):
+        self.answers['12345'] = {'url': 'u', 'ebooks': [],
+                                 'identifiers': {'openlibrary': ['OL1M']}}
+        self.assertEqual(apis.openlibrary('12345', 'OCLC'), {})
+        book = apis.openlibrary('12345', 'OCLC', force=True,
+                                as_holding=False)
+        book['url'] = 'changed'
+        self.assertEqual(apis.lookup('openlibrary', '12345', 'OCLC')['url'],
+                         'u')
+        self.assertEqual(len(self.calls), 1)
+
+    def test_failures_not_cached(self):
+        self.answers['12345'] = upstream.Unavailable('timed out')
+        self.assertEqual(apis.openlibrary('12345', 'OCLC'), {})
+        self.answers['12345'] = BOOK
+        self.assertTrue(apis.openlibrary('12345', 'OCLC'))
+        self.assertEqual(len(self.calls), 2)
+
+    def test_many(self):
+        self.answers['0123456789'] = BOOK
+        apis.openlibrary('12345', 'OCLC')
+        results = apis.openlibrary_many([('85-1234', 'LCCN'),
+                                         ('0-12-345678-9', 'ISBN'),
+                                         ('12345', 'OCLC'),
+                                         ('123', 'ISBN')])
+        self.assertEqual([bool(r) for r in results],
+                         [False, True, False, False])
+        # one request for the numbers not already cached, none for the
+        # ISBN that is too short to ask about
+        self.assertEqual(self.calls, [[('12345', 'OCLC')],
+                                      [('85-1234', 'LCCN'),
+                                       ('0123456789', 'ISBN')]])
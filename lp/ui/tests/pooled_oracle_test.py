@@ -0,0 +1,110 @@
+import time
+
+from django.test import TestCase
+
+from ui.pooled_oracle import base
+
+Error = base.Database.DatabaseError
+
+
+class FakeConnection(object):
+
+    def __init__(self, broken=False):
+        self.broken = broken
+
+    def ping(self):
+        if self.broken:
+            raise Error('ORA-03113: end-of-file on communication channel')
+
+
+class FakePool(object):
+
+    def __init__(self, connections, opened=None, max=15):
+        self.connections = list(connections)
+        self.opened = len(connections) if opened is None else opened
+        self.busy = 0
+        self.max = max
+        self.dropped = []
+        self.released = []
+        self.release_error = None
+
+    def acquire(self):
+        if not self.connections:
+            self.busy = self.max
+            raise Error('ORA-24418: Cannot open further sessions')
+        return self.connections.pop(0)
+
+    def drop(self, conn):
+        self.dropped.append(conn)
+
+    def release(self, conn):
+        if self.release_error:
+            raise self.release_error
+        self.released.append(conn)
+
+
+class PooledOracleTest(TestCase):
+
+    def setUp(self):
+        self.wrapper = base.DatabaseWrapper({
+            'ENGINE': 'ui.pooled_oracle', 'NAME': 'voyager', 'USER': 'u',
+            'PASSWORD': 'p', 'HOST': '', 'PORT': '', 'CONN_MAX_AGE': 0,
+            'OPTIONS': {'POOL_MIN': 1, 'POOL_MAX': 2, 'POOL_INCREMENT': 1,
+                        'POOL_WAIT_TIMEOUT': 0.1, 'threaded': True},
+        }, alias='pooltest')
+
+    def tearDown(self):
+        base._pools.pop('pooltest', None)
+        base._stats.pop('pooltest', None)
+
+    def use_pool(self, pool):
+        base._pools['pooltest'] = pool
+        return pool
+
+    def test_pool_options_stripped(self):
+        self.assertEqual(self.wrapper.get_connection_params(),
+                         {'threaded': True})
+
+    def test_broken_session_dropped(self):
+        bad, good = FakeConnection(broken=True), FakeConnection()
+        pool = self.use_pool(FakePool([bad, good]))
+        self.assertTrue(self.wrapper.get_new_connection({}) is good)
+        self.assertEqual(pool.dropped, [bad])
+        stats = base.pool_stats('pooltest')
+        self.assertEqual((stats['checkouts'], stats['dropped']), (2, 1))
+
+    def test_no_working_session(self):
+        broken = [FakeConnection(broken=True) for i in range(3)]
+        pool = self.use_pool(FakePool(broken + [FakeConnection()], opened=2))
+        self.assertRaises(Error, self.wrapper.get_new_connection, {})
+        # none of them is handed out unchecked
+        self.assertEqual(pool.dropped, broken)
+
+    def test_close_releases(self):
+        conn = FakeConnection()
+        pool = self.use_pool(FakePool([]))
+        self.wrapper.connection = conn
+        self.wrapper._close()
+        self.assertEqual((pool.released, pool.dropped), ([conn], []))
+
+    def test_close_drops_broken(self):
+        conn = FakeConnection(broken=True)
+        pool = self.use_pool(FakePool([]))
+        self.wrapper.connection = conn
+        self.wrapper.errors_occurred = True
+        self.wrapper._close()
+        self.assertEqual((pool.released, pool.dropped), ([], [conn]))
+
+    def test_close_drops_on_release_error(self):
+        conn = FakeConnection()
+        pool = self.use_pool(FakePool([]))
+        pool.release_error = Error('ORA-24422')
+        self.wrapper.connection = conn
+        self.wrapper._close()
+        self.assertEqual(pool.dropped, [conn])
+
+    def test_exhausted_pool_times_out(self):
+        self.use_pool(FakePool([], opened=2, max=2))
+        start = time.time()
+        self.assertRaises(Error, self.wrapper.get_new_connection, {})
+        self.assertTrue(0.1 <= time.time() - start < 1)
@@ -0,0 +1,81 @@
+import logging
+
+from django.db.utils import ConnectionHandler
+from django.http import HttpResponse
+from django.test import TestCase
+from django.test.client import RequestFactory
+from django.test.utils import override_settings
+
+from ui import querystats
+
+
+class ListHandler(logging.Handler):
+
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+class QueryStatsTest(TestCase):
+
+    def setUp(self):
+        self.handler = ListHandler()
+        querystats.logger.addHandler(self.handler)
+        handler = ConnectionHandler({
+            'default': {'ENGINE': 'django.db.backends.sqlite3'},
+            'standin': {'ENGINE': 'ui.standin', 'NAME': ':memory:'}})
+        self.connection = handler['standin']
+        cursor = self.connection.cursor()
+        cursor.execute('CREATE TABLE bib_master (bib_id INTEGER)')
+
+    def tearDown(self):
+        querystats.logger.removeHandler(self.handler)
+        querystats.stop()
+        self.connection.close()
+
+    def test_fingerprint(self):
+        self.assertEqual(
+            querystats.fingerprint("SELECT a\n  FROM t WHERE b IN (%s,%s,%s)"
+                                   "\nAND c = 'N' AND ROWNUM < 12"),
+            "SELECT a FROM t WHERE b IN (...) AND c = ? AND ROWNUM < ?")
+
+    def test_counts(self):
+        querystats.start()
+        cursor = self.connection.cursor()
+        for bibid in (1, 2):
+            cursor.execute('SELECT bib_id FROM bib_master WHERE bib_id = %s',
+                           [bibid])
+            cursor.fetchall()
+        stats = querystats.stop()
+        self.assertEqual(stats['count'], 2)
+        self.assertEqual(stats['queries'].keys(),
+                         ['SELECT bib_id FROM bib_master WHERE bib_id = ?'])
+        self.assertTrue(stats['total'] >= stats['max'])
+
+    @override_settings(VOYAGER_SLOW_QUERY_SECONDS=0)
+    def test_slow_query_log(self):
+        cursor = self.connection.cursor()
+        cursor.execute('SELECT bib_id FROM bib_master WHERE bib_id = %s',
+                       ['123'])
+        self.assertEqual(len(self.handler.messages), 1)
+        message = self.handler.messages[0]
+        self.assertTrue('querystats_test.py' in message)
+        self.assertTrue("'123'" in message)
+
+    def test_middleware(self):
+        middleware = querystats.QueryStatsMiddleware()
+        request = RequestFactory().get('/item/1')
+        middleware.process_request(request)
+        self.connection.cursor().execute('SELECT 1', [])
+        response = middleware.process_response(request, HttpResponse())
+        self.assertTrue(
+            response['X-Voyager-Queries'].startswith('count=1, total_ms='))
+
+    def test_pool_wait(self):
+        querystats.start()
+        querystats.record_pool_wait(0.25)
+        self.assertTrue(querystats.summary(querystats.stop()).endswith(
+            'pool_wait_ms=250.0'))
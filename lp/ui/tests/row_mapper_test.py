@@ -0,0 +1,101 @@
+import datetime
+import sqlite3
+
+from django.test import TestCase
+from django.test.utils import override_settings
+from django.utils.encoding import smart_str
+
+from ui import voyager
+from ui.standin import generate
+from ui.standin.base import CursorWrapper, register_functions
+
+# stand-ins for the cx_Oracle column types, which are matched by name
+NUMBER = type('NUMBER', (object,), {})
+DATETIME = type('DATETIME', (object,), {})
+STRING = type('STRING', (object,), {})
+
+
+class FakeCursor(object):
+
+    def __init__(self, description, rows):
+        self.description = description
+        self.rows = list(rows)
+
+    def fetchone(self):
+        return self.rows.pop(0) if self.rows else None
+
+    def fetchmany(self, size):
+        rows, self.rows = self.rows[:size], self.rows[size:]
+        return rows
+
+
+def old_make_dict(cursor, first=False):
+    """_make_dict as it was before the row mapper, for comparison."""
+    desc = cursor.description
+    mapped = [dict(zip([col[0] for col in desc], row))
+              for row in cursor.fetchall()]
+    for d in mapped:
+        for k, v in d.items():
+            try:
+                d[k] = smart_str(v.strip())
+            except:
+                pass
+    if first:
+        return mapped[0] if mapped else {}
+    return mapped
+
+
+class RowMapperTest(TestCase):
+
+    def test_types(self):
+        when = datetime.datetime(2016, 2, 3, 4, 5, 6)
+        desc = (('TITLE', STRING), ('BIB_ID', NUMBER), ('CREATED', DATETIME),
+                ('NOTE', STRING), ('CALL_NO', None))
+        cursor = FakeCursor(desc, [(u'  A t\xedtle ', 12, when, None,
+                                    ' QA76 ')])
+        self.assertEqual(voyager._make_dict(cursor, first=True),
+                         {'TITLE': 'A t\xc3\xadtle', 'BIB_ID': 12,
+                          'CREATED': when, 'NOTE': None,
+                          'CALL_NO': 'QA76'})
+
+    def test_number_columns_untouched(self):
+        # values in NUMBER columns are never strings from cx_Oracle, but
+        # make sure they are left alone rather than checked
+        desc = (('BIB_ID', NUMBER),)
+        cursor = FakeCursor(desc, [(' 12 ',)])
+        self.assertEqual(voyager._make_dict(cursor), [{'BIB_ID': ' 12 '}])
+
+    def test_empty(self):
+        cursor = FakeCursor((('BIB_ID', NUMBER),), [])
+        self.assertEqual(voyager._make_dict(cursor, first=True), {})
+        self.assertEqual(voyager._make_dict(cursor), [])
+
+
+class RowMapperStandinTest(TestCase):
+
+    query = """
+SELECT bib_text.bib_id, bib_text.title, bib_text.isbn,
+       item_status.item_status_date, mfhd_item.item_enum
+FROM bib_text
+JOIN bib_mfhd ON bib_mfhd.bib_id = bib_text.bib_id
+LEFT OUTER JOIN mfhd_item ON mfhd_item.mfhd_id = bib_mfhd.mfhd_id
+LEFT OUTER JOIN item_status ON item_status.item_id = mfhd_item.item_id
+ORDER BY bib_text.bib_id, item_status.item_id"""
+
+    def setUp(self):
+        self.conn = sqlite3.connect(':memory:')
+        register_functions(self.conn)
+        generate.generate(self.conn, 30)
+
+    def rows(self, make_dict, first=False):
+        cursor = self.conn.cursor(factory=CursorWrapper)
+        cursor.execute(self.query, [])
+        return make_dict(cursor, first=first)
+
+    @override_settings(VOYAGER_FETCH_ARRAYSIZE=7)
+    def test_same_as_fetchall(self):
+        rows = self.rows(voyager._make_dict)
+        self.assertTrue(len(rows) > 7)
+        self.assertEqual(rows, self.rows(old_make_dict))
+        self.assertEqual(self.rows(voyager._make_dict, first=True),
+                         self.rows(old_make_dict, first=True))
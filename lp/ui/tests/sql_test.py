@@ -0,0 +1,27 @@
+from django.test import TestCase
+
+from ui.sql import in_binds
+
+
+class InBindsTest(TestCase):
+
+    def test_padding(self):
+        placeholders, params = in_binds(['a', 'b', 'c'])
+        self.assertEqual(placeholders, '%s,%s,%s,%s')
+        self.assertEqual(params, ['a', 'b', 'c', 'c'])
+
+    def test_exact_bucket(self):
+        placeholders, params = in_binds([1, 2])
+        self.assertEqual(placeholders, '%s,%s')
+        self.assertEqual(params, [1, 2])
+
+    def test_same_text_for_similar_lengths(self):
+        "lists of 5 to 8 values should share one statement"
+        texts = set([in_binds(range(n))[0] for n in range(5, 9)])
+        self.assertEqual(len(texts), 1)
+
+    def test_empty(self):
+        self.assertEqual(in_binds([]), ('%s', [None]))
+
+    def test_too_many(self):
+        self.assertRaises(ValueError, in_binds, range(1001))
@@ -0,0 +1,105 @@
+import sqlite3
+
+from django.test import TestCase
+
+from ui import changes
+
+from ui.standin import generate
+from ui.standin.base import CursorWrapper, register_functions, substr, \
+    to_char, translate
+
+
+class TranslateTest(TestCase):
+
+    def test_wrlcdb_prefix(self):
+        self.assertEqual(translate("SELECT wrlcdb.getBibBlob(%s)"),
+                         "SELECT getBibBlob(%s)")
+
+    def test_rownum(self):
+        self.assertEqual(
+            translate("SELECT a FROM t WHERE b = 1\nAND ROWNUM < 12"),
+            "SELECT a FROM t WHERE b = 1 LIMIT 11")
+
+    def test_rownum_in_subquery(self):
+        self.assertEqual(
+            translate("SELECT a FROM t WHERE b IN (SELECT b FROM u "
+                      "WHERE c = 1 AND ROWNUM < 12 AND d IN (1, 2)) "
+                      "ORDER BY a"),
+            "SELECT a FROM t WHERE b IN (SELECT b FROM u WHERE c = 1 "
+            "AND d IN (1, 2) LIMIT 11) ORDER BY a")
+
+    def test_substr(self):
+        # oracle treats a start of 0 as 1
+        self.assertEqual(substr('B1234567X', 0, 8), 'B1234567')
+        self.assertEqual(substr('B1234567X', 2, 3), '123')
+        self.assertEqual(substr('B1234567X', -1), 'X')
+
+    def test_to_char(self):
+        self.assertEqual(to_char('2016-02-03 04:05:06', 'mm-dd-yyyy'),
+                         '02-03-2016')
+        self.assertEqual(to_char('2016-02-03', 'yyyy-mm-dd'), '2016-02-03')
+        self.assertEqual(to_char(None, 'yyyy-mm-dd'), None)
+
+
+class StandinTest(TestCase):
+
+    def setUp(self):
+        self.conn = sqlite3.connect(':memory:')
+        register_functions(self.conn)
+        generate.generate(self.conn, 200)
+        self.cursor = self.conn.cursor(factory=CursorWrapper)
+
+    def test_generate(self):
+        self.cursor.execute("SELECT COUNT(*) FROM bib_master", [])
+        self.assertEqual(self.cursor.fetchone()[0], 200)
+
+    def test_deterministic(self):
+        conn = sqlite3.connect(':memory:')
+        generate.generate(conn, 200)
+        query = "SELECT title FROM bib_text ORDER BY bib_id"
+        self.assertEqual(conn.execute(query).fetchall(),
+                         self.conn.execute(query).fetchall())
+
+    def test_bib_functions(self):
+        self.cursor.execute("""
+SELECT wrlcdb.getBibBlob(bib_text.bib_id) AS marcblob, bib_text.title,
+       wrlcdb.GetMarcField(bib_text.bib_id,0,0,'245','','a',1) AS title_all
+FROM bib_text
+WHERE bib_text.bib_id = %s""", ['1'])
+        self.assertEqual([col[0] for col in self.cursor.description],
+                         ['MARCBLOB', 'TITLE', 'TITLE_ALL'])
+        blob, title, title_all = self.cursor.fetchone()
+        self.assertTrue(str(blob).endswith('\x1d'))
+        self.assertEqual(title_all, '245:10:$a' + title)
+
+    def test_mfhd_functions(self):
+        self.cursor.execute("""
+SELECT mfhd_master.display_call_no,
+       RTRIM(wrlcdb.GetMfHDsubfield(mfhd_master.mfhd_id,'852','h')) AS h,
+       RTRIM(wrlcdb.GetAllTags(mfhd_master.mfhd_id,'M','852',2)) AS marc852
+FROM mfhd_master
+WHERE mfhd_master.mfhd_id = %s""", ['1'])
+        call_no, h, marc852 = self.cursor.fetchone()
+        self.assertEqual(h, call_no)
+        self.assertTrue(('$h' + call_no) in marc852)
+
+    def test_changed_items(self):
+        self.cursor.execute(changes._CHANGED_ITEMS,
+                            ['2030-01-01', '2030-01-01'])
+        self.assertEqual(self.cursor.fetchall(), [])
+        self.cursor.execute(changes._CHANGED_ITEMS,
+                            ['2000-01-01', '2000-01-01'])
+        bibids = set(row[0] for row in self.cursor.fetchall())
+        self.cursor.execute("SELECT COUNT(DISTINCT bib_mfhd.bib_id) "
+                            "FROM bib_mfhd JOIN mfhd_item "
+                            "ON mfhd_item.mfhd_id = bib_mfhd.mfhd_id", [])
+        self.assertEqual(len(bibids), self.cursor.fetchone()[0])
+
+    def test_himmelfarb_links(self):
+        self.cursor.execute("""
+SELECT wrlcdb.GetMarcField(bib_master.bib_id,0,0,'856','','u',2)
+FROM bib_master
+WHERE bib_master.library_id = %s""", [generate.HIMMELFARB_LIBRARY_ID])
+        links = [row[0] for row in self.cursor.fetchall()]
+        self.assertTrue(links)
+        self.assertTrue(all(link.startswith('856:41:$u') for link in links))
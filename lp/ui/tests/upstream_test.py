@@ -0,0 +1,144 @@
+import threading
+import time
+
+import requests
+
+from django.test import TestCase
+from django.test.utils import override_settings
+
+from ui import upstream
+from ui.upstream import CircuitBreaker
+
+
+class Response(object):
+
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(response=self)
+
+
+class CircuitBreakerTest(TestCase):
+
+    def test_opens(self):
+        breaker = CircuitBreaker(2, 60)
+        self.assertFalse(breaker.failed_once())
+        self.assertTrue(breaker.allow())
+        self.assertTrue(breaker.failed_once())
+        self.assertFalse(breaker.allow())
+
+    def test_trial_after_cool_down(self):
+        breaker = CircuitBreaker(1, 0)
+        breaker.failed_once()
+        self.assertTrue(breaker.allow())
+        breaker.succeeded()
+        self.assertTrue(breaker.allow())
+
+
+@override_settings(UPSTREAM_TIMEOUTS={'default': (1, 2)},
+                   UPSTREAM_BREAKER_FAILURES=2,
+                   UPSTREAM_BREAKER_COOL_DOWN=60,
+                   UPSTREAM_STATS_LOG_SECONDS=60)
+class UpstreamTest(TestCase):
+
+    def setUp(self):
+        upstream._breakers.clear()
+        upstream._counts.clear()
+        self.original = upstream.session
+        upstream.session = lambda: self
+        self.responses = []
+        self.calls = []
+
+    def tearDown(self):
+        upstream.session = self.original
+
+    def request(self, method, url, **kwargs):
+        self.calls.append((method, url, kwargs['timeout']))
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    def test_ok(self):
+        self.responses = [Response(200)]
+        upstream.get('test', 'http://example.org/')
+        self.assertEqual(self.calls, [('GET', 'http://example.org/',
+                                       (1, 2))])
+        self.assertEqual(upstream.stats(), {'test': {'calls': 1}})
+
+    def test_short_circuit(self):
+        self.responses = [requests.Timeout(), Response(503)]
+        for i in range(3):
+            self.assertRaises(upstream.Unavailable, upstream.get, 'test',
+                              'http://example.org/')
+        self.assertEqual(len(self.calls), 2)
+        self.assertEqual(upstream.stats(),
+                         {'test': {'calls': 2, 'failures': 2, 'timeouts': 1,
+                                   'short_circuits': 1}})
+
+    def test_logs_stats(self):
+        self.responses = [Response(200), Response(200)]
+        logged = []
+        original = upstream.logger
+        upstream.logger = self
+        self.info = lambda message, *args: logged.append(message % args)
+        try:
+            upstream._logged = time.time()
+            upstream.get('test', 'http://example.org/')
+            self.assertEqual(logged, [])
+            upstream._logged = time.time() - 60
+            upstream.get('test', 'http://example.org/')
+        finally:
+            upstream.logger = original
+        self.assertEqual(logged, ["upstream calls {'test': {'calls': 1}}, "
+                                  "connections {}"])
+
+    def test_threads_count_every_call(self):
+        self.responses = [Response(200)] * 400
+        threads = [threading.Thread(target=lambda: [
+            upstream.get('test', 'http://example.org/') for i in range(100)])
+            for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(upstream.stats(), {'test': {'calls': 400}})
+
+    def test_not_found_does_not_open(self):
+        self.responses = [Response(404), Response(404), Response(200)]
+        for i in range(2):
+            self.assertRaises(upstream.Unavailable, upstream.get, 'test',
+                              'http://example.org/')
+        upstream.get('test', 'http://example.org/')
+        self.assertEqual(len(self.calls), 3)
+
+
+@override_settings(UPSTREAM_POOL_HOSTS=2, UPSTREAM_POOL_SIZE=3)
+class SessionTest(TestCase):
+
+    def test_pools(self):
+        session = upstream._make_session()
+        adapter = session.get_adapter('https://openlibrary.org/')
+        self.assertEqual(adapter._pool_maxsize, 3)
+        self.assertEqual(session.cookies.get_policy().allowed_domains(),
+                         ())
+
+    def test_no_pools_yet(self):
+        upstream._session = None
+        self.assertEqual(upstream.pool_stats(), {})
+
+    def test_pool_stats(self):
+        original = upstream._session
+        upstream._session = upstream._make_session()
+        try:
+            adapter = upstream._session.get_adapter('http://example.org/')
+            pool = adapter.poolmanager.connection_from_url(
+                'http://example.org/')
+            pool.num_requests = 2
+            self.assertEqual(upstream.pool_stats(), {
+                'http://example.org:80': {'connections': 0, 'requests': 2,
+                                          'idle': 3}})
+        finally:
+            upstream._session = original
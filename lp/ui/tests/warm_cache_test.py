@@ -0,0 +1,98 @@
+import gzip
+import os
+import shutil
+import tempfile
+import time
+
+from django.test import TestCase
+
+from ui.management.commands.warm_cache import Command, RateLimiter
+
+LOG = '''\
+1.2.3.4 - - [03/Feb/2016:04:05:06 -0500] "GET /item/123 HTTP/1.1" 200 5120
+1.2.3.4 - - [03/Feb/2016:04:05:07 -0500] "GET /item/456.json HTTP/1.1" 200 99
+1.2.3.5 - - [03/Feb/2016:04:05:08 -0500] "GET /item/123?x=1 HTTP/1.1" 200 51
+1.2.3.5 - - [03/Feb/2016:04:05:09 -0500] "GET /lp/item/456/marc.json HTTP/1.1" 200 1
+1.2.3.6 - - [03/Feb/2016:04:05:10 -0500] "GET /item/123 HTTP/1.1" 200 5120
+1.2.3.6 - - [03/Feb/2016:04:05:11 -0500] "GET /item/789 HTTP/1.1" 200 5120
+1.2.3.6 - - [03/Feb/2016:04:05:12 -0500] "GET /static/item/1.png HTTP/1.1" 200 5
+1.2.3.6 - - [03/Feb/2016:04:05:13 -0500] "POST /item/789 HTTP/1.1" 200 5
+'''
+
+SITEMAP = '''<?xml version="1.0" encoding="UTF-8"?>
+<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">
+<url><loc>http://findit.library.gwu.edu/item/%s</loc></url>
+<url><loc>http://findit.library.gwu.edu/item/%s</loc></url>
+</urlset>
+'''
+
+
+class WarmCacheSourcesTest(TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.command = Command()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_access_log(self):
+        path = os.path.join(self.dir, 'access.log')
+        with open(path, 'w') as fp:
+            fp.write(LOG)
+        self.assertEqual(self.command.from_access_log(path, 2),
+                         ['123', '456'])
+        self.assertEqual(self.command.from_access_log(path, 10),
+                         ['123', '456', '789'])
+
+    def test_sitemaps(self):
+        for name, bibids in (('sitemap-2.xml.gz', (3, 4)),
+                             ('sitemap-1.xml.gz', (12, 34)),
+                             ('other.xml.gz', (56, 78))):
+            fp = gzip.open(os.path.join(self.dir, name), 'wb')
+            fp.write(SITEMAP % bibids)
+            fp.close()
+        # only sitemap-*.xml.gz files are read, for bibids of 2 to 8 digits
+        self.assertEqual(self.command.from_sitemaps(self.dir), ['12', '34'])
+
+    def test_file(self):
+        path = os.path.join(self.dir, 'bibids.txt')
+        with open(path, 'w') as fp:
+            fp.write('12\n\n 34 \nb5678\n')
+        self.assertEqual(self.command.from_file(path), ['12', '34'])
+
+    def test_top(self):
+        log = os.path.join(self.dir, 'access.log')
+        with open(log, 'w') as fp:
+            fp.write(LOG)
+        path = os.path.join(self.dir, 'bibids.txt')
+        with open(path, 'w') as fp:
+            fp.write('456\n12\n34\n')
+        options = {'access_log': log, 'sitemaps': False, 'top': 4}
+        # the access log goes first, and the limit covers every source
+        self.assertEqual(self.command.bibids([path], options),
+                         ['123', '456', '789', '12'])
+        options['top'] = 0
+        self.assertEqual(len(self.command.bibids([path], options)), 5)
+        options['access_log'] = None
+        options['top'] = 1
+        self.assertEqual(self.command.bibids([path], options), ['456'])
+
+
+class RateLimiterTest(TestCase):
+
+    def test_rate(self):
+        limiter = RateLimiter(20)
+        start = time.time()
+        for i in range(5):
+            limiter.wait()
+        # the first goes at once, the rest a twentieth of a second apart
+        elapsed = time.time() - start
+        self.assertTrue(0.19 <= elapsed < 0.5, elapsed)
+
+    def test_no_limit(self):
+        limiter = RateLimiter(0)
+        start = time.time()
+        for i in range(100):
+            limiter.wait()
+        self.assertTrue(time.time() - start < 0.1)
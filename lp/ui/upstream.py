@@ -0,0 +1,206 @@
+"""
+The way out to the external services apis.py talks to (Google Books,
+WorldCat, Open Library, HathiTrust, 360Link). Every call is made with
+the service's connect and read timeouts from UPSTREAM_TIMEOUTS, and goes
+through the service's circuit breaker: after UPSTREAM_BREAKER_FAILURES
+failures in a row the service is not called at all for
+UPSTREAM_BREAKER_COOL_DOWN seconds, after which one call is let through
+to see whether it has recovered. Breakers are kept per process.
+
+Calls share one requests.Session per process, which keeps connections to
+each host open between calls (up to UPSTREAM_POOL_SIZE of them per host,
+for UPSTREAM_POOL_HOSTS hosts) and asks for gzipped responses. Cookies
+are never kept, so nothing one call is sent leaks into the next.
+
+stats() counts, per service, the calls made, those that failed (of which
+how many timed out), and those refused because the breaker was open.
+Each process logs them every UPSTREAM_STATS_LOG_SECONDS.
+pool_stats() reports, per host, the connections opened, the requests
+sent over them and the connections sitting idle in the pool; it is
+logged along with stats().
+"""
+
+import logging
+import threading
+import time
+from collections import Counter, defaultdict
+
+from cookielib import DefaultCookiePolicy
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class Unavailable(Exception):
+    """A service could not be reached, or was not asked because its
+    breaker is open."""
+
+
+class CircuitBreaker(object):
+    """
+    Counts a service's failures in a row. After failures of them it
+    opens, refusing calls for cool_down seconds, then lets one call
+    through: if that works it closes again, if not it stays open for
+    another cool_down.
+    """
+
+    def __init__(self, failures, cool_down):
+        self.failures = failures
+        self.cool_down = cool_down
+        self.failed = 0
+        self.opened = None
+        self.lock = threading.Lock()
+
+    def allow(self):
+        with self.lock:
+            if self.opened is None:
+                return True
+            if time.time() - self.opened >= self.cool_down:
+                # let this call through as a trial, and hold the rest off
+                # for another cool_down in case it hangs
+                self.opened = time.time()
+                return True
+            return False
+
+    def succeeded(self):
+        with self.lock:
+            self.failed = 0
+            self.opened = None
+
+    def failed_once(self):
+        """Count a failure, returning True if that opened the breaker."""
+        with self.lock:
+            self.failed += 1
+            if self.failed >= self.failures:
+                opening = self.opened is None
+                self.opened = time.time()
+                return opening
+            return False
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+_counts = defaultdict(Counter)
+_counts_lock = threading.Lock()
+_logged = time.time()
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get(service, url, **kwargs):
+    """
+    GET url from service, returning the requests.Response. Raises
+    Unavailable if the breaker is open, or the call times out, cannot
+    connect or gets an error status back.
+    """
+    return request(service, 'GET', url, **kwargs)
+
+
+def request(service, method, url, **kwargs):
+    _log_stats()
+    breaker = _breaker(service)
+    if not breaker.allow():
+        _count(service, 'short_circuits')
+        raise Unavailable('%s is unavailable, not calling %s' % (service,
+                                                                 url))
+    _count(service, 'calls')
+    kwargs.setdefault('timeout', timeouts(service))
+    try:
+        response = session().request(method, url, **kwargs)
+        response.raise_for_status()
+    except requests.RequestException as error:
+        if isinstance(error, requests.Timeout):
+            _count(service, 'failures', 'timeouts')
+        else:
+            _count(service, 'failures')
+        # an answer of "no" from a service that is up is not its failure
+        response = getattr(error, 'response', None)
+        if response is None or response.status_code >= 500:
+            if breaker.failed_once():
+                logger.warning('%s failed %s times in a row, not calling '
+                               'it for %ss', service, breaker.failures,
+                               breaker.cool_down)
+        else:
+            breaker.succeeded()
+        raise Unavailable('%s: %s' % (url, error))
+    breaker.succeeded()
+    return response
+
+
+def timeouts(service):
+    """The (connect, read) timeouts for a service."""
+    return settings.UPSTREAM_TIMEOUTS.get(
+        service, settings.UPSTREAM_TIMEOUTS['default'])
+
+
+def stats():
+    with _counts_lock:
+        return dict((service, dict(counts))
+                    for service, counts in _counts.items())
+
+
+def pool_stats():
+    hosts = {}
+    if _session is None:
+        return hosts
+    for adapter in _session.adapters.values():
+        pools = adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            hosts['%s://%s:%s' % (pool.scheme, pool.host, pool.port)] = {
+                'connections': pool.num_connections,
+                'requests': pool.num_requests,
+                'idle': pool.pool.qsize() if pool.pool else 0,
+            }
+    return hosts
+
+
+def session():
+    """The process's shared requests.Session."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = _make_session()
+        return _session
+
+
+def _make_session():
+    session = requests.Session()
+    session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+    for prefix in ('http://', 'https://'):
+        session.mount(prefix, HTTPAdapter(
+            pool_connections=settings.UPSTREAM_POOL_HOSTS,
+            pool_maxsize=settings.UPSTREAM_POOL_SIZE))
+    return session
+
+
+def _count(service, *names):
+    with _counts_lock:
+        counts = _counts[service]
+        for name in names:
+            counts[name] += 1
+
+
+def _log_stats():
+    global _logged
+    with _counts_lock:
+        if time.time() - _logged < settings.UPSTREAM_STATS_LOG_SECONDS:
+            return
+        _logged = time.time()
+    logger.info('upstream calls %s, connections %s', stats(), pool_stats())
+
+
+def _breaker(service):
+    with _breakers_lock:
+        if service not in _breakers:
+            _breakers[service] = CircuitBreaker(
+                settings.UPSTREAM_BREAKER_FAILURES,
+                settings.UPSTREAM_BREAKER_COOL_DOWN)
+        return _breakers[service]
@@ -16,12 +16,23 @@ from django.shortcuts import render, redirect
 from django.views.decorators.cache import cache_page
 
 from forms import PrintRequestForm
-from ui import voyager, apis, marc, summon, db
+from ui import voyager, apis, marc, summon, db, upstream
+from ui.cache import StaleCache, make_key
 from ui.sort import libsort, availsort, elecsort, templocsort, \
     splitsort, enumsort, callnumsort, strip_bad_holdings, holdsort
 
 logger = logging.getLogger(__name__)
 
+NON_WRLC_CACHE_VERSION = 1
+
+# bibs and free online copies from the external APIs, for standard numbers
+# Voyager does not have; see non_wrlc_item
+_non_wrlc_cache = StaleCache(settings.BIB_CACHE_SECONDS,
+                             settings.STALE_GRACE_SECONDS,
+                             settings.STALE_REFRESH_TIMEOUT,
+                             version=NON_WRLC_CACHE_VERSION,
+                             lock_timeout=settings.SINGLE_FLIGHT_LOCK_TIMEOUT)
+
 
 def home(request):
     return render(request, 'home.html', {
@@ -53,7 +64,16 @@ def citation_json(request):
     return bibjsontools.from_openurl(url) if url else None
 
 
-@cache_page(settings.ITEM_PAGE_CACHE_SECONDS)
+def _add_openurl(request, bib):
+    """
+    Fold the request's OpenURL into a bib. Cached bibs and holdings never
+    include it, so that requests differing only in their OpenURL share
+    them; anything built from it is worked out per request.
+    """
+    bib['openurl'] = _openurl_dict(request)
+    bib['citation_json'] = citation_json(request)
+
+
 def item(request, bibid):
     bib = None
     try:
@@ -61,14 +81,13 @@ def item(request, bibid):
         if not bib:
             return render(request, '404.html', {'num': bibid,
                                                 'num_type': 'BIB ID'}, status=404)
-        bib['openurl'] = _openurl_dict(request)
-        bib['citation_json'] = citation_json(request)
+        _add_openurl(request, bib)
         # Ensure bib data is ours if possible
         if not bib['LIBRARY_NAME'] == settings.PREF_LIB:
             for alt_bib in bib['BIB_ID_LIST']:
                 if alt_bib['LIBRARY_NAME'] == settings.PREF_LIB:
                     return item(request, alt_bib['BIB_ID'])
-        holdings = voyager.get_holdings(bib)
+        holdings = voyager.get_cached_holdings(bib)
         if holdings:
             holdings = strip_bad_holdings(holdings)
             holdings = add_floormap_link(holdings)
@@ -86,8 +105,6 @@ def item(request, bibid):
         for name, display_name, specs in marc.mapping:
             if name in bib and len(bib[name]) > 0:
                 details.append((display_name, bib[name]))
-        bibs = voyager.get_all_bibs(bib['BIB_ID_LIST'])
-        bib['RELATED_ISBN_LIST'] = list(set(voyager.get_related_isbns(bibs)))
         return render(request, 'item.html', {
             'bibid': bibid,
             'bib': bib,
@@ -140,17 +157,14 @@ def _date_handler(obj):
     return obj.isoformat() if hasattr(obj, 'isoformat') else obj
 
 
-@cache_page(settings.ITEM_PAGE_CACHE_SECONDS)
 def item_json(request, bibid, z3950='False', school=None):
     try:
         bib_data = voyager.get_bib_data(bibid)
         if not bib_data:
             return HttpResponse('{}', content_type='application/json',
                                 status=404)
-        bib_data['openurl'] = _openurl_dict(request)
-        bib_data['holdings'] = voyager.get_holdings(bib_data)
-        bib_data['openurl'] = _openurl_dict(request)
-        bib_data['citation_json'] = citation_json(request)
+        _add_openurl(request, bib_data)
+        bib_data['holdings'] = voyager.get_cached_holdings(bib_data)
         bib_encoded = unicode_data(bib_data)
         return HttpResponse(json.dumps(bib_encoded, default=_date_handler,
                                        indent=2), content_type='application/json')
@@ -172,8 +186,13 @@ def request_print(request, bibid):
     if request.method == 'POST':  # If the form has been submitted...
         form = PrintRequestForm(request.POST)
         if form.is_valid():
-            requests.post(settings.DDA_URL, data=request.POST)
-            bibid = bibid
+            try:
+                upstream.request('dda', 'POST', settings.DDA_URL,
+                                 data=request.POST)
+            except upstream.Unavailable:
+                logger.exception('unable to send print request for %s' %
+                                 bibid)
+                return error500(request)
             return redirect('confirmation', bibid=bibid)
         else:
             citation = {'isbn': request.POST.get('isbn'),
@@ -200,61 +219,68 @@ def confirmation(request, bibid):
     return render(request, 'confirmation.html', {'bibid': bibid})
 
 
-@cache_page(settings.ITEM_PAGE_CACHE_SECONDS)
 def non_wrlc_item(request, num, num_type):
-    bib = apis.get_bib_data(num=num, num_type=num_type)
-    if not bib:
+    found, stale = _non_wrlc_cache.get(
+        make_key('non_wrlc', num_type, num),
+        lambda: _load_non_wrlc_item(num, num_type))
+    if not found:
         return render(request, '404.html', {'num': num,
                                             'num_type': num_type.upper()}, status=404)
-    bib['openurl'] = _openurl_dict(request)
-    bib['citation_json'] = citation_json(request)
-    bib['ILLIAD_LINK'] = voyager.get_illiad_link(bib)
-    try:
-        bib['REFWORKS_LINK'] = voyager.get_refworks_link(bib)
-    except:
-        bib['REFWORKS_LINK'] = ''
+    bib = found['bib']
+    _add_openurl(request, bib)
+    voyager.add_request_links(bib, False)
+    return render(request, 'item.html', {
+        'bibid': '',
+        'bib': bib,
+        'non_gw': True,
+        'holdings': found['holdings'],
+        'link': '',
+        'show_ill_link': True
+    })
+
+
+def _load_non_wrlc_item(num, num_type):
+    bib = apis.get_bib_data(num=num, num_type=num_type)
+    if not bib:
+        return None
     bib['MICRODATA_TYPE'] = voyager.get_microdata_type(bib)
     holdings = []
-    # get free electronic book link from open library
+    # get free electronic book link from open library, asking about all
+    # of the numbers at once and taking the first that has one
+    nums = []
     for numformat in ('LCCN', 'ISBN', 'OCLC'):
         if bib.get(numformat):
             if numformat == 'OCLC':
                 num = filter(lambda x: x.isdigit(), bib[numformat])
             else:
                 num = bib[numformat]
-            openlibhold = apis.openlibrary(num, numformat)
-            if openlibhold:
-                holdings.append(openlibhold)
-                break
-    return render(request, 'item.html', {
-        'bibid': '',
-        'bib': bib,
-        'non_gw': True,
-        'holdings': holdings,
-        'link': '',
-        'show_ill_link': True
-    })
+            nums.append((num, numformat))
+    for openlibhold in apis.openlibrary_many(nums):
+        if openlibhold:
+            holdings.append(openlibhold)
+            break
+    return {'bib': bib, 'holdings': holdings}
 
 
-@cache_page(settings.ITEM_PAGE_CACHE_SECONDS)
 def gtitem(request, gtbibid):
     try:
         bibid = db.get_bibid_from_gtid(gtbibid)
         if bibid:
             return redirect('item', bibid=bibid)
         else:
-            bib = voyager.get_z3950_bib_data(gtbibid[1:], 'GT')
-            if bib is None:
+            found = voyager.get_cached_z3950_item(gtbibid[1:], 'GT')
+            if found is None:
                 return render(request, '404.html', {'num': gtbibid,
                                                     'num_type': 'BIB ID'}, status=404)
-            bib['openurl'] = _openurl_dict(request)
-            bib['citation_json'] = citation_json(request)
+            bib = found['bib']
+            _add_openurl(request, bib)
             # Ensure bib data is ours if possible
             if not bib['LIBRARY_NAME'] == settings.PREF_LIB:
                 for alt_bib in bib['BIB_ID_LIST']:
                     if alt_bib['LIBRARY_NAME'] == settings.PREF_LIB:
                         return item(request, alt_bib['BIB_ID'])
-            holdings = voyager.get_holdings(bib, 'GT', False)
+            voyager.add_request_links(bib, found['eligible'])
+            holdings = found['holdings']
             if holdings:
                 holdings = strip_bad_holdings(holdings)
                 show_wrlc_link = False
@@ -278,20 +304,20 @@ def gtitem(request, gtbibid):
         return error500(request)
 
 
-@cache_page(settings.ITEM_PAGE_CACHE_SECONDS)
 def gtitem_json(request, gtbibid):
     try:
         bibid = db.get_bibid_from_gtid(gtbibid)
         if bibid:
             return redirect('item_json', bibid=bibid)
         else:
-            bib_data = voyager.get_z3950_bib_data('b' + gtbibid[1:], 'GT')
-            if not bib_data:
+            found = voyager.get_cached_z3950_item('b' + gtbibid[1:], 'GT')
+            if not found:
                 return HttpResponse('{}', content_type='application/json',
                                     status=404)
-            bib_data['holdings'] = voyager.get_holdings(bib_data, 'GT', False)
-            bib_data['openurl'] = _openurl_dict(request)
-            bib_data['citation_json'] = citation_json(request)
+            bib_data = found['bib']
+            _add_openurl(request, bib_data)
+            voyager.add_request_links(bib_data, found['eligible'])
+            bib_data['holdings'] = found['holdings']
             bib_encoded = unicode_data(bib_data)
             return HttpResponse(json.dumps(bib_encoded, default=_date_handler,
                                            indent=2),
@@ -330,25 +356,25 @@ def unicode_data(bib_data):
     return bib_encoded
 
 
-@cache_page(settings.ITEM_PAGE_CACHE_SECONDS)
 def gmitem(request, gmbibid):
     try:
         bibid = db.get_bibid_from_gmid(gmbibid)
         if bibid:
             return redirect('item', bibid=bibid)
         else:
-            bib = voyager.get_z3950_bib_data(gmbibid, 'GM')
-            if not bib:
+            found = voyager.get_cached_z3950_item(gmbibid, 'GM')
+            if not found:
                 return render(request, '404.html', {'num': gmbibid,
                                                     'num_type': 'BIB ID'}, status=404)
-            bib['openurl'] = _openurl_dict(request)
-            bib['citation_json'] = citation_json(request)
+            bib = found['bib']
+            _add_openurl(request, bib)
             # Ensure bib data is ours if possible
             if not bib['LIBRARY_NAME'] == settings.PREF_LIB:
                 for alt_bib in bib['BIB_ID_LIST']:
                     if alt_bib['LIBRARY_NAME'] == settings.PREF_LIB:
                         return item(request, alt_bib['BIB_ID'])
-            holdings = voyager.get_holdings(bib, 'GM', False)
+            voyager.add_request_links(bib, found['eligible'])
+            holdings = found['holdings']
             if holdings:
                 holdings = strip_bad_holdings(holdings)
                 show_wrlc_link = False
@@ -376,20 +402,20 @@ def gmitem(request, gmbibid):
         return error500(request)
 
 
-@cache_page(settings.ITEM_PAGE_CACHE_SECONDS)
 def gmitem_json(request, gmbibid):
     try:
-        bibid = voyager.get_bibid_from_gmid(gmbibid)
+        bibid = db.get_bibid_from_gmid(gmbibid)
         if bibid:
             return redirect('item_json', bibid=bibid)
         else:
-            bib_data = voyager.get_z3950_bib_data(gmbibid, 'GM')
-            if not bib_data:
+            found = voyager.get_cached_z3950_item(gmbibid, 'GM')
+            if not found:
                 return HttpResponse('{}', content_type='application/json',
                                     status=404)
-            bib_data['holdings'] = voyager.get_holdings(bib_data, 'GM', False)
-            bib_data['openurl'] = _openurl_dict(request)
-            bib_data['citation_json'] = citation_json(request)
+            bib_data = found['bib']
+            _add_openurl(request, bib_data)
+            voyager.add_request_links(bib_data, found['eligible'])
+            bib_data['holdings'] = found['holdings']
             bib_encoded = unicode_data(bib_data)
             return HttpResponse(json.dumps(bib_encoded, default=_date_handler,
                                            indent=2), content_type='application/json')
@@ -662,7 +688,7 @@ def availability(request):
     if not bibid:
         raise Http404
     return HttpResponse(
-        json.dumps(db.get_availability(bibid), indent=2),
+        json.dumps(db.get_cached_availability(bibid), indent=2),
         content_type='application/json'
     )
 
@@ -13,8 +13,16 @@ from django.db import connections
 from django.utils.encoding import smart_str, DjangoUnicodeDecodeError
 
 from ui import apis
+from ui import changes
+from ui import clusters
+from ui import fanout
 from ui import marc
+from ui import marccache
+from ui import resolver
+from ui import sql
+from ui import wrlcdb
 from ui import z3950
+from ui.cache import StaleCache, make_key, missing
 from ui.templatetags.launchpad_extras import cjk_info
 from ui.templatetags.launchpad_extras import clean_isbn
 from ui.templatetags.launchpad_extras import clean_lccn
@@ -24,26 +32,83 @@ from django.utils.http import urlquote
 
 GW_LIBRARY_IDS = [7, 11, 18, 21]
 
+# libraries whose holdings come from their own catalogs over z39.50
+Z3950_LIBS = ('GM', 'GT', 'DA')
+
+# oracle refuses IN lists longer than this
+MAX_IN_LIST = sql.IN_LIST_BUCKETS[-1]
+
+# bump whenever the shape of get_bib_data's (or get_cached_holdings')
+# output changes, so that entries cached by older code are ignored
+BIB_CACHE_VERSION = 3
+HOLDINGS_CACHE_VERSION = 3
+PRIMARY_BIBID_CACHE_VERSION = 1
+Z3950_ITEM_CACHE_VERSION = 1
+
+# expired entries are served for STALE_GRACE_SECONDS while they are
+# refreshed, or while Voyager is down; see ui.cache.StaleCache
+_bib_cache = StaleCache(settings.BIB_CACHE_SECONDS,
+                        settings.STALE_GRACE_SECONDS,
+                        settings.STALE_REFRESH_TIMEOUT,
+                        version=BIB_CACHE_VERSION,
+                        lock_timeout=settings.SINGLE_FLIGHT_LOCK_TIMEOUT)
+_holdings_cache = StaleCache(settings.HOLDINGS_CACHE_SECONDS,
+                             settings.STALE_GRACE_SECONDS,
+                             settings.STALE_REFRESH_TIMEOUT,
+                             version=HOLDINGS_CACHE_VERSION,
+                             lock_timeout=settings.SINGLE_FLIGHT_LOCK_TIMEOUT)
+_z3950_item_cache = StaleCache(settings.HOLDINGS_CACHE_SECONDS,
+                               settings.STALE_GRACE_SECONDS,
+                               settings.STALE_REFRESH_TIMEOUT,
+                               version=Z3950_ITEM_CACHE_VERSION,
+                               lock_timeout=settings.SINGLE_FLIGHT_LOCK_TIMEOUT)
+_primary_bibid_cache = StaleCache(settings.BIB_CACHE_SECONDS,
+                                  settings.STALE_GRACE_SECONDS,
+                                  settings.STALE_REFRESH_TIMEOUT,
+                                  version=PRIMARY_BIBID_CACHE_VERSION)
+
+
+# cx_Oracle column types whose values never need whitespace stripped
+PLAIN_COLUMN_TYPES = ('NUMBER', 'NATIVE_FLOAT', 'DATETIME', 'TIMESTAMP',
+                      'BLOB')
 
 
 def _make_dict(cursor, first=False):
-    desc = cursor.description
-    mapped = [
-        dict(zip([col[0] for col in desc], row))
-        for row in cursor.fetchall()
-    ]
-    # strip string values of trailing whitespace
-    for d in mapped:
-        for k, v in d.items():
-            try:
-                d[k] = smart_str(v.strip())
-            except:
-                pass
+    mapper = _row_mapper(cursor.description)
     if first:
-        if len(mapped) > 0:
-            return mapped[0]
+        row = cursor.fetchone()
+        if row is not None:
+            return mapper(row)
         return {}
-    return mapped
+    mapped = []
+    while True:
+        rows = cursor.fetchmany(settings.VOYAGER_FETCH_ARRAYSIZE)
+        if not rows:
+            return mapped
+        mapped.extend([mapper(row) for row in rows])
+
+
+def _row_mapper(desc):
+    """
+    Return a function that turns a row for the given cursor description
+    into a dict keyed by column name, with string values stripped of
+    surrounding whitespace. Which columns might hold strings is worked out
+    once here rather than for every value of every row.
+    """
+    keys = [col[0] for col in desc]
+    index = dict((col[0], i) for i, col in enumerate(desc))
+    strip = [(key, i) for key, i in index.items()
+             if getattr(desc[i][1], '__name__', None)
+             not in PLAIN_COLUMN_TYPES]
+
+    def mapper(row):
+        d = dict(zip(keys, row))
+        for key, i in strip:
+            v = row[i]
+            if isinstance(v, basestring):
+                d[key] = smart_str(v.strip())
+        return d
+    return mapper
 
 
 def get_added_authors(bib):
@@ -90,64 +155,72 @@ def get_all_bibs(bibids):
 
 
 def get_marc_blob(bibid):
-    query = """
-SELECT wrlcdb.getBibBlob(%s) AS marcblob
-from bib_master"""
-    cursor = connections['voyager'].cursor()
-    cursor.execute(query, [bibid])
-    row = cursor.fetchone()
-    raw_marc = str(row[0])
-    rec = pymarc.record.Record(data=raw_marc)
-    return rec
+    return marccache.get_record(bibid)
 
 
 def get_bib_data(bibid, expand_ids=True, exclude_names=False):
-    query = """
-SELECT bib_text.bib_id, lccn,
-       edition, isbn, issn, network_number AS OCLC,
-       pub_place, imPrint, bib_format,
-       language, library_name, publisher_date,
-       RTRIM(wrlcdb.GetMarcField(%s,0,0,'856','','u',1)) AS LINK,
-       RTRIM(wrlcdb.GetMarcField(%s,0,0,'856','','z',1)) AS MESSAGE,
-       wrlcdb.GetAllBibTag(%s, '880', 1) AS CJK_INFO,
-       wrlcdb.GetBibTag(%s, '006') AS MARC006,
-       wrlcdb.GetBibTag(%s, '007') AS MARC007,
-       wrlcdb.GetBibTag(%s, '008') AS MARC008,
-       wrlcdb.GetMarcField(%s,0,0,'776','','z',1) AS MARC776Z""" 
-    if not exclude_names:
-        query += """
-,title, author, publisher,
-RTRIM(wrlcdb.GetMarcField(%s,0,0,'245','','',1)) AS TITLE_ALL
-        """
-    query += """
-FROM bib_text, bib_master, library
-WHERE bib_text.bib_id=%s
-AND bib_text.bib_id=bib_master.bib_id
-AND bib_master.library_id=library.library_id
-AND bib_master.suppress_in_opac='N'"""
-    cursor = connections['voyager'].cursor()
-    paramcount = 9 if not exclude_names else 8 
-    cursor.execute(query, [bibid] * paramcount)
-    rec = get_marc_blob(bibid)
+    """
+    Load everything an item page needs to know about a bib. Full lookups
+    (the default arguments) also get RELATED_ISBN_LIST, and are cached by
+    bibid alone for BIB_CACHE_SECONDS, so every view of a bib shares one
+    copy whatever else is in its URL. Holdings are cached separately, see
+    get_cached_holdings.
+
+    A bib served from an expired cache entry because Voyager could not
+    be reached has STALE set.
+    """
+    if not expand_ids or exclude_names:
+        return _load_bib_data(bibid, expand_ids, exclude_names)
+    if missing.has('bib', bibid):
+        return None
+    bib, stale = _bib_cache.get(bib_cache_key(bibid),
+                                lambda: _load_full_bib_data(bibid))
+    if bib is None:
+        missing.add('bib', bibid)
+        return None
+    if stale:
+        bib['STALE'] = True
+    return bib
+
+
+def _load_full_bib_data(bibid):
+    bib = _load_bib_data(bibid)
+    if bib:
+        bib['RELATED_ISBN_LIST'] = list(set(get_related_isbns(
+            get_all_bibs(bib['BIB_ID_LIST']))))
+    return bib or None
+
+
+def bib_cache_key(bibid):
+    return 'bib:%s' % bibid
+
+
+def _load_bib_data(bibid, expand_ids=True, exclude_names=False):
+    """
+    The bib_text columns and the MARC record come back in a single query;
+    the 245, 856, 880, 006-008 and 776 values are then read from the MARC
+    record rather than asking wrlcdb for each one.
+    """
     bib = {}
-    try:
-        if exclude_names:
-            bib['TITLE'] = rec.title()
-            bib['AUTHOR'] = rec.author()
-            bib['PUBLISHER'] = rec.publisher()
-            title_fields = rec.get_fields('245')
-            bib['LIBRARY_NAME'] = get_library_name(bibid)
-            bib['TITLE_ALL'] = ''
-            bib['BIB_FORMAT'] = ''
-            bib['BIB_ID'] = bibid
-            for title in title_fields:
-                bib['TITLE_ALL'] += title.format_field().decode('iso-8859-1')\
-                    .encode('utf-8')
-        else:
-            bib = _make_dict(cursor, first=True)
-    except DjangoUnicodeDecodeError:
-        return get_bib_data(bibid=bibid, expand_ids=expand_ids,
-                            exclude_names=True)
+    if exclude_names:
+        rec = get_marc_blob(bibid)
+        bib['TITLE'] = rec.title()
+        bib['AUTHOR'] = rec.author()
+        bib['PUBLISHER'] = rec.publisher()
+        title_fields = rec.get_fields('245')
+        bib['LIBRARY_NAME'] = get_library_name(bibid)
+        bib['TITLE_ALL'] = ''
+        bib['BIB_FORMAT'] = ''
+        bib['BIB_ID'] = bibid
+        for title in title_fields:
+            bib['TITLE_ALL'] += title.format_field().decode('iso-8859-1')\
+                .encode('utf-8')
+    else:
+        try:
+            bib, rec = _get_bib_bundle(bibid)
+        except DjangoUnicodeDecodeError:
+            return _load_bib_data(bibid=bibid, expand_ids=expand_ids,
+                                  exclude_names=True)
     # if bib is empty, there's no match -- return immediately
     if not bib:
         return None
@@ -178,28 +251,30 @@ AND bib_master.suppress_in_opac='N'"""
     if expand_ids:
         bibids = [
             {'BIB_ID': bib['BIB_ID'], 'LIBRARY_NAME':bib['LIBRARY_NAME']}]
-        for num_type in ['isbn', 'issn', 'oclc', 'lccn']:
-            if bib.get(num_type.upper(), ''):
-                norm_set, disp_set = set(), set()
-                std_nums = get_related_std_nums(bib['BIB_ID'], num_type)
-                if std_nums:
-                    norm, disp = zip(*std_nums)
-                    norm_set.update(norm)
-                    disp_set.update([num.strip() for num in disp])
-                    bib['NORMAL_%s_LIST' % num_type.upper()] = list(norm_set)
-                    bib['DISPLAY_%s_LIST' % num_type.upper()] = list(disp_set)
-                    if num_type.upper() == 'ISBN':
-                        if bib.get('MARC776Z', ''):
-                            original_isbns = get_original_isbns(bib['MARC776Z'])
-                            norm_set.update(original_isbns)
-                            bib['NORMAL_ISBN_LIST'].extend(original_isbns)
-                            bib['DISPLAY_ISBN_LIST'].extend(original_isbns)
-                    # use std nums to get related bibs
-                    new_bibids = get_related_bibids(norm_set, num_type,
-                                                    bib.get('TITLE', ''))
-                    for nb in new_bibids:
-                        if nb['BIB_ID'] not in [x['BIB_ID'] for x in bibids]:
-                            bibids.append(nb)
+        num_types = [num_type for num_type in ['isbn', 'issn', 'oclc', 'lccn']
+                     if bib.get(num_type.upper(), '')]
+        all_std_nums = get_related_std_nums_many(bib['BIB_ID'], num_types)
+        for num_type in num_types:
+            norm_set, disp_set = set(), set()
+            std_nums = all_std_nums[num_type]
+            if std_nums:
+                norm, disp = zip(*std_nums)
+                norm_set.update(norm)
+                disp_set.update([num.strip() for num in disp])
+                bib['NORMAL_%s_LIST' % num_type.upper()] = list(norm_set)
+                bib['DISPLAY_%s_LIST' % num_type.upper()] = list(disp_set)
+                if num_type.upper() == 'ISBN':
+                    if bib.get('MARC776Z', ''):
+                        original_isbns = get_original_isbns(bib['MARC776Z'])
+                        norm_set.update(original_isbns)
+                        bib['NORMAL_ISBN_LIST'].extend(original_isbns)
+                        bib['DISPLAY_ISBN_LIST'].extend(original_isbns)
+                # use std nums to get related bibs
+                new_bibids = get_related_bibids(norm_set, num_type,
+                                                bib.get('TITLE', ''))
+                for nb in new_bibids:
+                    if nb['BIB_ID'] not in [x['BIB_ID'] for x in bibids]:
+                        bibids.append(nb)
         bib['BIB_ID_LIST'] = list(bibids)
     # parse fields for microdata
     bib['MICRODATA_TYPE'] = get_microdata_type(bib)
@@ -210,6 +285,50 @@ AND bib_master.suppress_in_opac='N'"""
     return bib
 
 
+def _get_bib_bundle(bibid):
+    """
+    Return the bib_text row for a bib as a dict, with the MARC-derived
+    values filled in, along with its parsed MARC record. The dict is empty
+    if the bib does not exist or is suppressed.
+    """
+    query = """
+SELECT wrlcdb.getBibBlob(bib_text.bib_id) AS marcblob,
+       bib_text.bib_id, lccn,
+       edition, isbn, issn, network_number AS OCLC,
+       pub_place, imPrint, bib_format,
+       language, library_name, publisher_date,
+       title, author, publisher
+FROM bib_text, bib_master, library
+WHERE bib_text.bib_id=%s
+AND bib_text.bib_id=bib_master.bib_id
+AND bib_master.library_id=library.library_id
+AND bib_master.suppress_in_opac='N'"""
+    cursor = connections['voyager'].cursor()
+    cursor.execute(query, [bibid])
+    row = cursor.fetchone()
+    if not row:
+        return {}, None
+    # the record goes to pymarc untouched; only the text columns get the
+    # usual stripping
+    raw_marc = str(row[0])
+    rec = pymarc.record.Record(data=raw_marc)
+    marccache.put(bibid, raw_marc, rec)
+    bib = _row_mapper(cursor.description[1:])(row[1:])
+    marc_values = {
+        'LINK': wrlcdb.get_marc_field(rec, '856', 'u'),
+        'MESSAGE': wrlcdb.get_marc_field(rec, '856', 'z'),
+        'CJK_INFO': wrlcdb.get_all_bib_tag(rec, '880'),
+        'MARC006': wrlcdb.get_bib_tag(rec, '006'),
+        'MARC007': wrlcdb.get_bib_tag(rec, '007'),
+        'MARC008': wrlcdb.get_bib_tag(rec, '008'),
+        'MARC776Z': wrlcdb.get_marc_field(rec, '776', 'z'),
+        'TITLE_ALL': wrlcdb.get_marc_field(rec, '245'),
+    }
+    for key, value in marc_values.items():
+        bib[key] = value.strip() if value else value
+    return bib, rec
+
+
 def _is_oclc(num):
     if num.find('OCoLC') >= 0:
         return True
@@ -231,20 +350,37 @@ def get_microdata_type(bib):
 
 
 def get_primary_bibid(num, num_type):
+    """
+    The bibid to show for a standard number: one of ours if there is one.
+    Found bibids are cached (see _primary_bibid_cache), so that these
+    lookups keep working through a Voyager outage; numbers with no bib
+    are remembered in the negative cache.
+    """
     num = _normalize_num(num, num_type)
+    if missing.has('primary', num_type, num):
+        return None
+    bibid, stale = _primary_bibid_cache.get(
+        make_key('primary', num_type, num),
+        lambda: _load_primary_bibid(num, num_type))
+    if bibid is None:
+        missing.add('primary', num_type, num)
+    return bibid
+
+
+def _load_primary_bibid(num, num_type):
     query = """
 SELECT bib_index.bib_id, bib_master.library_id, library.library_name,
     bib_index.normal_heading, bib_index.display_heading
 FROM bib_index, bib_master, library
 WHERE bib_index.index_code IN (%s)
-AND bib_index.normal_heading = '%s'
+AND bib_index.normal_heading = %%s
 AND bib_index.bib_id=bib_master.bib_id
 AND bib_master.library_id=library.library_id
 AND bib_master.suppress_in_opac = 'N'
 AND ROWNUM < 12"""
+    indexclause, args = sql.in_binds(settings.INDEX_CODES[num_type])
     cursor = connections['voyager'].cursor()
-    query = query % (_in_clause(settings.INDEX_CODES[num_type]), num)
-    cursor.execute(query, [])
+    cursor.execute(query % indexclause, args + [num])
     bibs = _make_dict(cursor)
     if num_type == 'oclc':
         bibs = [b for b in bibs if b['NORMAL_HEADING'] != b['DISPLAY_HEADING']]
@@ -266,15 +402,26 @@ AND bib_master.library_id=library.library_id"""
     return result[0]['LIBRARY_NAME']
 
 def get_item_recalls(itemid):
+    return get_item_recalls_many([itemid]).get(itemid, 0)
+
+
+def get_item_recalls_many(itemids):
+    """Return {item_id: number of recall notices} for the given items.
+    Items without any recalls are left out."""
     query = """
-SELECT Count(hold_recall_items.item_id) AS recalls
+SELECT hold_recall_items.item_id, Count(hold_recall_items.item_id) AS recalls
 FROM hold_recall_items
-GROUP BY hold_recall_items.item_id
-HAVING hold_recall_items.item_id = %s """
-    cursor = connections['voyager'].cursor()
-    cursor.execute(query, [itemid])
-    result = _make_dict(cursor)
-    return result[0]['RECALLS'] if result else 0
+WHERE hold_recall_items.item_id IN (%s)
+GROUP BY hold_recall_items.item_id"""
+    itemids = list(set(itemids))
+    recalls = {}
+    for i in range(0, len(itemids), MAX_IN_LIST):
+        idclause, args = sql.in_binds(itemids[i:i + MAX_IN_LIST])
+        cursor = connections['voyager'].cursor()
+        cursor.execute(query % idclause, args)
+        for row in _make_dict(cursor):
+            recalls[row['ITEM_ID']] = row['RECALLS']
+    return recalls
 
 def _normalize_num(num, num_type):
     if num_type == 'isbn':
@@ -287,20 +434,49 @@ def _normalize_num(num, num_type):
 
 
 def get_related_bibids(num_list, num_type, title):
-    query = [None] * 7
+    """
+    The bibs sharing standard numbers of num_type with num_list whose
+    titles start like title. The bib_index lookup is cached per standard
+    number, see ui.clusters.
+    """
+    results = clusters.get(num_type, num_list,
+                           lambda nums: _get_cluster(nums, num_type))
+    if title is None:
+        title = ''
+    # remove the holding if titles are different. No more than 8 chars
+    results = [row for row in results if row['TITLE'] is None or
+               title[0:8].lower() == row['TITLE'][0:8].lower()]
+    output_keys = ('BIB_ID', 'LIBRARY_NAME')
+    if num_type == 'oclc':
+        return [dict([
+            (k, row[k]) for k in output_keys]) for row in
+            results if _is_oclc(row['DISPLAY_HEADING'])]
+    return [dict([(k, row[k]) for k in output_keys]) for row in results]
+
+
+def _get_cluster(num_list, num_type):
+    """
+    The bib_index rows of the bibs related to each of num_list, as
+    {num: rows}, found in one query with a branch per number.
+    """
+    query = [None] * 6
     query[0] = """
-SELECT DISTINCT bib_index.bib_id,
+SELECT DISTINCT %%s AS num,
+       bib_index.bib_id,
+       bib_index.normal_heading,
        bib_index.display_heading,
-       library.library_name
-FROM bib_index, library, bib_master
+       library.library_name,
+       bib_text.title
+FROM bib_index, library, bib_master, bib_text
 WHERE bib_index.bib_id=bib_master.bib_id
 AND bib_master.library_id=library.library_id
 AND bib_master.suppress_in_opac='N'
+AND bib_text.bib_id=bib_master.bib_id
 AND bib_index.index_code IN (%s)
 AND bib_index.normal_heading != 'OCOLC'"""
     query[1] = """
-AND UPPER(bib_index.display_heading) NOT LIKE %s
-AND UPPER(bib_index.display_heading) NOT LIKE %s"""
+AND UPPER(bib_index.display_heading) NOT LIKE %%s
+AND UPPER(bib_index.display_heading) NOT LIKE %%s"""
     query[2] = """
 AND bib_index.normal_heading IN (
     SELECT bib_index.normal_heading
@@ -310,54 +486,39 @@ AND bib_index.normal_heading IN (
         query[2] = query[2] + """
     AND bib_index.normal_heading != bib_index.display_heading"""
     query[3] = """
-    AND UPPER(bib_index.display_heading) NOT LIKE %s
-    AND UPPER(bib_index.display_heading) NOT LIKE %s
+    AND UPPER(bib_index.display_heading) NOT LIKE %%s
+    AND UPPER(bib_index.display_heading) NOT LIKE %%s
     AND ROWNUM < 12"""
     query[4] = """
     AND bib_id IN (
         SELECT DISTINCT bib_index.bib_id
         FROM bib_index
         WHERE bib_index.index_code IN (%s)
-        AND bib_index.normal_heading IN (%s)
+        AND bib_index.normal_heading = %%s
         AND bib_index.normal_heading != 'OCOLC'"""
     if num_type == 'oclc':
         query[4] = query[4] + """
         AND bib_index.normal_heading != bib_index.display_heading"""
     query[5] = """
-        AND UPPER(bib_index.display_heading) NOT LIKE %s
-        AND UPPER(bib_index.display_heading) NOT LIKE %s"""
-    query[6] = """
+        AND UPPER(bib_index.display_heading) NOT LIKE %%s
+        AND UPPER(bib_index.display_heading) NOT LIKE %%s
         )
-    )
-ORDER BY bib_index.bib_id"""
-    indexclause = _in_clause(settings.INDEX_CODES[num_type])
-    numclause = _in_clause(num_list)
-    likeclause1 = '%' + 'SET' + '%'
-    likeclause2 = '%' + 'SER' + '%'
-    query[0] = query[0] % indexclause
-    query[2] = query[2] % indexclause
-    query[4] = query[4] % (indexclause, numclause)
-    query = ''.join(query)
-    args = [likeclause1, likeclause2] * 3
+    )"""
+    indexclause, indexargs = sql.in_binds(settings.INDEX_CODES[num_type])
+    likeargs = ['%' + 'SET' + '%', '%' + 'SER' + '%']
+    branch = ''.join(query) % ((indexclause,) * 3)
+    # ui.clusters puts the rows in order
+    query = '\nUNION ALL'.join([branch] * len(num_list))
+    args = []
+    for num in num_list:
+        args += [num] + indexargs + likeargs + indexargs + likeargs + \
+            indexargs + [num] + likeargs
     cursor = connections['voyager'].cursor()
     cursor.execute(query, args)
-    results = _make_dict(cursor)
-    for row in results[:]:
-        if title is None:
-            title = ''
-        result = get_title(row['BIB_ID'])
-        new_title = result.get('TITLE', '')
-        # remove the holding if titles are different. No more than 8 chars
-        if new_title is None:
-            continue
-        if title[0:8].lower() != new_title[0:8].lower():
-            results.remove(row)
-    output_keys = ('BIB_ID', 'LIBRARY_NAME')
-    if num_type == 'oclc':
-        return [dict([
-            (k, row[k]) for k in output_keys]) for row in
-            results if _is_oclc(row['DISPLAY_HEADING'])]
-    return [dict([(k, row[k]) for k in output_keys]) for row in results]
+    rows = dict((num, []) for num in num_list)
+    for row in _make_dict(cursor):
+        rows[row.pop('NUM')].append(row)
+    return rows
 
 
 def get_related_isbns(bibs):
@@ -368,12 +529,11 @@ SELECT bib_index.display_heading
     AND bib_index.index_code IN (%s)
     AND ROWNUM < 12
     ORDER BY bib_index.display_heading"""
-    indexclause = _in_clause(settings.INDEX_CODES['isbn'])
-    numclause = _in_clause(bibs)
+    numclause, numargs = sql.in_binds(bibs)
+    indexclause, indexargs = sql.in_binds(settings.INDEX_CODES['isbn'])
     cursor = connections['voyager'].cursor()
-    #args = [numclause, indexclause]
     query = query % (numclause, indexclause)
-    cursor.execute(query, [])
+    cursor.execute(query, numargs + indexargs)
     results = cursor.fetchall()
     return [(clean_isbn(p[0])) for p in results]
 
@@ -399,24 +559,44 @@ def get_title(bibid):
 
 
 def get_related_std_nums(bibid, num_type):
+    return get_related_std_nums_many(bibid, [num_type])[num_type]
+
+
+def get_related_std_nums_many(bibid, num_types):
+    """
+    Fetch a bib's standard numbers for several number types in one query.
+    Returns {num_type: [(normal, display), ...]}, with at most 11 numbers
+    per type, filtered the same way get_related_std_nums always has.
+    """
     query = """
-SELECT normal_heading, display_heading
+SELECT bib_index.index_code, normal_heading, display_heading
 FROM bib_index
 INNER JOIN bib_master ON bib_index.bib_id = bib_master.bib_id
 WHERE bib_index.index_code IN (%s)
-AND bib_index.bib_id = %s
+AND bib_index.bib_id = %%s
 AND bib_index.normal_heading != 'OCOLC'
-AND bib_master.suppress_in_opac='N'"""
-    if num_type == 'oclc':
-        query = query + """
-AND bib_index.normal_heading != bib_index.display_heading"""
-    query = query + """
-AND ROWNUM < 12
+AND bib_master.suppress_in_opac='N'
 ORDER BY bib_index.normal_heading"""
-    query = query % (_in_clause(settings.INDEX_CODES[num_type]), bibid)
+    if not num_types:
+        return {}
+    codes = []
+    for num_type in num_types:
+        codes.extend(settings.INDEX_CODES[num_type])
+    indexclause, args = sql.in_binds(codes)
     cursor = connections['voyager'].cursor()
-    cursor.execute(query, [])
-    results = cursor.fetchall()
+    cursor.execute(query % indexclause, args + [bibid])
+    rows = cursor.fetchall()
+    std_nums = {}
+    for num_type in num_types:
+        results = [(row[1], row[2]) for row in rows
+                   if row[0] in settings.INDEX_CODES[num_type]]
+        if num_type == 'oclc':
+            results = [pair for pair in results if pair[0] != pair[1]]
+        std_nums[num_type] = _filter_std_nums(results[:11], num_type)
+    return std_nums
+
+
+def _filter_std_nums(results, num_type):
     # cull out ISBNs for sets of books
     results = [pair for pair in results if 'SET' not in pair[0].upper()]
     if num_type == 'oclc':
@@ -435,6 +615,101 @@ def _is_valid_issn(num):
 
 
 def get_holdings(bib_data, lib=None, translate_bib=True):
+    holdings, eligible = _get_holdings(bib_data, lib, translate_bib)
+    add_request_links(bib_data, eligible)
+    return holdings
+
+
+def get_cached_holdings(bib_data):
+    """
+    get_holdings for a bib from get_bib_data, cached by bibid for
+    HOLDINGS_CACHE_SECONDS. Circulation status changes far more often than
+    the bib itself, so this keeps its own, much shorter, timeout. The
+    ILLiad and RefWorks links are still built per request, since they
+    depend on the OpenURL the request came in with.
+
+    Holdings are rebuilt early when poll_changes sees an item of any of
+    the bibs they cover change (see ui.changes).
+
+    Sets STALE on the bib if the holdings come from an expired cache entry
+    because Voyager could not be reached.
+    """
+    # the refresh may run in another thread, so give it its own copy
+    snapshot = dict(bib_data)
+    cached, stale = _holdings_cache.get(
+        holdings_cache_key(bib_data['BIB_ID']),
+        lambda: _load_cacheable_holdings(snapshot),
+        valid=lambda cached: changes.current(cached['changes']))
+    bib_data.update(cached['bib'])
+    if stale:
+        bib_data['STALE'] = True
+    add_request_links(bib_data, cached['eligible'])
+    return cached['holdings']
+
+
+def _load_cacheable_holdings(bib_data):
+    # stamp before loading, so that changes made meanwhile are not missed
+    bibids = [b['BIB_ID'] for b in bib_data.get('BIB_ID_LIST', [])] or \
+        [bib_data['BIB_ID']]
+    stamps = changes.stamp(bibids)
+    before = dict(bib_data)
+    holdings, eligible = _get_holdings(bib_data)
+    # the z3950 lookups may tidy up fields of the bib itself; keep those
+    # changes with the holdings so a cached copy can replay them
+    changed = dict((k, v) for k, v in bib_data.items()
+                   if k not in before or before[k] != v)
+    return {'holdings': holdings, 'eligible': eligible, 'bib': changed,
+            'changes': stamps}
+
+
+def get_cached_z3950_item(bibid, lib):
+    """
+    The bib and holdings of a Georgetown or George Mason record that is
+    not in Voyager, fetched over z39.50 and cached together for
+    HOLDINGS_CACHE_SECONDS. Returns a dict of 'bib', 'holdings' and
+    'eligible' (see add_request_links, which the caller should call once
+    the request's OpenURL is on the bib), or None if there is no record.
+    """
+    item, stale = _z3950_item_cache.get(
+        make_key('z3950', lib, bibid), lambda: _load_z3950_item(bibid, lib))
+    if item is not None and stale:
+        item['bib']['STALE'] = True
+    return item
+
+
+def _load_z3950_item(bibid, lib):
+    bib = get_z3950_bib_data(bibid, lib)
+    if not bib:
+        return None
+    holdings, eligible = _get_holdings(bib, lib, False)
+    return {'bib': bib, 'holdings': holdings, 'eligible': eligible}
+
+
+def holdings_cache_key(bibid):
+    return 'holdings:%s' % bibid
+
+
+def add_request_links(bib_data, eligible):
+    """
+    Set the ILLiad and RefWorks links for a bib. ILL is only offered when
+    none of the items can be requested directly (eligible is False), or
+    for serials.
+    """
+    try:
+        bib_data['REFWORKS_LINK'] = get_refworks_link(bib_data)
+    except:
+        bib_data['REFWORKS_LINK'] = ''
+    if eligible is False or bib_data['BIB_FORMAT'] == 'as':
+        bib_data['ILLIAD_LINK'] = get_illiad_link(bib_data)
+    else:
+        bib_data['ILLIAD_LINK'] = ''
+
+
+def _get_holdings(bib_data, lib=None, translate_bib=True):
+    """
+    Return the holdings for a bib, and whether any of their items can be
+    requested directly.
+    """
     done = []
     query = """
 SELECT bib_mfhd.bib_id, mfhd_master.mfhd_id, mfhd_master.location_id,
@@ -450,29 +725,27 @@ AND bib_mfhd.bib_id = bib_master.bib_id
 AND bib_master.library_id=library.library_id
 ORDER BY library.library_name"""
     if bib_data.get('BIB_ID_LIST', []):
-        idclause = _in_clause([b['BIB_ID'] for b in bib_data['BIB_ID_LIST']])
+        idclause, args = sql.in_binds(
+            [b['BIB_ID'] for b in bib_data['BIB_ID_LIST']])
     else:
-        idclause = "'%s'" % bib_data['BIB_ID']
+        idclause, args = sql.in_binds([bib_data['BIB_ID']])
     query = query % idclause
     cursor = connections['voyager'].cursor()
     if not lib:
-        cursor.execute(query, [])
+        cursor.execute(query, args)
         holdings = _make_dict(cursor)
     if not translate_bib:
         holdings = init_z3950_holdings(bib_data['BIB_ID'], lib)
-    illiad_link = get_illiad_link(bib_data)
-    try:
-        refworks_link = get_refworks_link(bib_data)
-        bib_data.update({'REFWORKS_LINK': refworks_link})
-    except:
-        bib_data.update({'REFWORKS_LINK': ''})
     eligibility = False
     added_holdings = []
+    recall_items = []
+    # fetch electronic data, mfhd tags and items for every voyager holding
+    # up front rather than issuing several queries per holding in the loop
+    hydrated = get_holdings_data([h['MFHD_ID'] for h in holdings
+                                  if h['LIBRARY_NAME'] not in Z3950_LIBS])
     for holding in holdings:
         HI_link = ''
-        if (holding['LIBRARY_NAME'] == 'GM' or
-                holding['LIBRARY_NAME'] == 'GT' or
-                holding['LIBRARY_NAME'] == 'DA'):
+        if holding['LIBRARY_NAME'] in Z3950_LIBS:
             if holding['BIB_ID'] in done:
                 continue
             else:
@@ -512,12 +785,7 @@ ORDER BY library.library_name"""
             if holding['LIBRARY_NAME'] == 'HI':
                 # check for eresource link on the bib linked to this holding
                 HI_link = get_himmelfarb_bib_and_link(holding['MFHD_ID'])
-            holding.update({'ELECTRONIC_DATA':
-                            get_electronic_data(holding['MFHD_ID']),
-                            'AVAILABILITY':
-                            get_items(holding['MFHD_ID'], first=True)})
-            holding.update({'MFHD_DATA': get_mfhd_data(holding['MFHD_ID']),
-                            'ITEMS': get_items(holding['MFHD_ID'])}),
+            holding.update(hydrate_holding(holding['MFHD_ID'], hydrated))
             if HI_link and not holding['ELECTRONIC_DATA']['LINK856U']:
                     holding['ELECTRONIC_DATA']['LINK856U'] = HI_link
                     HI_link = ''
@@ -539,11 +807,11 @@ ORDER BY library.library_name"""
                 item['TRIMMED_LOCATION_DISPLAY_NAME'] = \
                     trim_item_display_name(item)
                 item['TEMPLOCATION'] = trim_item_temp_location(item)
-                # WRLC items have an id, check if there are recall notices 
+                # WRLC items have an id, check if there are recall notices
+                # once all the item ids on the page are known
+                item['RECALLS'] = 0
                 if item['ITEM_ID'] is not 0:
-                    item['RECALLS'] = get_item_recalls(item['ITEM_ID'])
-                else:
-                    item['RECALLS'] = 0
+                    recall_items.append(item)
                 remove_duplicate_items(i, holding['ITEMS'])
                 i = i + 1
             holding['LIBRARY_FULL_NAME'] = \
@@ -563,6 +831,10 @@ ORDER BY library.library_name"""
                 and holding['ELECTRONIC_DATA']['LINK856U'] is None \
                 and len(holding['ITEMS']) == 0:
             holding['REMOVE'] = True
+    recalls = get_item_recalls_many([item['ITEM_ID'] for item in recall_items
+                                     if item['ITEM_ID']])
+    for item in recall_items:
+        item['RECALLS'] = recalls.get(item['ITEM_ID'], 0)
     for item in added_holdings:
         holdings.append(item)
     for holding in holdings:
@@ -583,12 +855,12 @@ ORDER BY library.library_name"""
             for item in holding['ITEMS'][:]:
                 if 'REMOVE' in item:
                     holding['ITEMS'].remove(item)
-    if eligibility is False or bib_data['BIB_FORMAT'] == 'as':
-        bib_data.update({'ILLIAD_LINK': illiad_link})
-    else:
-        bib_data.update({'ILLIAD_LINK': ''})
     holdings = correct_gt_holding(holdings)
+    # the 360Link, Open Library and HathiTrust lookups below are gathered
+    # up first and sent at once (see ui.fanout), then merged in order
+    calls = []
     # get 360Link API information where possible
+    link_calls = []
     for holding in holdings:
         holding['LinkResolverData'] = []
         links = holding.get('MFHD_DATA', {}).get('marc856list', [])
@@ -610,9 +882,8 @@ ORDER BY library.library_name"""
                         stop = num.find('&')
                         num = num[:stop] if stop > -1 else num
                 if 'num' in locals():
-                    linkdata = apis.sersol360link(num, num_type)
-                    for ld in linkdata:
-                        holding['LinkResolverData'].append(ld)
+                    link_calls.append((holding, len(calls)))
+                    calls.append((apis.sersol360link, (num, num_type)))
     # get free electronic book link from open library and/or hathi trust
     # First, iterate through the holdings so far, look for an e-resource eg 14732552.
     # If none, then check for free  hathi trust or internet archive eg 2225666.
@@ -620,6 +891,8 @@ ORDER BY library.library_name"""
     for h in holdings:
         if 'E-Resources' == h['LIBRARY_NAME']:
             check_for_free_online = False
+    openlib_nums = []
+    openlib_call = hathitrust_call = None
     if check_for_free_online:
         for numformat in ('LCCN', 'ISBN', 'OCLC'):
             if bib_data.get(numformat):
@@ -632,28 +905,39 @@ ORDER BY library.library_name"""
                     num = bib_data['NORMAL_ISBN_LIST'][0]
                 else:
                     num = bib_data[numformat]
-            
-            # Internet Archive / Open Library
-                openlibhold = apis.openlibrary(num, numformat)
-                title = ''
-                if openlibhold.get('MFHD_DATA', None):
-                    title = get_open_library_item_title(openlibhold['MFHD_DATA']
-                                                        ['marc856list'][0]['u'])
-                if openlibhold:
+                openlib_nums.append((num, numformat))
+                if numformat == 'OCLC':
+                    hathitrust_call = len(calls)
+                    calls.append((apis.hathitrust, (num, numformat)))
+        # Open Library is asked about all of the numbers in one request
+        if openlib_nums:
+            openlib_call = len(calls)
+            calls.append((apis.openlibrary_many, (openlib_nums,)))
+    results = fanout.run(calls, settings.ENRICHMENT_TIMEOUT)
+    for holding, index in link_calls:
+        for ld in results[index] or []:
+            holding['LinkResolverData'].append(ld)
+    # Internet Archive / Open Library
+    if openlib_call is not None:
+        for openlibhold in results[openlib_call] or []:
+            title = ''
+            if openlibhold.get('MFHD_DATA', None):
+                title = get_open_library_item_title(openlibhold['MFHD_DATA']
+                                                    ['marc856list'][0]['u'])
+            if openlibhold:
                 # Compare the title. Can't trust Open Library match.
-                    bib_title = bib_data['TITLE'][0:10].lower()
-                    open_title = title[0:10].lower()
-                    ratio = difflib.SequenceMatcher(None, bib_title,
-                                                    open_title).ratio()
-                    if ratio >= settings.TITLE_SIMILARITY_RATIO:
-                        holdings.append(openlibhold)
-                    
-            # HathiTrust. No need to check title, and OCLC match is sufficient. 
-                if numformat == 'OCLC': 
-                    hathitrusthold = apis.hathitrust(num, numformat)
-                    if hathitrusthold:
-                        holdings.append(hathitrusthold)
-    
+                bib_title = bib_data['TITLE'][0:10].lower()
+                open_title = title[0:10].lower()
+                ratio = difflib.SequenceMatcher(None, bib_title,
+                                                open_title).ratio()
+                if ratio >= settings.TITLE_SIMILARITY_RATIO:
+                    holdings.append(openlibhold)
+    # HathiTrust. No need to check title, and OCLC match is sufficient.
+    if hathitrust_call is not None:
+        hathitrusthold = results[hathitrust_call]
+        if hathitrusthold:
+            holdings.append(hathitrusthold)
+
     for holding in holdings:
         # consider putting DDA info in a dictionary
         dda_isbn = bib_data.get('ISBN', '')
@@ -665,7 +949,7 @@ ORDER BY library.library_name"""
             if url['label'] == 'Request print edition' and eligibility is True: 
                 holding['ONLINE'].remove(url)
 
-    return [h for h in holdings if not h.get('REMOVE', False)]
+    return [h for h in holdings if not h.get('REMOVE', False)], eligibility
 
 
 def get_open_library_item_title(link):
@@ -783,10 +1067,6 @@ def trim_item_temp_location(item):
     return item['TEMPLOCATION']
 
 
-def _in_clause(items):
-    return ','.join(["'" + smart_str(item) + "'" for item in items])
-
-
 # deprecated
 def get_electronic_data(mfhd_id):
     query = """
@@ -816,7 +1096,10 @@ FROM mfhd_master
 WHERE mfhd_master.mfhd_id=%s"""
     cursor = connections['voyager'].cursor()
     cursor.execute(query, [mfhd_id] * 4)
-    results = _make_dict(cursor, first=True)
+    return _parse_mfhd_data(_make_dict(cursor, first=True))
+
+
+def _parse_mfhd_data(results):
     # parse notes from 852
     string = results.get('MARC852', '')
     marc852 = ''
@@ -944,6 +1227,90 @@ ORDER BY PermLocation, TempLocation, item_status_date desc"""
     return _make_dict(cursor)
 
 
+def get_holdings_data(mfhd_ids):
+    """
+    Batched equivalent of get_electronic_data, get_mfhd_data and get_items
+    for a list of mfhd ids. Everything comes back in two queries per
+    MAX_IN_LIST mfhds, keyed by mfhd id; use hydrate_holding to pull a
+    holding's share back out.
+    """
+    electronic_keys = ('MFHD_ID', 'LINK856U', 'LINK856Z', 'LINK852Z',
+                       'LINK852A', 'LINK852H', 'LINK866', 'LINK8563')
+    mfhd_query = """
+SELECT mfhd_master.mfhd_id,
+       RTRIM(wrlcdb.GetMfHDsubfield(mfhd_master.mfhd_id,'856','u')) as LINK856u,
+       RTRIM(wrlcdb.GetMfHDsubfield(mfhd_master.mfhd_id,'856','z')) as LINK856z,
+       RTRIM(wrlcdb.GetMfHDsubfield(mfhd_master.mfhd_id,'852','z')) as LINK852z,
+       RTRIM(wrlcdb.GetMfHDsubfield(mfhd_master.mfhd_id,'852','a')) as LINK852a,
+       RTRIM(wrlcdb.GetMfHDsubfield(mfhd_master.mfhd_id,'852','h')) as LINK852h,
+       RTRIM(wrlcdb.GetAllTags(mfhd_master.mfhd_id,'M','866',2)) as LINK866,
+       RTRIM(wrlcdb.GetMfHDsubfield(mfhd_master.mfhd_id,'856','3')) as LINK8563,
+       RTRIM(wrlcdb.GetAllTags(mfhd_master.mfhd_id,'M','852',2)) as MARC852,
+       RTRIM(wrlcdb.GetAllTags(mfhd_master.mfhd_id,'M','856',2)) as MARC856
+FROM mfhd_master
+WHERE mfhd_master.mfhd_id IN (%s)"""
+    items_query = """
+SELECT DISTINCT display_call_no, item_status_desc, item_status.item_status,
+       permLocation.location_display_name as PermLocation,
+       tempLocation.location_display_name as TempLocation,
+       mfhd_item.item_enum, mfhd_item.chron, item.item_id, item_status_date,
+       bib_master.bib_id,
+       to_char(CIRC_TRANSACTIONS.current_DUE_DATE, 'mm-dd-yyyy') AS DUE,
+       bib_mfhd.mfhd_id AS HYDRATE_MFHD_ID
+FROM bib_master
+JOIN library ON library.library_id = bib_master.library_id
+JOIN bib_mfhd ON bib_master.bib_id = bib_mfhd.bib_id
+JOIN mfhd_master ON mfhd_master.mfhd_id = bib_mfhd.mfhd_id
+JOIN mfhd_item on mfhd_item.mfhd_id = mfhd_master.mfhd_id
+JOIN item ON item.item_id = mfhd_item.item_id
+JOIN item_status ON item_status.item_id = item.item_id
+JOIN item_status_type ON
+    item_status.item_status = item_status_type.item_status_type
+JOIN location permLocation ON permLocation.location_id = item.perm_location
+LEFT OUTER JOIN location tempLocation ON
+    tempLocation.location_id = item.temp_location
+LEFT OUTER JOIN circ_transactions on item.item_id = circ_transactions.item_id
+WHERE bib_mfhd.mfhd_id IN (%s)
+AND mfhd_master.suppress_in_opac = 'N'
+ORDER BY HYDRATE_MFHD_ID, PermLocation, TempLocation, item_status_date desc"""
+    data = {}
+    mfhd_ids = list(set(mfhd_ids))
+    for i in range(0, len(mfhd_ids), MAX_IN_LIST):
+        idclause, args = sql.in_binds(mfhd_ids[i:i + MAX_IN_LIST])
+        cursor = connections['voyager'].cursor()
+        cursor.execute(mfhd_query % idclause, args)
+        for row in _make_dict(cursor):
+            data[row['MFHD_ID']] = {
+                'ELECTRONIC_DATA': dict((k, row[k]) for k in electronic_keys),
+                'MFHD_DATA': _parse_mfhd_data({
+                    'MARC852': row['MARC852'],
+                    'MARC856': row['MARC856'],
+                    'MARC866': row['LINK866']}),
+                'ITEMS': []}
+        cursor = connections['voyager'].cursor()
+        cursor.execute(items_query % idclause, args)
+        for row in _make_dict(cursor):
+            mfhd_id = row.pop('HYDRATE_MFHD_ID')
+            if mfhd_id in data:
+                data[mfhd_id]['ITEMS'].append(row)
+    return data
+
+
+def hydrate_holding(mfhd_id, hydrated):
+    """
+    Return the ELECTRONIC_DATA, AVAILABILITY, MFHD_DATA and ITEMS for one
+    mfhd out of get_holdings_data results. Every holding gets its own
+    copies, since get_holdings edits items and availability in place.
+    """
+    data = hydrated.get(mfhd_id, {})
+    items = data.get('ITEMS', [])
+    return {'ELECTRONIC_DATA': copy.deepcopy(data.get('ELECTRONIC_DATA', {})),
+            'AVAILABILITY': copy.deepcopy(items[0]) if items else {},
+            'MFHD_DATA': copy.deepcopy(data.get('MFHD_DATA',
+                                                _parse_mfhd_data({}))),
+            'ITEMS': copy.deepcopy(items)}
+
+
 def get_z3950_bib_data(bibid, lib):
     conn = None
     res = []
@@ -1165,72 +1532,28 @@ def get_z3950_holding_data(zoomrecord, conn, correctbib, school, bib_data):
 
 
 def get_nongwbib_from_gwbib(bibid, school):
-    if school == 'GM':
-        query = """
-SELECT bib_index.normal_heading
-FROM bib_index
-WHERE bib_index.bib_id = %s
-AND bib_index.index_code ='035A'
-AND bib_index.normal_heading=bib_index.display_heading"""
-    else:
-        query = """
-SELECT LOWER(SUBSTR(bib_index.normal_heading, 0,
-    LENGTH(bib_index.normal_heading)-1))  \"NORMAL_HEADING\"
-FROM bib_index
-WHERE bib_index.bib_id = %s
-AND bib_index.index_code ='907A'"""
+    kind = 'wrlc_gm' if school == 'GM' else 'wrlc_gt'
     try:
-        cursor = connections['voyager'].cursor()
-        cursor.execute(query, [bibid])
-        results = _make_dict(cursor)
+        return resolver.resolve(kind, bibid)
     except:
         return [bibid]
-    return [row['NORMAL_HEADING'] for row in results]
 
 
 def get_gtbib_from_gwbib(bibid):
-    query = """
-SELECT LOWER(SUBSTR(bib_index.normal_heading, 0,
-    LENGTH(bib_index.normal_heading)-1))  \"NORMAL_HEADING\"
-FROM bib_index
-WHERE bib_index.bib_id = %s
-AND bib_index.index_code ='907A'"""
     try:
-        cursor = connections['voyager'].cursor()
-        cursor.execute(query, [bibid])
-        results = _make_dict(cursor)
+        return resolver.resolve('wrlc_gt', bibid)
     except:
         return [bibid]
-    return [row['NORMAL_HEADING'] for row in results]
 
 
 def get_wrlcbib_from_gtbib(gtbibid):
-    query = """
-SELECT bib_index.bib_id
-FROM bib_index,bib_master
-WHERE bib_index.normal_heading = %s
-AND bib_index.index_code = '907A'
-AND bib_index.bib_id = bib_master.bib_id
-AND bib_master.library_id IN ('14', '15')"""
-    cursor = connections['voyager'].cursor()
-    cursor.execute(query, [gtbibid.upper()])
-    results = _make_dict(cursor)
-    return results[0]['BIB_ID'] if results else None
+    bibid = resolver.resolve('gt', gtbibid.upper())
+    return int(bibid) if bibid else None
 
 
 def get_wrlcbib_from_gmbib(gmbibid):
-    query = """
-SELECT bib_index.bib_id
-FROM bib_index, bib_master
-WHERE bib_index.index_code = '035A'
-AND bib_index.bib_id=bib_master.bib_id
-AND bib_index.normal_heading=bib_index.display_heading
-AND bib_master.library_id = '6'
-AND bib_index.normal_heading = %s"""
-    cursor = connections['voyager'].cursor()
-    cursor.execute(query, [gmbibid])
-    results = _make_dict(cursor)
-    return results[0]['BIB_ID'] if results else None
+    bibid = resolver.resolve('gm', gmbibid)
+    return int(bibid) if bibid else None
 
 
 def is_eligible(holding):
@@ -0,0 +1,90 @@
+"""
+Python versions of the wrlcdb PL/SQL functions installed in Voyager,
+working on pymarc records. voyager.get_bib_data uses them to read values
+out of a MARC record it already has in hand, and the SQLite stand-in
+(ui.standin) registers them so that the same queries run offline.
+
+The output formats are the ones the code in ui.voyager parses:
+
+    get_marc_field   "856:42:$uhttp://..."
+    get_all_bib_tag  "245-01 <text> // 260-02 <text>"
+    get_all_tags     "$aGW$bGEL$hQA76 // $aGW$bSTACKS"
+    get_mfhd_subfield / get_bib_tag return bare values
+"""
+
+from django.utils.encoding import smart_str
+
+
+def _subfields(field):
+    return zip(field.subfields[0::2], field.subfields[1::2])
+
+
+def get_marc_field(rec, tag, code='', occurrence=1):
+    """
+    GetMarcField(bibid, 0, 0, tag, '', code, occurrence): the given
+    occurrence of a field as "TAG:I1I2:" followed by its subfields, or
+    only the subfields matching code if one is given. None if the record
+    has no such field.
+    """
+    fields = rec.get_fields(tag)
+    if len(fields) < occurrence:
+        return None
+    field = fields[occurrence - 1]
+    value = '%s:%s%s:' % (tag, field.indicator1, field.indicator2)
+    for subcode, subvalue in _subfields(field):
+        if not code or subcode == code:
+            value += '$%s%s' % (subcode, smart_str(subvalue))
+    return value
+
+
+def get_bib_tag(rec, tag):
+    """
+    GetBibTag(bibid, tag): the data of the first occurrence of a control
+    field, or the subfields of a data field. None if there is no such
+    field.
+    """
+    field = rec[tag]
+    if not field:
+        return None
+    if field.is_control_field():
+        return smart_str(field.data)
+    return get_all_tags([field])
+
+
+def get_all_bib_tag(rec, tag):
+    """
+    GetAllBibTag(bibid, tag, 1): every occurrence of a field, each as its
+    $6 linkage followed by the text of its other subfields, joined with
+    " // ". This is what templatetags cjk_info() expects for the 880s.
+    """
+    values = []
+    for field in rec.get_fields(tag):
+        linkage = field['6'] or ''
+        text = ' '.join([smart_str(subvalue) for subcode, subvalue
+                         in _subfields(field) if subcode != '6'])
+        values.append('%s %s' % (smart_str(linkage), text))
+    return ' // '.join(values) if values else None
+
+
+def get_mfhd_subfield(rec, tag, code):
+    """
+    GetMfHDsubfield(mfhd_id, tag, code): the first value of a subfield in
+    the first occurrence of a field.
+    """
+    field = rec[tag]
+    if not field:
+        return None
+    value = field[code]
+    return smart_str(value) if value is not None else None
+
+
+def get_all_tags(fields):
+    """
+    GetAllTags(id, 'B' or 'M', tag, 2) for the given fields: the
+    subfields of each, as "$a...$b...", joined with " // ".
+    """
+    values = []
+    for field in fields:
+        values.append(''.join(['$%s%s' % (subcode, smart_str(subvalue))
+                               for subcode, subvalue in _subfields(field)]))
+    return ' // '.join(values) if values else None